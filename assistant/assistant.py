@@ -7,6 +7,7 @@ import nltk
 import threading
 
 from time import sleep
+from concurrent.futures import ThreadPoolExecutor
 from openai import OpenAI
 
 from langdetect import detect, DetectorFactory
@@ -59,6 +60,18 @@ RABBITMQ_QUEUE_USER_CHAT_REPLIES = os.getenv(
     "RABBITMQ_QUEUE_USER_CHAT_REPLIES"
 )
 
+# the maximum number of farmer questions that are answered at the same time.
+# This is also the RabbitMQ prefetch count, so the broker never hands us more
+# messages than we have workers for.
+ASSISTANT_CONCURRENCY = int(os.getenv("ASSISTANT_CONCURRENCY", 4))
+assert ASSISTANT_CONCURRENCY > 0
+
+# ChromaDB and OpenAI clients are blocking, so they run on this pool to keep
+# the event loop free for the other in-flight messages.
+executor = ThreadPoolExecutor(
+    max_workers=ASSISTANT_CONCURRENCY, thread_name_prefix="assistant"
+)
+
 
 # the collection of knowledge base connections and prompts,
 # indexed by question language.
@@ -302,24 +315,18 @@ def get_language(user_prompt) -> str:
     return detected_language
 
 
-async def on_message(body: str) -> None:
+def answer_question(from_client: dict) -> tuple[str, datetime]:
     """
-    Handles incoming messages, detects the language, and processes the message
-    using the appropriate knowledge base and prompts.
+    Detects the language of the question, queries the matching knowledge base
+    and asks the LLM for an answer. All of this is blocking I/O, so it is
+    meant to run on the `executor` thread pool.
 
     Parameters:
-    body (str): The incoming message in JSON format.
-    """
-    logger.info(f"[ASSISTANT] -> message received: {body}")
-    from_client = json.loads(body)
-
-    # Handle ignore media message
-    media = from_client.get("media")
-    if media:
-        logger.info("[ASSISTANT] -> skipping whisper because of media message")
-        return None
-    # EOL handle ignore media message
+    from_client (dict): The incoming queue message.
 
+    Returns:
+    tuple[str, datetime]: The LLM response and its timestamp.
+    """
     history = from_client.get("history", [])
     user_prompt = from_client["body"]
 
@@ -341,7 +348,7 @@ async def on_message(body: str) -> None:
     )
 
     # Send the user's prompt and context to the LLM
-    llm_response, timestamp = query_llm(
+    return query_llm(
         openai,
         OPENAI_CHAT_MODEL,
         system_prompt,
@@ -351,6 +358,32 @@ async def on_message(body: str) -> None:
         user_prompt,
         history,
     )
+
+
+async def on_message(body: str) -> None:
+    """
+    Handles incoming messages, detects the language, and processes the message
+    using the appropriate knowledge base and prompts. The blocking part runs
+    on the `executor`, so up to `ASSISTANT_CONCURRENCY` messages are answered
+    in parallel.
+
+    Parameters:
+    body (str): The incoming message in JSON format.
+    """
+    logger.info(f"[ASSISTANT] -> message received: {body}")
+    from_client = json.loads(body)
+
+    # Handle ignore media message
+    media = from_client.get("media")
+    if media:
+        logger.info("[ASSISTANT] -> skipping whisper because of media message")
+        return None
+    # EOL handle ignore media message
+
+    loop = asyncio.get_running_loop()
+    llm_response, timestamp = await loop.run_in_executor(
+        executor, answer_question, from_client
+    )
     logger.info(f"[ASSISTANT] -> LLM replied: {llm_response}")
 
     # finally post the reply onto the message queue
@@ -408,6 +441,8 @@ async def consumer():
         queue_name=RABBITMQ_QUEUE_USER_CHATS,
         routing_key=RABBITMQ_QUEUE_USER_CHATS,
         callback=on_message,
+        prefetch_count=ASSISTANT_CONCURRENCY,
+        concurrency=ASSISTANT_CONCURRENCY,
     )
 
     try:
@@ -416,6 +451,7 @@ async def consumer():
     except KeyboardInterrupt:
         logger.info("[ASSISTANT] -> RabbitMQ Shutting down...")
         await rabbitmq_client.disconnect()
+        executor.shutdown(wait=False)
 
 
 if __name__ == "__main__":
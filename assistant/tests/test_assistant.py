@@ -1,8 +1,19 @@
+import json
+import time
+import asyncio
 import logging
 
+from datetime import datetime, timezone
 from db import connect_to_sqlite, get_stable_prompt
-from assistant import main, get_language, assistant_data, query_llm
-from unittest.mock import patch, MagicMock
+from assistant import (
+    main,
+    get_language,
+    assistant_data,
+    query_llm,
+    on_message,
+    ASSISTANT_CONCURRENCY,
+)
+from unittest.mock import patch, MagicMock, AsyncMock
 
 
 def test_connect_to_sqlite():
@@ -189,3 +200,44 @@ def test_query_llm():
         assert expected_logger_output1 in logger_output
         assert expected_logger_output2 in logger_output
         assert response == "Mocked response"
+
+
+def test_on_message_answers_questions_concurrently():
+    delay = 0.5
+
+    def slow_answer(from_client):
+        time.sleep(delay)
+        return f"answer to {from_client['body']}", datetime.now(timezone.utc)
+
+    messages = [
+        json.dumps(
+            {
+                "conversation_envelope": {"message_id": str(i)},
+                "body": f"question {i}",
+                "media": [],
+            }
+        )
+        for i in range(ASSISTANT_CONCURRENCY)
+    ]
+
+    async def run_all():
+        await asyncio.gather(*[on_message(body=m) for m in messages])
+
+    with patch("assistant.answer_question", side_effect=slow_answer), patch(
+        "assistant.publish_reliably", new_callable=AsyncMock
+    ) as mock_publish:
+        start = time.monotonic()
+        asyncio.run(run_all())
+        elapsed = time.monotonic() - start
+
+    # every message still gets its own reply
+    assert mock_publish.await_count == ASSISTANT_CONCURRENCY
+    replies = [
+        json.loads(c.kwargs["queue_message"])["body"]
+        for c in mock_publish.await_args_list
+    ]
+    assert sorted(replies) == sorted(
+        f"answer to question {i}" for i in range(ASSISTANT_CONCURRENCY)
+    )
+    # the questions were answered side by side, not one after the other
+    assert elapsed < delay * ASSISTANT_CONCURRENCY
@@ -0,0 +1,114 @@
+"""unique chat session per client and user
+
+Revision ID: 5e8a2d7c3f91
+Revises: 9d4e0f6a2c17
+Create Date: 2026-10-18 12:00:13.584022
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa  # noqa
+import sqlmodel  # noqa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "5e8a2d7c3f91"
+down_revision: Union[str, None] = "9d4e0f6a2c17"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # merge the duplicated chat sessions into the oldest one, sessions
+    # without a client aren't duplicates, the unique index allows them
+    op.execute(
+        """
+        CREATE TEMPORARY TABLE duplicate_chat_session ON COMMIT DROP AS
+        SELECT id, keep_id FROM (
+            SELECT id, min(id) OVER (PARTITION BY client_id, user_id) keep_id
+            FROM chat_session
+            WHERE client_id IS NOT NULL
+        ) cs
+        WHERE id != keep_id
+        """
+    )
+    op.execute(
+        """
+        UPDATE chat SET chat_session_id = d.keep_id
+        FROM duplicate_chat_session d WHERE chat.chat_session_id = d.id
+        """
+    )
+    op.execute(
+        """
+        DELETE FROM chat_session_summary
+        USING duplicate_chat_session d
+        WHERE chat_session_summary.chat_session_id IN (d.id, d.keep_id)
+        """
+    )
+    op.execute(
+        """
+        DELETE FROM chat_session
+        USING duplicate_chat_session d WHERE chat_session.id = d.id
+        """
+    )
+    op.execute(
+        """
+        INSERT INTO chat_session_summary (
+            chat_session_id, user_id, last_message_id, last_message_at,
+            unread_client_count, unread_assistant
+        )
+        SELECT
+            cs.id,
+            cs.user_id,
+            last_message.id,
+            last_message.created_at,
+            (
+                SELECT count(*) FROM chat
+                WHERE chat.chat_session_id = cs.id
+                AND chat.status = 'UNREAD' AND chat.sender_role = 'CLIENT'
+            ),
+            EXISTS (
+                SELECT 1 FROM chat
+                WHERE chat.chat_session_id = cs.id
+                AND chat.status = 'UNREAD'
+                AND chat.sender_role = 'ASSISTANT'
+            )
+        FROM chat_session cs
+        LEFT JOIN LATERAL (
+            SELECT chat.id, chat.created_at FROM chat
+            WHERE chat.chat_session_id = cs.id
+            AND chat.sender_role != 'ASSISTANT'
+            ORDER BY chat.created_at DESC, chat.id DESC
+            LIMIT 1
+        ) last_message ON true
+        WHERE cs.id IN (SELECT keep_id FROM duplicate_chat_session)
+        """
+    )
+
+    # ### commands auto generated by Alembic - please adjust! ###
+    op.drop_index(
+        "ix_chat_session_client_id_user_id", table_name="chat_session"
+    )
+    op.create_index(
+        "ix_chat_session_client_id_user_id",
+        "chat_session",
+        ["client_id", "user_id"],
+        unique=True,
+    )
+    # ### end Alembic commands ###
+
+
+def downgrade() -> None:
+    # ### commands auto generated by Alembic - please adjust! ###
+    op.drop_index(
+        "ix_chat_session_client_id_user_id", table_name="chat_session"
+    )
+    op.create_index(
+        "ix_chat_session_client_id_user_id",
+        "chat_session",
+        ["client_id", "user_id"],
+        unique=False,
+    )
+    # ### end Alembic commands ###
@@ -0,0 +1,49 @@
+"""add failed broadcast job status
+
+Revision ID: 8c4f2a1d7b35
+Revises: 5e8a2d7c3f91
+Create Date: 2026-10-18 13:00:41.207318
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa  # noqa
+import sqlmodel  # noqa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "8c4f2a1d7b35"
+down_revision: Union[str, None] = "5e8a2d7c3f91"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute(
+        "ALTER TYPE broadcast_job_status_enum ADD VALUE IF NOT EXISTS 'FAILED'"
+    )
+
+
+def downgrade() -> None:
+    # enum values can't be dropped, the type is created again without it
+    op.execute(
+        "UPDATE broadcast_job SET status = 'COMPLETED' WHERE status = 'FAILED'"
+    )
+    op.execute(
+        "ALTER TYPE broadcast_job_status_enum "
+        "RENAME TO broadcast_job_status_enum_old"
+    )
+    op.execute(
+        "CREATE TYPE broadcast_job_status_enum "
+        "AS ENUM ('PENDING', 'RUNNING', 'COMPLETED')"
+    )
+    op.execute(
+        """
+        ALTER TABLE broadcast_job ALTER COLUMN status
+        TYPE broadcast_job_status_enum
+        USING status::text::broadcast_job_status_enum
+        """
+    )
+    op.execute("DROP TYPE broadcast_job_status_enum_old")
@@ -1,10 +1,10 @@
 import os
 import json
+import asyncio
 import logging
+import aiohttp
 import phonenumbers
 import requests
-import urllib.request
-import speech_recognition as sr
 
 from uuid import uuid4
 from datetime import datetime, timezone
@@ -19,10 +19,10 @@ from models import (
     Platform_Enum,
 )
 from typing import Optional
-from pydub import AudioSegment
-from base64 import b64encode
+from requests.adapters import HTTPAdapter
 from utils.util import TextConverter
-from utils.storage import upload
+from utils.storage import upload_stream
+from utils.transcription import transcriber
 
 
 logging.basicConfig(level=logging.INFO)
@@ -31,6 +31,9 @@ logger = logging.getLogger(__name__)
 MAX_WHATSAPP_MESSAGE_LENGTH = 1500
 STORAGE = "./storage"
 ALLOWED_MESSAGE_TYPES = ["text", "image"]
+TWILIO_MAX_CONNECTIONS = int(os.getenv("TWILIO_MAX_CONNECTIONS", 20))
+TWILIO_REQUEST_TIMEOUT = int(os.getenv("TWILIO_REQUEST_TIMEOUT", 15))
+MEDIA_CHUNK_SIZE = 64 * 1024
 
 
 class IncomingMessage(BaseModel):
@@ -45,69 +48,189 @@ class PhoneValidationModel(BaseModel):
 
 
 class TwilioClient:
+    # one pooled keep-alive HTTP session per event loop, shared by every
+    # TwilioClient instance and created on first use
+    _http_session: Optional[aiohttp.ClientSession] = None
+    _http_session_loop: Optional[asyncio.AbstractEventLoop] = None
+    # media is downloaded from worker threads, with a pooled session of
+    # its own
+    _media_session: Optional[requests.Session] = None
+
     def __init__(self):
         self.TWILIO_ACCOUNT_SID = os.getenv("TWILIO_ACCOUNT_SID")
         self.TWILIO_AUTH_TOKEN = os.getenv("TWILIO_AUTH_TOKEN")
         self.TWILIO_WHATSAPP_NUMBER = os.getenv("TWILIO_WHATSAPP_NUMBER")
         self.TWILIO_WHATSAPP_FROM = f"whatsapp:{self.TWILIO_WHATSAPP_NUMBER}"
+        self.TWILIO_API_BASE_URL = os.getenv(
+            "TWILIO_API_BASE_URL", "https://api.twilio.com"
+        )
 
+        # the REST client is only used for the (blocking) content API,
+        # messages are sent through the async HTTP session below
         self.twilio_client = Client(
             self.TWILIO_ACCOUNT_SID, self.TWILIO_AUTH_TOKEN
         )
 
+    @classmethod
+    def get_http_session(cls) -> aiohttp.ClientSession:
+        loop = asyncio.get_running_loop()
+        if (
+            cls._http_session is None
+            or cls._http_session.closed
+            or cls._http_session_loop is not loop
+        ):
+            cls._http_session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=TWILIO_MAX_CONNECTIONS, keepalive_timeout=60
+                ),
+                timeout=aiohttp.ClientTimeout(total=TWILIO_REQUEST_TIMEOUT),
+            )
+            cls._http_session_loop = loop
+        return cls._http_session
+
+    @classmethod
+    async def close_http_session(cls):
+        if cls._http_session and not cls._http_session.closed:
+            await cls._http_session.close()
+        cls._http_session = None
+        cls._http_session_loop = None
+
+    @property
+    def messages_url(self) -> str:
+        return (
+            f"{self.TWILIO_API_BASE_URL}/2010-04-01/Accounts/"
+            f"{self.TWILIO_ACCOUNT_SID}/Messages.json"
+        )
+
+    async def create_message(self, to: str, **params) -> bool:
+        """
+        Creates a WhatsApp message through the Twilio Messages API without
+        blocking the event loop. Extra params are sent as form fields, e.g.
+        Body or ContentSid and ContentVariables.
+
+        Raises TwilioRestException when Twilio rejects the request.
+        """
+        data = {
+            "From": self.TWILIO_WHATSAPP_FROM,
+            "To": f"whatsapp:{to}",
+            **params,
+        }
+        auth = aiohttp.BasicAuth(
+            self.TWILIO_ACCOUNT_SID or "", self.TWILIO_AUTH_TOKEN or ""
+        )
+        session = self.get_http_session()
+        async with session.post(
+            self.messages_url, data=data, auth=auth
+        ) as response:
+            try:
+                payload = await response.json(content_type=None)
+            except ValueError:
+                payload = {}
+            if response.status >= 400:
+                raise TwilioRestException(
+                    status=response.status,
+                    uri=self.messages_url,
+                    msg=payload.get("message", response.reason),
+                    code=payload.get("code"),
+                    method="POST",
+                )
+        if payload.get("error_code") is not None:
+            logger.error(
+                f"Failed to send message to WhatsApp number "
+                f"{to}: {payload.get('error_message')}"
+            )
+            return False
+        return True
+
+    @classmethod
+    def get_media_session(cls) -> requests.Session:
+        if cls._media_session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_maxsize=TWILIO_MAX_CONNECTIONS)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            cls._media_session = session
+        return cls._media_session
+
+    def get_media(self, url: str) -> requests.Response:
+        """
+        Requests a media file as a stream. Twilio redirects to the file,
+        the credentials are only sent to Twilio.
+        """
+        response = self.get_media_session().get(
+            url,
+            auth=(self.TWILIO_ACCOUNT_SID, self.TWILIO_AUTH_TOKEN),
+            stream=True,
+            timeout=TWILIO_REQUEST_TIMEOUT,
+        )
+        response.raise_for_status()
+        return response
+
     def download_media(self, url: str, folder: str, filename: str):
-        # create authentication token
-        auth_str = f"{self.TWILIO_ACCOUNT_SID}:{self.TWILIO_AUTH_TOKEN}"
-        auth_bytes = auth_str.encode("utf-8")
-        auth_b64 = b64encode(auth_bytes).decode("utf-8")
-        headers = {"Authorization": "Basic " + auth_b64}
-
-        # download and convert the audio file
-        response = requests.get(url=url, headers=headers)
         filepath = f"{STORAGE}/{folder}"
         if not os.path.exists(filepath):
             os.makedirs(filepath)
 
         filepath = f"{filepath}/{filename}"
-        urllib.request.urlretrieve(response.url, filepath)
+        with self.get_media(url=url) as response, open(filepath, "wb") as f:
+            for chunk in response.iter_content(chunk_size=MEDIA_CHUNK_SIZE):
+                f.write(chunk)
         return filepath
 
-    async def whatsapp_message_create(self, to: str, body: str):
+    def upload_media(
+        self,
+        url: str,
+        folder: str,
+        filename: str,
+        content_type: str,
+        public: bool = False,
+    ) -> str:
+        """
+        Streams a media file from Twilio straight into the storage, it's
+        fetched once and never written to the local disk.
+        """
+        with self.get_media(url=url) as response:
+            return upload_stream(
+                chunks=response.iter_content(chunk_size=MEDIA_CHUNK_SIZE),
+                folder=folder,
+                filename=filename,
+                content_type=content_type,
+                public=public,
+            )
+
+    async def whatsapp_message_create(self, to: str, body: str) -> bool:
         try:
-            response = self.twilio_client.messages.create(
-                from_=self.TWILIO_WHATSAPP_FROM,
-                body=TextConverter(body).format_whatsapp(),
-                to=f"whatsapp:{to}",
+            sent = await self.create_message(
+                to=to, Body=TextConverter(body).format_whatsapp()
             )
-            if response.error_code is not None:
-                logger.error(
-                    f"Failed to send message to WhatsApp number "
-                    f"{to}: {response.error_message}"
-                )
-            logger.info(f"Message sent to WhatsApp: {body}")
+            if sent:
+                logger.info(f"Message sent to WhatsApp: {body}")
+            return sent
         except TwilioRestException as e:
             logger.error(f"Error sending message to Twilio: {e}")
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.error(f"Error connecting to Twilio: {e}")
+        return False
 
     async def whatsapp_message_template_create(
         self, to: str, content_variables: dict, content_sid: str
-    ):
+    ) -> bool:
         try:
-            response = self.twilio_client.messages.create(
-                content_sid=content_sid,
-                to=f"whatsapp:{to}",
-                from_=self.TWILIO_WHATSAPP_FROM,
-                content_variables=json.dumps(content_variables),
+            sent = await self.create_message(
+                to=to,
+                ContentSid=content_sid,
+                ContentVariables=json.dumps(content_variables),
             )
-            if response.error_code is not None:
-                logger.error(
-                    f"Failed to send message to WhatsApp number "
-                    f"{to}: {response.error_message}"
+            if sent:
+                logger.info(
+                    f"Template message sent to WhatsApp: {content_variables}"
                 )
-            logger.info(
-                f"Template message sent to WhatsApp: {content_variables}"
-            )
+            return sent
         except TwilioRestException as e:
             logger.error(f"Error sending template message to Twilio: {e}")
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.error(f"Error connecting to Twilio: {e}")
+        return False
 
     async def send_whatsapp_message(self, body: str) -> None:
         try:
@@ -164,13 +287,7 @@ class TwilioClient:
 
                 # AUDIO
                 if media_url and media_type == "audio/ogg":
-                    audio_filepath = self.ogg2mp3(
-                        audio_url=media_url, message_sid=values["MessageSid"]
-                    )
-                    logger.info(f"Audio converted {audio_filepath}")
-                    transcription = self.transcribe_audio(
-                        wav_path=audio_filepath
-                    )
+                    transcription = self.transcribe_media(url=media_url)
                     message_body = transcription if transcription else ""
 
                 # IMAGE
@@ -178,13 +295,11 @@ class TwilioClient:
                     uid = uuid4()
                     filetype = media_type.split("/")[1]
                     filename = f"{values["MessageSid"]}-{str(uid)}.{filetype}"
-                    filepath = self.download_media(
-                        url=media_url, folder="media", filename=filename
-                    )
-                    bucket_url = upload(
-                        file=filepath,
+                    bucket_url = self.upload_media(
+                        url=media_url,
                         folder="media",
                         filename=filename,
+                        content_type=media_type,
                         public=True,
                     )
                     media.append({"url": bucket_url, "type": media_type})
@@ -214,42 +329,18 @@ class TwilioClient:
             logger.error(f"Error formatting message: {e}")
             raise ValueError(f"Error formatting message: {e}")
 
-    def ogg2mp3(self, audio_url: str, message_sid: str):
+    def transcribe_media(self, url: str) -> Optional[str]:
+        """
+        Transcribes a voice note, it's decoded in memory without writing
+        it to the local disk.
+        """
         try:
-            filepath = self.download_media(
-                url=audio_url, folder="media", filename=f"{message_sid}.ogg"
-            )
-            audio_file = AudioSegment.from_ogg(filepath)
-            converted_filepath = f"{filepath}/{message_sid}.wav"
-            audio_file.export(converted_filepath, format="wav")
-            os.remove(filepath)
-            return os.path.join(os.getcwd(), converted_filepath)
-        except Exception as e:
+            with self.get_media(url=url) as response:
+                audio = response.content
+        except requests.RequestException as e:
             logger.error(f"Error downloading audio file: {e}")
             return None
-
-    def transcribe_audio(self, wav_path: str):
-        try:
-            recognizer = sr.Recognizer()
-            with sr.AudioFile(wav_path) as source:
-                audio_data = recognizer.record(source)
-            text = recognizer.recognize_google(audio_data)
-            logger.info("Audio transcription: " + text)
-            return text
-        except sr.UnknownValueError:
-            logger.error(
-                "Google Speech Recognition could not understand audio"
-            )
-            return None
-        except sr.RequestError as e:
-            logger.error(
-                "Could not request results from Google Speech Recognition "
-                f"service; {e}"
-            )
-            return None
-        except Exception as e:
-            logger.error(f"Exception error: {e}")
-            return None
+        return transcriber.transcribe(audio=audio, format="ogg")
 
     def get_message_template(self, content_sid: str):
         try:
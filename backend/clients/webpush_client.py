@@ -0,0 +1,177 @@
+import os
+import json
+import time
+import asyncio
+import logging
+import aiohttp
+
+from types import MappingProxyType
+from urllib.parse import urlparse
+from typing import Mapping, Optional
+from py_vapid import Vapid
+from pywebpush import WebPusher
+from models import Subscription, VAPID_PRIVATE_KEY, VAPID_CLAIMS
+
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+WEBPUSH_CONCURRENCY = int(os.getenv("WEBPUSH_CONCURRENCY", 10))
+WEBPUSH_REQUEST_TIMEOUT = int(os.getenv("WEBPUSH_REQUEST_TIMEOUT", 10))
+# signed VAPID tokens are valid for 12 hours (the maximum is 24 hours)
+VAPID_TOKEN_LIFETIME = 12 * 60 * 60
+# a cached token is renewed when it expires within this many seconds
+VAPID_TOKEN_RENEW_MARGIN = 5 * 60
+# push services answer these when a subscription expired or unsubscribed
+EXPIRED_SUBSCRIPTION_STATUS = {404, 410}
+
+
+def get_push_audience(endpoint: str) -> str:
+    url = urlparse(endpoint)
+    return f"{url.scheme}://{url.netloc}"
+
+
+class VapidSigner:
+    """
+    Signs the VAPID Authorization header of web push requests. The signed
+    token only depends on the push service (the audience), so the header
+    is cached per audience and reused until shortly before it expires,
+    instead of signing a new token for every notification.
+
+    The base claims are read-only; every token is signed from a new,
+    immutable claims mapping, so concurrent pushes to different push
+    services can't overwrite each other's audience.
+    """
+
+    def __init__(
+        self,
+        private_key: str = VAPID_PRIVATE_KEY,
+        claims: Mapping = VAPID_CLAIMS,
+        lifetime: int = VAPID_TOKEN_LIFETIME,
+        renew_margin: int = VAPID_TOKEN_RENEW_MARGIN,
+    ):
+        self.private_key = private_key
+        self.claims = MappingProxyType(dict(claims))
+        self.lifetime = lifetime
+        self.renew_margin = renew_margin
+        self._vapid = None
+        # audience -> (Authorization headers, expiry)
+        self._headers: dict[str, tuple[Mapping, int]] = {}
+
+    def get_claims(self, audience: str, expires_at: int) -> Mapping:
+        return MappingProxyType(
+            {**self.claims, "aud": audience, "exp": expires_at}
+        )
+
+    def get_headers(self, endpoint: str) -> dict:
+        audience = get_push_audience(endpoint)
+        now = int(time.time())
+        cached = self._headers.get(audience)
+        if not cached or cached[1] - self.renew_margin <= now:
+            if self._vapid is None:
+                self._vapid = Vapid.from_string(private_key=self.private_key)
+            expires_at = now + self.lifetime
+            headers = self._vapid.sign(
+                # py_vapid serializes the claims with json, which needs a dict
+                dict(self.get_claims(audience=audience, expires_at=expires_at))
+            )
+            cached = (MappingProxyType(headers), expires_at)
+            self._headers[audience] = cached
+        # a copy, the request headers are extended by the sender
+        return dict(cached[0])
+
+
+vapid_signer = VapidSigner()
+
+
+class WebPushClient:
+    # one pooled keep-alive HTTP session per event loop, shared by every
+    # WebPushClient instance and created on first use
+    _http_session: Optional[aiohttp.ClientSession] = None
+    _http_session_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def __init__(
+        self,
+        signer: VapidSigner = None,
+        concurrency: int = WEBPUSH_CONCURRENCY,
+        timeout: float = WEBPUSH_REQUEST_TIMEOUT,
+    ):
+        self.signer = signer or vapid_signer
+        self.concurrency = concurrency
+        self.timeout = timeout
+
+    @classmethod
+    def get_http_session(cls) -> aiohttp.ClientSession:
+        loop = asyncio.get_running_loop()
+        if (
+            cls._http_session is None
+            or cls._http_session.closed
+            or cls._http_session_loop is not loop
+        ):
+            cls._http_session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(keepalive_timeout=60),
+                timeout=aiohttp.ClientTimeout(total=WEBPUSH_REQUEST_TIMEOUT),
+            )
+            cls._http_session_loop = loop
+        return cls._http_session
+
+    @classmethod
+    async def close_http_session(cls):
+        if cls._http_session and not cls._http_session.closed:
+            await cls._http_session.close()
+        cls._http_session = None
+        cls._http_session_loop = None
+
+    async def send(self, subscription: Subscription, data: str) -> int:
+        """
+        Sends one notification and returns the push service HTTP status.
+        """
+        pusher = WebPusher(
+            subscription_info={
+                "endpoint": subscription.endpoint,
+                "keys": json.loads(subscription.keys),
+            },
+            aiohttp_session=self.get_http_session(),
+        )
+        response = await pusher.send_async(
+            data=data,
+            headers=self.signer.get_headers(subscription.endpoint),
+            # pywebpush passes its own default of 10000 seconds to the
+            # request, which would override the session timeout
+            timeout=self.timeout,
+        )
+        return response.status
+
+    async def send_all(
+        self, subscriptions: list[Subscription], data: str
+    ) -> list[Subscription]:
+        """
+        Sends the notification to all subscriptions at once, at most
+        `concurrency` requests at a time. Returns the subscriptions the
+        push service reported as expired.
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def send(subscription: Subscription) -> Optional[int]:
+            async with semaphore:
+                try:
+                    return await self.send(
+                        subscription=subscription, data=data
+                    )
+                except Exception as e:
+                    logger.error(
+                        f"Failed to send notification "
+                        f"{subscription.endpoint}: {e}"
+                    )
+
+        statuses = await asyncio.gather(*(send(s) for s in subscriptions))
+        expired = []
+        for subscription, status in zip(subscriptions, statuses):
+            if status in EXPIRED_SUBSCRIPTION_STATUS:
+                expired.append(subscription)
+            elif status and status > 202:
+                logger.error(
+                    f"Failed to send notification {subscription.endpoint}: "
+                    f"{status}"
+                )
+        return expired
@@ -0,0 +1,30 @@
+import timeit
+
+from utils.util import TextConverter
+
+# a typical assistant answer
+ANSWER = (
+    "# Managing fall armyworm\n"
+    "## Signs\n"
+    "Look for **ragged holes** in the leaves and _sawdust-like_ frass.\n"
+    "## What to do\n"
+    "- Scout the field **twice a week**\n"
+    "- Hand-pick egg masses and larvae\n"
+    "  - Crush them or drop them in soapy water\n"
+    "- Spray `Bacillus thuringiensis` in the evening\n"
+    "~~Burning the field~~ is not recommended.\n"
+    "Read more on [the FAO page](https://www.fao.org/fall-armyworm/en/)."
+)
+NUMBER = 10000
+
+
+def run_benchmark():
+    for name in ("format_whatsapp", "format_slack"):
+        seconds = timeit.timeit(
+            lambda: getattr(TextConverter(ANSWER), name)(), number=NUMBER
+        )
+        print(f"{name}: {seconds / NUMBER * 1e6:.1f} µs per message")
+
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,204 @@
+import os
+import json
+import asyncio
+import logging
+
+from datetime import datetime, timezone
+from sqlalchemy import text
+from sqlmodel import select, func
+from sqlmodel.ext.asyncio.session import AsyncSession
+from core.database import async_engine
+from clients.twilio_client import TwilioClient
+from core.socketio_config import to_db_datetime
+from models import (
+    Broadcast_Job,
+    Broadcast_Recipient,
+    Broadcast_Job_Status_Enum,
+    Broadcast_Recipient_Status_Enum,
+)
+from utils.rate_limiter import TokenBucket
+
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+tz = timezone.utc
+
+BROADCAST_MESSAGES_PER_SECOND = float(
+    os.getenv("BROADCAST_MESSAGES_PER_SECOND", 10)
+)
+BROADCAST_MAX_ATTEMPTS = int(os.getenv("BROADCAST_MAX_ATTEMPTS", 3))
+BROADCAST_RETRY_BACKOFF = float(os.getenv("BROADCAST_RETRY_BACKOFF", 2))
+BROADCAST_BATCH_SIZE = int(os.getenv("BROADCAST_BATCH_SIZE", 100))
+# namespace of the advisory locks that keep a job on a single worker
+BROADCAST_LOCK_NAMESPACE = 1001
+UNFINISHED_JOB_STATUSES = (
+    Broadcast_Job_Status_Enum.PENDING,
+    Broadcast_Job_Status_Enum.RUNNING,
+)
+
+
+class BroadcastWorker:
+    """
+    Sends the pending recipients of broadcast jobs in the background.
+    The jobs of a process share one token bucket, which isn't shared
+    with other backend workers: with N workers, N jobs can send at N
+    times `rate`, so divide the WhatsApp throughput limit by the number
+    of workers. Progress is committed after every batch, which lets
+    `resume` continue unfinished jobs after a restart.
+    """
+
+    def __init__(
+        self,
+        sender=None,
+        rate: float = BROADCAST_MESSAGES_PER_SECOND,
+        max_attempts: int = BROADCAST_MAX_ATTEMPTS,
+        backoff: float = BROADCAST_RETRY_BACKOFF,
+        batch_size: int = BROADCAST_BATCH_SIZE,
+    ):
+        self.sender = sender or TwilioClient()
+        self.bucket = TokenBucket(rate=rate)
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.batch_size = batch_size
+        self.tasks: dict[int, asyncio.Task] = {}
+
+    def start(self, job_id: int) -> asyncio.Task:
+        task = self.tasks.get(job_id)
+        if task and not task.done():
+            return task
+        task = asyncio.create_task(self.run(job_id=job_id))
+        self.tasks[job_id] = task
+        task.add_done_callback(lambda _: self.tasks.pop(job_id, None))
+        return task
+
+    def get_session(self) -> AsyncSession:
+        # the worker runs on the event loop of the API, so it never
+        # blocks it with synchronous queries
+        return AsyncSession(async_engine, expire_on_commit=False)
+
+    async def resume(self) -> list[int]:
+        async with self.get_session() as session:
+            job_ids = (
+                await session.exec(
+                    select(Broadcast_Job.id).where(
+                        Broadcast_Job.status.in_(UNFINISHED_JOB_STATUSES)
+                    )
+                )
+            ).all()
+        for job_id in job_ids:
+            logger.info(f"Resuming broadcast job {job_id}")
+            self.start(job_id=job_id)
+        return job_ids
+
+    async def stop(self):
+        tasks = list(self.tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def send(self, recipient: Broadcast_Recipient) -> bool:
+        if recipient.content_sid:
+            return await self.sender.whatsapp_message_template_create(
+                to=recipient.phone_number,
+                content_variables=json.loads(recipient.content_variables),
+                content_sid=recipient.content_sid,
+            )
+        return await self.sender.whatsapp_message_create(
+            to=recipient.phone_number, body=recipient.body
+        )
+
+    async def deliver(self, recipient: Broadcast_Recipient):
+        while recipient.attempts < self.max_attempts:
+            if recipient.attempts:
+                await asyncio.sleep(
+                    self.backoff * 2 ** (recipient.attempts - 1)
+                )
+            await self.bucket.acquire()
+            recipient.attempts += 1
+            try:
+                if await self.send(recipient=recipient):
+                    recipient.status = Broadcast_Recipient_Status_Enum.SENT
+                    recipient.sent_at = to_db_datetime(datetime.now(tz))
+                    return
+            except Exception as e:
+                logger.error(
+                    f"Error sending broadcast to {recipient.phone_number}: {e}"
+                )
+        recipient.status = Broadcast_Recipient_Status_Enum.FAILED
+
+    async def run(self, job_id: int):
+        # every backend worker resumes unfinished jobs on startup, the
+        # advisory lock makes sure only one of them sends each job
+        async with async_engine.connect() as lock:
+            locked = (
+                await lock.execute(
+                    text("SELECT pg_try_advisory_lock(:namespace, :job_id)"),
+                    {"namespace": BROADCAST_LOCK_NAMESPACE, "job_id": job_id},
+                )
+            ).scalar()
+            if not locked:
+                logger.info(f"Broadcast job {job_id} runs on another worker")
+                return
+            try:
+                await self.send_job(job_id=job_id)
+            finally:
+                await lock.execute(
+                    text("SELECT pg_advisory_unlock(:namespace, :job_id)"),
+                    {"namespace": BROADCAST_LOCK_NAMESPACE, "job_id": job_id},
+                )
+
+    async def send_job(self, job_id: int):
+        async with self.get_session() as session:
+            job = await session.get(Broadcast_Job, job_id)
+            if not job or job.status not in UNFINISHED_JOB_STATUSES:
+                return
+            job.status = Broadcast_Job_Status_Enum.RUNNING
+            await session.commit()
+
+            while True:
+                recipients = (
+                    await session.exec(
+                        select(Broadcast_Recipient)
+                        .where(Broadcast_Recipient.job_id == job_id)
+                        .where(
+                            Broadcast_Recipient.status
+                            == Broadcast_Recipient_Status_Enum.PENDING
+                        )
+                        .order_by(Broadcast_Recipient.id)
+                        .limit(self.batch_size)
+                    )
+                ).all()
+                if not recipients:
+                    break
+                await asyncio.gather(
+                    *(self.deliver(recipient=r) for r in recipients)
+                )
+                await session.commit()
+
+            progress = dict(
+                (
+                    await session.exec(
+                        select(
+                            Broadcast_Recipient.status,
+                            func.count(Broadcast_Recipient.id),
+                        )
+                        .where(Broadcast_Recipient.job_id == job_id)
+                        .group_by(Broadcast_Recipient.status)
+                    )
+                ).all()
+            )
+            # a broadcast nobody received didn't complete, partly sent
+            # broadcasts complete and report the failures in the counters
+            job.status = (
+                Broadcast_Job_Status_Enum.FAILED
+                if progress.get(Broadcast_Recipient_Status_Enum.FAILED)
+                and not progress.get(Broadcast_Recipient_Status_Enum.SENT)
+                else Broadcast_Job_Status_Enum.COMPLETED
+            )
+            job.completed_at = to_db_datetime(datetime.now(tz))
+            await session.commit()
+            logger.info(f"Broadcast job {job_id} {job.status.value.lower()}")
+
+
+broadcast_worker = BroadcastWorker()
@@ -0,0 +1,134 @@
+import os
+import bisect
+
+from collections import OrderedDict
+from typing import Optional
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from models import Chat, Sender_Role_Enum
+
+
+ASSISTANT_LAST_MESSAGES_LIMIT = int(
+    os.getenv("ASSISTANT_LAST_MESSAGES_LIMIT", 10)
+)
+BACKEND_WORKERS = int(os.getenv("BACKEND_WORKERS", 1))
+# a worker's cache doesn't see the chats written by the other workers, so
+# it is only on by default with a single worker
+CHAT_HISTORY_CACHE_SESSIONS = int(
+    os.getenv(
+        "CHAT_HISTORY_CACHE_SESSIONS", 1000 if BACKEND_WORKERS == 1 else 0
+    )
+)
+# the chats the assistant gets as conversation history
+HISTORY_SENDER_ROLES = (
+    Sender_Role_Enum.USER,
+    Sender_Role_Enum.CLIENT,
+    Sender_Role_Enum.ASSISTANT,
+)
+
+
+class ChatHistoryCache:
+    """
+    The latest chats of the most recently active chat sessions, for the
+    assistant's conversation history. Each session keeps at most `size`
+    chats in (created_at, id) order, and the least recently used session
+    is evicted beyond `max_sessions`.
+
+    Chats are appended as they are written. A session that isn't cached
+    is loaded with one query on the (chat_session_id, created_at, id)
+    index. Each backend worker has its own cache, so it is off by default
+    with more than one worker (BACKEND_WORKERS) and the history is always
+    queried.
+    """
+
+    def __init__(
+        self,
+        max_sessions: int = CHAT_HISTORY_CACHE_SESSIONS,
+        size: int = ASSISTANT_LAST_MESSAGES_LIMIT + 1,
+    ):
+        self.max_sessions = max_sessions
+        self.size = size
+        # chat_session_id -> [(created_at, chat id, history entry)]
+        self._sessions: OrderedDict[int, list] = OrderedDict()
+
+    def __contains__(self, chat_session_id: int) -> bool:
+        return chat_session_id in self._sessions
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def clear(self):
+        self._sessions.clear()
+
+    def _insert(self, chats: list, chat: Chat):
+        bisect.insort(
+            chats,
+            (chat.created_at, chat.id, chat.to_assistant_history()),
+            key=lambda entry: entry[:2],
+        )
+        del chats[: -self.size]
+
+    def append(self, chat: Chat):
+        """
+        Adds a written chat to its session, if the session is cached.
+        Call it after the chat is committed.
+        """
+        chats = self._sessions.get(chat.chat_session_id)
+        if chats is None or chat.sender_role not in HISTORY_SENDER_ROLES:
+            return
+        if any(entry[1] == chat.id for entry in chats):
+            return
+        self._insert(chats, chat)
+
+    def _get_entries(self, chat_session_id: int) -> Optional[list]:
+        chats = self._sessions.get(chat_session_id)
+        if chats is not None:
+            self._sessions.move_to_end(chat_session_id)
+        return chats
+
+    def set(self, chat_session_id: int, chats: list[Chat]) -> list:
+        entries = []
+        for chat in chats:
+            self._insert(entries, chat)
+        if self.max_sessions <= 0:
+            return entries
+        self._sessions[chat_session_id] = entries
+        self._sessions.move_to_end(chat_session_id)
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+        return entries
+
+    def get(self, chat_session_id: int) -> Optional[list[dict]]:
+        chats = self._get_entries(chat_session_id)
+        if chats is None:
+            return None
+        return [entry[2] for entry in chats]
+
+    async def get_history(
+        self, session: AsyncSession, chat_session_id: int, chat_id: int
+    ) -> list[dict]:
+        """
+        The conversation history before the chat `chat_id` of the session,
+        oldest first. Chats of the session written after it, e.g. by
+        another consumer, aren't part of its history.
+        """
+        chats = self._get_entries(chat_session_id)
+        if chats is None:
+            last_chats = (
+                await session.exec(
+                    select(Chat)
+                    .where(
+                        Chat.chat_session_id == chat_session_id,
+                        Chat.sender_role.in_(HISTORY_SENDER_ROLES),
+                    )
+                    .order_by(Chat.created_at.desc(), Chat.id.desc())
+                    .limit(self.size)
+                )
+            ).all()
+            chats = self.set(chat_session_id, last_chats)
+        chat_ids = [entry[1] for entry in chats]
+        end = chat_ids.index(chat_id) if chat_id in chat_ids else len(chats)
+        return [entry[2] for entry in chats[:end]]
+
+
+chat_history_cache = ChatHistoryCache()
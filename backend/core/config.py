@@ -1,11 +1,10 @@
 import os
-import asyncio
 import logging
 import requests
 
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, Depends, HTTPException
-from core.database import get_session
+from core.database import get_session, async_engine
 from sqlmodel import Session, text, select
 from models import Chat
 
@@ -19,9 +18,16 @@ from routes import (
     static_routes,
 )
 from Akvo_rabbitmq_client import rabbitmq_client
+from clients.twilio_client import TwilioClient
+from core.broadcast import broadcast_worker
+from core.push_notification import push_dispatcher
+from utils.transcription import transcriber
+from utils.templates import template_registry
 from core.socketio_config import (
     sio_app,
     assistant_to_user,
+    whatsapp_to_user,
+    RABBITMQ_QUEUE_WHATSAPP_MESSAGES,
 )
 
 
@@ -32,27 +38,50 @@ logger = logging.getLogger(__name__)
 RABBITMQ_QUEUE_USER_CHAT_REPLIES = os.getenv(
     "RABBITMQ_QUEUE_USER_CHAT_REPLIES"
 )
+USER_CHAT_REPLIES_CONCURRENCY = int(
+    os.getenv("USER_CHAT_REPLIES_CONCURRENCY", 8)
+)
+USER_CHAT_REPLIES_PREFETCH = int(
+    os.getenv("USER_CHAT_REPLIES_PREFETCH", USER_CHAT_REPLIES_CONCURRENCY * 2)
+)
+WHATSAPP_MESSAGES_CONCURRENCY = int(
+    os.getenv("WHATSAPP_MESSAGES_CONCURRENCY", 4)
+)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    # loaded once, reloaded when the file changes or on SIGHUP
+    template_registry.start()
     await rabbitmq_client.initialize()
-    loop = asyncio.get_running_loop()
-
-    async def consume_task():
-        await rabbitmq_client.consume(
-            queue_name=RABBITMQ_QUEUE_USER_CHAT_REPLIES,
-            routing_key=RABBITMQ_QUEUE_USER_CHAT_REPLIES,
-            callback=assistant_to_user,
-        )
-
-    consumer_task = loop.create_task(consume_task())
+    # registers the consumer once; the client re-registers it on reconnect
+    await rabbitmq_client.consume(
+        queue_name=RABBITMQ_QUEUE_USER_CHAT_REPLIES,
+        routing_key=RABBITMQ_QUEUE_USER_CHAT_REPLIES,
+        callback=assistant_to_user,
+        prefetch_count=USER_CHAT_REPLIES_PREFETCH,
+        concurrency=USER_CHAT_REPLIES_CONCURRENCY,
+    )
+    await rabbitmq_client.consume(
+        queue_name=RABBITMQ_QUEUE_WHATSAPP_MESSAGES,
+        routing_key=RABBITMQ_QUEUE_WHATSAPP_MESSAGES,
+        callback=whatsapp_to_user,
+        concurrency=WHATSAPP_MESSAGES_CONCURRENCY,
+    )
+    if not os.getenv("TESTING"):
+        # continue broadcasts that were interrupted by a restart
+        await broadcast_worker.resume()
 
     try:
         yield
     finally:
-        consumer_task.cancel()
+        await broadcast_worker.stop()
         await rabbitmq_client.disconnect()
+        await TwilioClient.close_http_session()
+        await push_dispatcher.stop()
+        transcriber.shutdown()
+        await template_registry.stop()
+        await async_engine.dispose()
 
 
 app = FastAPI(
@@ -82,9 +111,10 @@ app.include_router(static_routes.router, tags=["static file"])
 
 async def check_rabbitmq():
     try:
-        await rabbitmq_client.connect(max_retries=1)
-        await rabbitmq_client.disconnect()
-        return True
+        # reuse (and if needed heal) the long-lived publisher connection
+        # instead of opening and closing a new one
+        await rabbitmq_client.initialize(max_retries=1)
+        return rabbitmq_client.is_connected()
     except Exception as e:
         logger.error(f"RabbitMQ health check failed: {e}")
         return False
@@ -132,12 +162,17 @@ async def health_check(session: Session = Depends(get_session)):
         ),
         "backend": True,
     }
+    metrics = {"rabbitmq_publisher": rabbitmq_client.metrics.to_dict()}
     if all(services.values()):
-        return {"status": "healthy", "services": services}
+        return {"status": "healthy", "services": services, "metrics": metrics}
     else:
         raise HTTPException(
             status_code=503,
-            detail={"status": "unhealthy", "services": services},
+            detail={
+                "status": "unhealthy",
+                "services": services,
+                "metrics": metrics,
+            },
         )
 
 
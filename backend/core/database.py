@@ -1,5 +1,8 @@
 from os import environ
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
 from sqlmodel import create_engine, Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 
 def get_db_url():
@@ -9,8 +12,14 @@ def get_db_url():
     return DB_URL
 
 
+def get_async_db_url():
+    return make_url(get_db_url()).set(drivername="postgresql+asyncpg")
+
+
 engine = create_engine(get_db_url(), echo=False)
 
+async_engine = create_async_engine(get_async_db_url(), echo=False)
+
 
 def get_session():
     session = Session(engine)
@@ -18,3 +27,9 @@ def get_session():
         yield session
     finally:
         session.close()
+
+
+def get_async_session() -> AsyncSession:
+    # keep attributes loaded after commit, reloading expired attributes
+    # would need an implicit query, which isn't possible in async code
+    return AsyncSession(async_engine, expire_on_commit=False)
@@ -0,0 +1,79 @@
+import json
+import asyncio
+import logging
+
+from sqlmodel import select, delete
+from core.database import get_async_session
+from clients.webpush_client import WebPushClient
+from models import Subscription
+
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+MAX_NOTIFICATION_BODY_LENGTH = 150
+
+
+class PushDispatcher:
+    """
+    Sends web push notifications in background tasks, so the message
+    delivery to the websocket and the assistant never waits on the push
+    services. Subscriptions that expired are deleted in one statement
+    per notification.
+    """
+
+    def __init__(self, client: WebPushClient = None):
+        self.client = client or WebPushClient()
+        self.tasks: set[asyncio.Task] = set()
+
+    def notify_user(self, user_id: int, title: str, body: str) -> asyncio.Task:
+        task = asyncio.create_task(
+            self.send(user_id=user_id, title=title, body=body)
+        )
+        # keep a reference until the task is done
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return task
+
+    async def send(self, user_id: int, title: str, body: str):
+        # Truncate and add ellipsis if needed
+        if len(body) > MAX_NOTIFICATION_BODY_LENGTH:
+            body = body[:MAX_NOTIFICATION_BODY_LENGTH] + "..."
+        data = json.dumps({"title": title, "body": body})
+        try:
+            async with get_async_session() as session:
+                subscriptions = (
+                    await session.exec(
+                        select(Subscription).where(
+                            Subscription.user_id == user_id
+                        )
+                    )
+                ).all()
+                if not subscriptions:
+                    return
+                expired = await self.client.send_all(
+                    subscriptions=subscriptions, data=data
+                )
+                if expired:
+                    logger.warning(
+                        "Removing invalid subscriptions: "
+                        f"{[s.endpoint for s in expired]}"
+                    )
+                    await session.exec(
+                        delete(Subscription).where(
+                            Subscription.id.in_([s.id for s in expired])
+                        )
+                    )
+                    await session.commit()
+        except Exception as e:
+            logger.error(
+                f"Failed to send notifications to user {user_id}: {e}"
+            )
+
+    async def stop(self):
+        tasks = list(self.tasks)
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await self.client.close_http_session()
+
+
+push_dispatcher = PushDispatcher()
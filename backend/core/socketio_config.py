@@ -1,4 +1,5 @@
 import os
+import asyncio
 import socketio
 import logging
 import json
@@ -15,25 +16,31 @@ from models import (
     Platform_Enum,
     Chat,
     Chat_Status_Enum,
-    Subscription,
-    VAPID_PRIVATE_KEY,
-    VAPID_CLAIMS,
 )
-from core.database import engine
-from sqlmodel import Session, select, and_
+from core.database import get_async_session
+from sqlalchemy import update
+from sqlalchemy.orm import joinedload, selectinload
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from datetime import datetime, timezone
 from fastapi import HTTPException
 from socketio.exceptions import ConnectionRefusedError
-from utils.util import get_value_or_raise_error
+from utils.util import get_value_or_raise_error, sanitize_phone_number
 from clients.twilio_client import TwilioClient
 from clients.slack_client import SlackBotClient
-from db import add_media, check_if_after_24h_window
-from typing import Optional, List
-from pywebpush import webpush, WebPushException
-from utils.util import (
-    generate_message_template_lang_by_phone_number,
-    get_template_content_from_json,
+from core.push_notification import push_dispatcher
+from core.chat_history import chat_history_cache
+from db import (
+    add_media,
+    check_if_after_24h_window,
+    upsert_client,
+    upsert_chat_session,
+    upsert_chat_session_summary,
+    read_chat_session_summary,
 )
+from typing import Optional, List
+from utils.util import generate_message_template_lang_by_phone_number
+from utils.templates import template_registry
 
 
 logging.basicConfig(level=logging.INFO)
@@ -44,20 +51,45 @@ RABBITMQ_QUEUE_USER_CHATS = os.getenv("RABBITMQ_QUEUE_USER_CHATS")
 RABBITMQ_QUEUE_USER_CHAT_REPLIES = os.getenv(
     "RABBITMQ_QUEUE_USER_CHAT_REPLIES"
 )
-LAST_MESSAGES_LIMIT = int(os.getenv("LAST_MESSAGES_LIMIT", 10))
-ASSISTANT_LAST_MESSAGES_LIMIT = int(
-    os.getenv("ASSISTANT_LAST_MESSAGES_LIMIT", 10)
+RABBITMQ_QUEUE_WHATSAPP_MESSAGES = os.getenv(
+    "RABBITMQ_QUEUE_WHATSAPP_MESSAGES"
 )
+LAST_MESSAGES_LIMIT = int(os.getenv("LAST_MESSAGES_LIMIT", 10))
 INITIAL_CHAT_TEMPLATE = os.getenv(
     "INITIAL_CHAT_TEMPLATE",
     "Hi {farmer_name}, I'm {officer_name} the extension officer.",
 )
+SOCKETIO_CLIENT_MANAGER = os.getenv("SOCKETIO_CLIENT_MANAGER", "memory")
+SOCKETIO_CHANNEL = os.getenv("SOCKETIO_CHANNEL", "socketio")
 
 
 def get_rabbitmq_client():
     return rabbitmq_client
 
 
+def get_client_manager(client_manager: str = SOCKETIO_CLIENT_MANAGER):
+    """
+    The in-memory manager only reaches sockets connected to this process.
+    The RabbitMQ manager publishes every emit on a fanout exchange, so any
+    backend worker can reach a user connected to another worker.
+    """
+    if client_manager == "rabbitmq":
+        RABBITMQ_USER = os.getenv("RABBITMQ_USER")
+        RABBITMQ_PASS = os.getenv("RABBITMQ_PASS")
+        RABBITMQ_HOST = os.getenv("RABBITMQ_HOST")
+        RABBITMQ_PORT = os.getenv("RABBITMQ_PORT")
+        return socketio.AsyncAioPikaManager(
+            url=(
+                f"amqp://{RABBITMQ_USER}:{RABBITMQ_PASS}@"
+                f"{RABBITMQ_HOST}:{RABBITMQ_PORT}/"
+            ),
+            channel=SOCKETIO_CHANNEL,
+        )
+    if client_manager == "memory":
+        return socketio.AsyncManager()
+    raise ValueError(f"Unknown Socket.IO client manager: {client_manager}")
+
+
 SOCKETIO_PATH = ""
 
 twilio_client = TwilioClient()
@@ -65,6 +97,7 @@ slackbot_client = SlackBotClient()
 
 sio_server = socketio.AsyncServer(
     async_mode="asgi",
+    client_manager=get_client_manager(),
     ping_interval=130,  # 130 seconds
     ping_timeout=120,  # 120 seconds
     transports=["websocket", "polling"],
@@ -77,32 +110,17 @@ cookie = SimpleCookie()
 tz = timezone.utc
 
 
-USER_CACHE_DICT = {}
-USER_CACHE_KEY = "USER_"
-
-
-def set_cache(user_id: str, sid: str):
-    key = f"{USER_CACHE_KEY}{user_id}"
-    logger.info(f"[FastAPICache] Setting cache: {key} -> {sid}")
-    USER_CACHE_DICT[key] = sid
-
+# every socket of a user joins the user's room, the client manager
+# delivers emits to the room to all of them, whichever worker holds them
+USER_ROOM_PREFIX = "USER_"
 
-def get_cache(user_id: str):
-    key = f"{USER_CACHE_KEY}{user_id}"
-    sid = USER_CACHE_DICT.get(key)
-    logger.info(f"[FastAPICache] Retrieved cache: {key} -> {sid}")
-    return sid
 
-
-def delete_cache(user_id: str):
-    key = f"{USER_CACHE_KEY}{user_id}"
-    logger.info(f"[FastAPICache] delete_cache: {key}")
-    if key in USER_CACHE_DICT:
-        del USER_CACHE_DICT[key]
+def user_room(user_id: str) -> str:
+    return f"{USER_ROOM_PREFIX}{user_id}"
 
 
 async def save_chat_history(
-    session: Session,
+    session: AsyncSession,
     conversation_envelope: dict,
     message_body: str,
     media: Optional[List[dict]] = [],
@@ -121,16 +139,21 @@ async def save_chat_history(
         platform = get_value_or_raise_error(conversation_envelope, "platform")
 
         # Parse the timestamp or default to current UTC time
-        created_at = parse_timestamp_or_default(timestamp)
-
-        # Check if the conversation already exists
-        conversation_exist = session.exec(
-            select(Chat_Session)
-            .join(User)
-            .join(Client)
-            .where(
-                User.phone_number == user_phone_number,
-                Client.phone_number == client_phone_number,
+        created_at = to_db_datetime(parse_timestamp_or_default(timestamp))
+
+        # Check if the conversation already exists, asyncpg doesn't cast
+        # parameters, so the phone numbers are compared as integers
+        conversation_exist = (
+            await session.exec(
+                select(Chat_Session)
+                .join(User)
+                .join(Client)
+                .where(
+                    User.phone_number
+                    == sanitize_phone_number(user_phone_number),
+                    Client.phone_number
+                    == sanitize_phone_number(client_phone_number),
+                )
             )
         ).first()
 
@@ -146,7 +169,7 @@ async def save_chat_history(
         message_template_lang = generate_message_template_lang_by_phone_number(
             client_phone_number
         )
-        send_conversation_reconnect_template = check_if_after_24h_window(
+        send_conversation_reconnect_template = await check_if_after_24h_window(
             session, conversation_exist.id
         )
 
@@ -174,13 +197,15 @@ async def save_chat_history(
             created_at=created_at,
         )
         session.add(new_chat)
-        session.commit()
+        await session.flush()
 
         # Handle any associated media
         if media:
-            add_media(session=session, chat=new_chat, media=media)
+            await add_media(session=session, chat=new_chat, media=media)
 
-        session.flush()
+        await session.exec(upsert_chat_session_summary(chats=[new_chat]))
+        await session.commit()
+        chat_history_cache.append(new_chat)
 
         return {
             "chat_id": new_chat.id,
@@ -193,7 +218,7 @@ async def save_chat_history(
         logger.error(f"Save chat history failed: {e}")
         raise e
     finally:
-        session.close()
+        await session.close()
 
 
 def parse_timestamp_or_default(timestamp: Optional[str]) -> datetime:
@@ -209,19 +234,34 @@ def parse_timestamp_or_default(timestamp: Optional[str]) -> datetime:
     return created_at
 
 
+def to_db_datetime(value: datetime) -> datetime:
+    """
+    Convert to a naive UTC datetime, asyncpg refuses to write timezone
+    aware datetimes into TIMESTAMP WITHOUT TIME ZONE columns.
+    """
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
 async def handle_conversation_reconnect(
-    session: Session,
+    session: AsyncSession,
     client_phone_number: str,
     message_body: str,
     message_template_lang: str,
 ) -> str:
     """Handle the logic for sending a conversation reconnect template."""
     TESTING = os.getenv("TESTING")
-    content_sid = os.getenv(
-        f"CONVERSATION_RECONNECT_TEMPLATE_{message_template_lang}"
+    template = template_registry.get(
+        "conversation_reconnect", message_template_lang
     )
-    client = session.exec(
-        select(Client).where(Client.phone_number == client_phone_number)
+    client = (
+        await session.exec(
+            select(Client)
+            .options(selectinload(Client.properties))
+            .where(
+                Client.phone_number
+                == sanitize_phone_number(client_phone_number)
+            )
+        )
     ).first()
     client_name = (
         client.properties.name
@@ -237,25 +277,21 @@ async def handle_conversation_reconnect(
         "\nPlease reply to this message to restart your conversation."
     )
 
-    if content_sid and not TESTING:
-        template_content = get_template_content_from_json(
-            content_sid=content_sid
-        )
-        if template_content:
-            conversation_reconnect_message = template_content.replace(
-                "{{1}}", client_name
-            ).replace("{{2}}", clean_message_body)
-            await twilio_client.whatsapp_message_template_create(
-                to=client_phone_number,
-                content_variables={"1": client_name, "2": clean_message_body},
-                content_sid=content_sid,
-            )
+    if template.content and not TESTING:
+        conversation_reconnect_message = template.render(
+            client_name, clean_message_body
+        )
+        await twilio_client.whatsapp_message_template_create(
+            to=client_phone_number,
+            content_variables={"1": client_name, "2": clean_message_body},
+            content_sid=template.content_sid,
+        )
 
     return conversation_reconnect_message
 
 
-def check_conversation_exist_and_generate_queue_message(
-    session: Session, msg: dict, user_phone_number: str
+async def check_conversation_exist_and_generate_queue_message(
+    session: AsyncSession, msg: dict, user_phone_number: str
 ):
     conversation_envelope = get_value_or_raise_error(
         msg, "conversation_envelope"
@@ -264,13 +300,16 @@ def check_conversation_exist_and_generate_queue_message(
         conversation_envelope, "client_phone_number"
     )
 
-    conversation_exist = session.exec(
-        select(Chat_Session)
-        .join(User)
-        .join(Client)
-        .where(
-            User.phone_number == user_phone_number,
-            Client.phone_number == client_phone_number,
+    conversation_exist = (
+        await session.exec(
+            select(Chat_Session)
+            .join(User)
+            .join(Client)
+            .where(
+                User.phone_number == sanitize_phone_number(user_phone_number),
+                Client.phone_number
+                == sanitize_phone_number(client_phone_number),
+            )
         )
     ).first()
 
@@ -313,10 +352,8 @@ def check_conversation_exist_and_generate_queue_message(
     return conversation_exist
 
 
-async def handle_send_initial_message(
-    session: Session, chat_session_id: int, user: User, client: Client
-):
-    """Helper function to send the initial message"""
+def get_initial_message(user: User, client: Client) -> dict:
+    """The initial message of a new chat session, and how to send it"""
     TESTING = os.getenv("TESTING")
     client_name = (
         client.properties.name if client.properties else client.phone_number
@@ -335,38 +372,107 @@ async def handle_send_initial_message(
     message_template_lang = generate_message_template_lang_by_phone_number(
         phone_number=client_phone_number
     )
-    content_sid = os.getenv(f"INTRO_TEMPLATE_ID_{message_template_lang}")
-    # get message template from twilio
-    template_content = get_template_content_from_json(content_sid=content_sid)
-    if template_content and not TESTING:
-        initial_message = template_content.replace("{{1}}", client_name)
-        initial_message = initial_message.replace("{{2}}", user_name)
+    template = template_registry.get("intro", message_template_lang)
+    if template.content and not TESTING:
+        initial_message = template.render(client_name, user_name)
+
+    return {
+        "to": client_phone_number,
+        "body": initial_message,
+        "content_sid": template.content_sid,
+        "content_variables": {"1": client_name, "2": user_name},
+    }
+
+
+async def send_initial_message(initial_message: dict):
+    """Helper function to send the initial message, once it's saved"""
+    if os.getenv("TESTING"):
+        return
+    # send initial chat to client
+    if initial_message["content_sid"]:
+        await twilio_client.whatsapp_message_template_create(
+            to=initial_message["to"],
+            content_variables=initial_message["content_variables"],
+            content_sid=initial_message["content_sid"],
+        )
+    else:
+        await twilio_client.whatsapp_message_create(
+            to=initial_message["to"], body=initial_message["body"]
+        )
 
-    new_chat = Chat(
-        chat_session_id=chat_session_id,
-        message=initial_message,
-        sender_role=Sender_Role_Enum.SYSTEM,
-        created_at=datetime.now(tz),
-    )
-    session.add(new_chat)
-    session.commit()
-    session.flush()
 
-    if not os.getenv("TESTING"):
-        # send initial chat to client
-        if content_sid:
-            await twilio_client.whatsapp_message_template_create(
-                to=client_phone_number,
-                content_variables={"1": client_name, "2": user_name},
-                content_sid=content_sid,
+async def get_or_create_chat_session(
+    session: AsyncSession, client_phone_number: str, platform: str
+) -> tuple[Chat_Session, bool]:
+    """
+    Returns the client's chat session, and whether it was created. A new
+    client is assigned to the first user. Nothing is committed.
+    """
+    chat_session = (
+        await session.exec(
+            select(Chat_Session)
+            .join(Client)
+            .options(
+                selectinload(Chat_Session.user).selectinload(User.properties),
+                selectinload(Chat_Session.client).selectinload(
+                    Client.properties
+                ),
             )
-        else:
-            await twilio_client.whatsapp_message_create(
-                to=client_phone_number, body=initial_message
+            .where(
+                Client.phone_number
+                == sanitize_phone_number(client_phone_number)
+            )
+        )
+    ).first()
+    if chat_session:
+        return chat_session, False
+
+    user = (
+        await session.exec(
+            select(User)
+            .options(selectinload(User.properties))
+            .order_by(User.id)
+        )
+    ).first()
+    # upserts, so concurrent messages of a new client create it only once
+    client_id = (
+        await session.exec(
+            upsert_client(
+                phone_number=int(
+                    "".join(filter(str.isdigit, client_phone_number))
+                )
+            )
+        )
+    ).scalar_one()
+    chat_session_id, created = (
+        await session.exec(
+            upsert_chat_session(
+                user_id=user.id,
+                client_id=client_id,
+                platform=Platform_Enum(platform),
+            )
+        )
+    ).one()
+    chat_session = (
+        await session.exec(
+            select(Chat_Session)
+            .options(
+                selectinload(Chat_Session.user).selectinload(User.properties),
+                selectinload(Chat_Session.client).selectinload(
+                    Client.properties
+                ),
             )
+            .where(Chat_Session.id == chat_session_id)
+        )
+    ).one()
+    return chat_session, created
 
 
-async def handle_incoming_message(session: Session, message: dict):
+async def handle_incoming_message(session: AsyncSession, message: dict):
+    """
+    Saves an incoming message, its media, and for a new WhatsApp chat
+    session the initial message, in a single transaction.
+    """
     conversation_envelope = get_value_or_raise_error(
         message, "conversation_envelope"
     )
@@ -379,65 +485,49 @@ async def handle_incoming_message(session: Session, message: dict):
     platform = get_value_or_raise_error(conversation_envelope, "platform")
     media = get_value_or_raise_error(message, "media")
 
-    prev_conversation_exist = session.exec(
-        select(Chat_Session)
-        .join(Client)
-        .where(Client.phone_number == client_phone_number)
-    ).first()
-
-    send_initial_template = False
-    if not prev_conversation_exist:
-        send_initial_template = True
-
-        user = session.exec(select(User).order_by(User.id)).first()
-        client = session.exec(
-            select(Client).where(Client.phone_number == client_phone_number)
-        ).first()
-
-        if not client:
-            client = Client(
-                phone_number=int(
-                    "".join(filter(str.isdigit, client_phone_number))
-                )
-            )
-            session.add(client)
-            session.commit()
-
-        new_chat_session = Chat_Session(
-            user_id=user.id,
-            client_id=client.id,
-            platform=platform,
-        )
-        session.add(new_chat_session)
-        session.commit()
-
-        chat_session_id = new_chat_session.id
-
-    else:
-        user = prev_conversation_exist.user
-        client = prev_conversation_exist.client
-        chat_session_id = prev_conversation_exist.id
+    chat_session, send_initial_template = await get_or_create_chat_session(
+        session=session,
+        client_phone_number=client_phone_number,
+        platform=platform,
+    )
+    user = chat_session.user
+    client = chat_session.client
+    chat_session_id = chat_session.id
 
     new_chat = Chat(
         chat_session_id=chat_session_id,
         message=get_value_or_raise_error(message, "body"),
         sender_role=Sender_Role_Enum[sender_role.upper()],
-        created_at=datetime.now(tz),
+        created_at=to_db_datetime(datetime.now(tz)),
     )
     session.add(new_chat)
-    session.commit()
+    await session.flush()
+    new_chats = [new_chat]
 
     # Handle media
     if media:
-        add_media(session=session, chat=new_chat, media=media)
+        await add_media(session=session, chat=new_chat, media=media)
 
     # Handle initial message
+    initial_message = None
     if platform == Platform_Enum.WHATSAPP.value and send_initial_template:
-        await handle_send_initial_message(
-            session, chat_session_id, user, client
+        initial_message = get_initial_message(user=user, client=client)
+        initial_chat = Chat(
+            chat_session_id=chat_session_id,
+            message=initial_message["body"],
+            sender_role=Sender_Role_Enum.SYSTEM,
+            created_at=to_db_datetime(datetime.now(tz)),
         )
+        session.add(initial_chat)
+        await session.flush()
+        new_chats.append(initial_chat)
 
-    session.flush()
+    await session.exec(upsert_chat_session_summary(chats=new_chats))
+    await session.commit()
+    chat_history_cache.append(new_chat)
+
+    if initial_message:
+        await send_initial_message(initial_message)
 
     user = user.serialize()
     client_name = (
@@ -453,129 +543,133 @@ async def handle_incoming_message(session: Session, message: dict):
     )
 
 
-def handle_read_message(session: Session, chat_session_id: int):
+async def handle_read_message(session: AsyncSession, chat_session_id: int):
     try:
-        unread_messages = session.exec(
-            select(Chat).where(
-                and_(
-                    Chat.chat_session_id == chat_session_id,
-                    Chat.status == Chat_Status_Enum.UNREAD,
+        # the chats this statement actually marked, not the ones that
+        # were unread when an earlier select ran
+        unread_messages = (
+            (
+                await session.exec(
+                    update(Chat)
+                    .where(
+                        Chat.chat_session_id == chat_session_id,
+                        Chat.status == Chat_Status_Enum.UNREAD,
+                    )
+                    .values(status=Chat_Status_Enum.READ)
+                    .returning(Chat)
                 )
             )
-        ).all()
-        for um in unread_messages:
-            um.status = Chat_Status_Enum.READ
-        session.commit()
+            .scalars()
+            .all()
+        )
+        await session.exec(
+            read_chat_session_summary(
+                chat_session_id=chat_session_id, chats=unread_messages
+            )
+        )
+        await session.commit()
 
         # update chat_session last_read
-        chat_session = session.exec(
-            select(Chat_Session).where(Chat_Session.id == chat_session_id)
-        ).first()
+        chat_session = await session.get(Chat_Session, chat_session_id)
         if chat_session:
-            chat_session.last_read = datetime.now(tz)
-            session.commit()
-        session.flush()
+            chat_session.last_read = to_db_datetime(datetime.now(tz))
+            await session.commit()
+        await session.flush()
         return unread_messages
     except Exception as e:
         logger.error(f"Error handle read message: {e}")
         raise e
 
 
-async def resend_messages(session: Session, user_id=int, user_sid=str):
+async def resend_messages(
+    session: AsyncSession,
+    user_id: int,
+    user_sid: str,
+    last_chat_id: Optional[int] = None,
+):
     """
-    This function is to resend N last message to platform
+    Resends the N last unread client messages and whispers of the user to
+    a (re)connected tab, in one `chats_batch` event. `last_chat_id` is the
+    high-water mark the tab acknowledged, messages up to it are not sent
+    again. Returns the resent chats, None if there is nothing to resend.
     """
-    chat_session = session.exec(
-        select(Chat_Session).where(Chat_Session.user_id == user_id)
-    ).all()
-    if not chat_session:
-        return None
-    last_chats = session.exec(
-        select(Chat)
+    query = (
+        select(Chat, Chat_Session, Client)
+        .join(Chat_Session, Chat.chat_session_id == Chat_Session.id)
+        .join(Client, Chat_Session.client_id == Client.id)
+        # loaded in the same statement, the limit applies to the chats
+        .options(joinedload(Chat.media))
         .where(
-            and_(
-                Chat.chat_session_id.in_([cs.id for cs in chat_session]),
-                Chat.status == Chat_Status_Enum.UNREAD,
-            )
+            Chat_Session.user_id == user_id,
+            Chat.status == Chat_Status_Enum.UNREAD,
+            Chat.sender_role.in_(
+                [Sender_Role_Enum.CLIENT, Sender_Role_Enum.ASSISTANT]
+            ),
         )
-        .order_by(Chat.created_at.desc())
+        .order_by(Chat.created_at.desc(), Chat.id.desc())
         .limit(LAST_MESSAGES_LIMIT)
-    ).all()
+    )
+    if last_chat_id:
+        query = query.where(Chat.id > last_chat_id)
+    rows = (await session.exec(query)).unique().all()
+    if not rows:
+        return None
     # Reorder the results by created_at in ascending order
-    last_chats = sorted(last_chats, key=lambda x: x.created_at)
-    for chat in last_chats:
-        # starting to resend message
+    rows = sorted(rows, key=lambda row: (row[0].created_at, row[0].id))
+
+    messages = []
+    for chat, chat_session, client in rows:
         media = []
         context = []
-        if chat.media:
-            for cm in chat.media:
-                media.append({"url": cm.url, "type": cm.type})
-                context.append(
-                    {
-                        "url": cm.url,
-                        "type": cm.type,
-                        "caption": chat.message,
-                    }
-                )
-        message = queue_message_util.create_queue_message(
-            chat_session_id=chat.chat_session_id,
-            message_id=chat.id,
-            client_phone_number=f"+{chat.chat_session.client.phone_number}",
-            user_phone_number=f"+{chat.chat_session.client.phone_number}",
-            sender_role=chat.sender_role,
-            sender_role_enum=Sender_Role_Enum,
-            platform=chat.chat_session.platform,
-            platform_enum=Platform_Enum,
-            body=chat.message,
-            media=media,
-            context=context,
-            timestamp=chat.created_at.isoformat(),
-            status=chat.status.value,
-        )
-        if chat.sender_role == Sender_Role_Enum.CLIENT:
-            await sio_server.emit(
-                "chats", message, to=user_sid, callback=emit_chats_callback
+        for cm in chat.media:
+            media.append({"url": cm.url, "type": cm.type})
+            context.append(
+                {
+                    "url": cm.url,
+                    "type": cm.type,
+                    "caption": chat.message,
+                }
             )
-            logger.info(f"Resend message for client->user: {message}")
-        if chat.sender_role == Sender_Role_Enum.ASSISTANT:
-            await sio_server.emit(
-                "whisper", message, to=user_sid, callback=emit_whisper_callback
+        messages.append(
+            queue_message_util.create_queue_message(
+                chat_session_id=chat.chat_session_id,
+                message_id=chat.id,
+                client_phone_number=f"+{client.phone_number}",
+                user_phone_number=f"+{client.phone_number}",
+                sender_role=chat.sender_role,
+                sender_role_enum=Sender_Role_Enum,
+                platform=chat_session.platform,
+                platform_enum=Platform_Enum,
+                body=chat.message,
+                media=media,
+                context=context,
+                timestamp=chat.created_at.isoformat(),
+                status=chat.status.value,
             )
-            logger.info(f"Resend message for assistant->user: {message}")
-    return last_chats
+        )
+    batch = {
+        "messages": messages,
+        "last_chat_id": max(chat.id for chat, _, _ in rows),
+    }
+    await sio_server.emit(
+        "chats_batch",
+        batch,
+        to=user_sid,
+    )
+    logger.info(f"Resend {len(messages)} messages to user sid[{user_sid}]")
+    return [chat for chat, _, _ in rows]
 
 
-def get_chat_history_for_assistant(
-    session: Session, chat_session_id: int, body: str
-):
-    last_chats = session.exec(
-        select(Chat)
-        .where(
-            and_(
-                Chat.chat_session_id == chat_session_id,
-                Chat.sender_role.in_(
-                    [
-                        Sender_Role_Enum.USER,
-                        Sender_Role_Enum.CLIENT,
-                        Sender_Role_Enum.ASSISTANT,
-                    ]
-                ),
-            )
-        )
-        .order_by(Chat.created_at.desc())
-        .offset(1)  # skip the latest message
-        .limit(ASSISTANT_LAST_MESSAGES_LIMIT)  # retrieve the next N messages
-    ).all()
-    if not last_chats:
-        return body
-    # append history to message body
-    body = json.loads(body)
-    # Reorder the results by created_at in ascending order
-    last_chats = sorted(last_chats, key=lambda x: x.created_at)
-    history = [lc.to_assistant_history() for lc in last_chats]
-    body.update({"history": history})
-    body = json.dumps(body)
-    return body
+async def get_chat_history_for_assistant(
+    session: AsyncSession, chat_session_id: int, chat_id: int
+) -> list[dict]:
+    """
+    The last chats before the chat `chat_id` of the session, oldest
+    first, from the history cache or one query when it isn't cached.
+    """
+    return await chat_history_cache.get_history(
+        session=session, chat_session_id=chat_session_id, chat_id=chat_id
+    )
 
 
 async def user_to_client(body: str):
@@ -585,7 +679,7 @@ async def user_to_client(body: str):
     client routing, the message is posted onto the channel that the conversation
     is happening on.
     """
-    session = Session(engine)
+    session = get_async_session()
     queue_message = json.loads(body)
     conversation_envelope = queue_message.get("conversation_envelope", {})
     platform = conversation_envelope.get("platform")
@@ -615,9 +709,8 @@ async def user_to_client(body: str):
 
 
 @sio_server.on("connect")
-async def sio_connect(sid, environ):
+async def sio_connect(sid, environ, auth=None):
     try:
-        session = Session(engine)
         httpCookie = environ.get("HTTP_COOKIE")
         if not httpCookie:
             return None
@@ -630,10 +723,18 @@ async def sio_connect(sid, environ):
         async with sio_server.session(sid) as sio_session:
             sio_session["user_id"] = user_id
             sio_session["user_phone_number"] = user_phone_number
-            set_cache(user_id=user_id, sid=sid)
-            await resend_messages(
-                session=session, user_id=user_id, user_sid=sid
-            )
+            await sio_server.enter_room(sid, user_room(user_id))
+            # the last message the tab received, sent on reconnect
+            last_chat_id = (auth or {}).get("last_chat_id")
+            if not isinstance(last_chat_id, int):
+                last_chat_id = None
+            async with get_async_session() as session:
+                await resend_messages(
+                    session=session,
+                    user_id=user_id,
+                    user_sid=sid,
+                    last_chat_id=last_chat_id,
+                )
         logger.info(f"User sid[{sid}] connected: {user_phone_number}")
     except HTTPException as e:
         logger.error(f"User sid[{sid}] can't connect: {e}")
@@ -645,17 +746,14 @@ async def sio_connect(sid, environ):
 
 @sio_server.on("disconnect")
 async def sio_disconnect(sid):
-    async with sio_server.session(sid) as sio_session:
-        user_id = sio_session.get("user_id")
-        if user_id:
-            delete_cache(user_id=user_id)
+    # the socket leaves its rooms with the disconnect
     logger.info(f"User sid[{sid}] disconnected")
 
 
 @sio_server.on("chats")
 async def chat_message(sid, msg):
+    session = get_async_session()
     try:
-        session = Session(engine)
         logger.info(f"Server received: sid[{sid}] msg: {msg}")
 
         conversation_envelope = get_value_or_raise_error(
@@ -671,7 +769,7 @@ async def chat_message(sid, msg):
             )
 
             queue_message = (
-                check_conversation_exist_and_generate_queue_message(
+                await check_conversation_exist_and_generate_queue_message(
                     session=session,
                     msg=msg,
                     user_phone_number=user_phone_number,
@@ -696,17 +794,29 @@ async def chat_message(sid, msg):
         logger.error(f"Error handling chats event: {e}")
         return {"success": False, "message": str(e)}
     finally:
-        session.close()
+        await session.close()
 
 
 @sio_server.on("read_message")
 async def read_message(sid, chat_session_id):
-    session = Session(engine)
-    handle_read_message(session=session, chat_session_id=chat_session_id)
+    async with get_async_session() as session:
+        await handle_read_message(
+            session=session, chat_session_id=chat_session_id
+        )
 
 
-async def emit_chats_callback(value):
-    logger.info(f"Emit chats callback {value}")
+@sio_server.on("chats_ack")
+async def chats_ack(sid, ack):
+    """
+    Sent by the client once it handled `chats`, `whisper` or `chats_batch`
+    messages. Emits to rooms can't request a callback, with several tabs
+    or the RabbitMQ client manager there isn't a single socket to answer.
+    """
+    last_chat_id = ack.get("last_chat_id") if isinstance(ack, dict) else None
+    if not isinstance(last_chat_id, int):
+        return {"success": False, "message": "Invalid last_chat_id"}
+    logger.info(f"User sid[{sid}] received chats up to {last_chat_id}")
+    return {"success": True, "last_chat_id": last_chat_id}
 
 
 async def client_to_user(body: str):
@@ -716,9 +826,15 @@ async def client_to_user(body: str):
     routing, that means it should send the message to the assistant as well as
     send it to the user's frontend.
     """
+    session = get_async_session()
     try:
-        session = Session(engine)
         message = json.loads(body)
+        # the assistant gets the message as received, the conversation
+        # envelope sent to the user is updated below
+        queue_message = {
+            **message,
+            "conversation_envelope": {**message["conversation_envelope"]},
+        }
 
         (
             user_id,
@@ -729,8 +845,6 @@ async def client_to_user(body: str):
             client_name,
         ) = await handle_incoming_message(session=session, message=message)
 
-        user_sid = get_cache(user_id=user_id)
-
         conversation_envelope = get_value_or_raise_error(
             message, "conversation_envelope"
         )
@@ -742,9 +856,12 @@ async def client_to_user(body: str):
         message.update({"conversation_envelope": conversation_envelope})
 
         # add history to queue
-        body = get_chat_history_for_assistant(
-            session=session, chat_session_id=chat_session_id, body=body
+        history = await get_chat_history_for_assistant(
+            session=session, chat_session_id=chat_session_id, chat_id=chat_id
         )
+        if history:
+            queue_message["history"] = history
+            body = json.dumps(queue_message)
         # eol add history to queue
 
         # send message to user_chats
@@ -753,78 +870,37 @@ async def client_to_user(body: str):
             routing_key=RABBITMQ_QUEUE_USER_CHATS,
         )
         await sio_server.emit(
-            "chats", message, to=user_sid, callback=emit_chats_callback
-        )
-
-        # Send push notification
-        subscriptions = session.exec(
-            select(Subscription).where(Subscription.user_id == user_id)
-        ).all()
-        body_text = message.get("body")
-        max_length = 150
-        # Truncate and add ellipsis if needed
-        truncated_body = (
-            (body_text[:max_length] + "...")
-            if len(body_text) > max_length
-            else body_text
-        )
-        for subscription in subscriptions:
-            try:
-                if (
-                    "updates.push.services.mozilla.com"
-                    in subscription.endpoint
-                ):
-                    VAPID_CLAIMS.update(
-                        {"aud": "https://updates.push.services.mozilla.com"}
-                    )
-                elif "fcm.googleapis.com" in subscription.endpoint:
-                    VAPID_CLAIMS.update({"aud": "https://fcm.googleapis.com"})
-                else:
-                    VAPID_CLAIMS.update({"aud": ""})
-                webpush(
-                    subscription_info={
-                        "endpoint": subscription.endpoint,
-                        "keys": json.loads(subscription.keys),
-                    },
-                    data=json.dumps(
-                        {
-                            "title": client_name,
-                            "body": truncated_body,
-                        }
-                    ),
-                    vapid_private_key=VAPID_PRIVATE_KEY,
-                    vapid_claims=VAPID_CLAIMS,
-                )
-            except WebPushException as e:
-                # Detect if the subscription is invalid or expired
-                if e.response.status_code in {404, 410}:
-                    logger.warning(
-                        "Removing invalid subscription:", subscription.endpoint
-                    )
-                    # Remove the invalid subscription from the database
-                    session.delete(subscription)
-                    session.commit()
-                else:
-                    logger.error(
-                        f"Failed to send notification {subscription.endpoint}:",
-                        e,
-                    )
-        # EOL send push notification
+            "chats",
+            message,
+            to=user_room(user_id),
+        )
 
-        logger.info(
-            f"Send client->user to {USER_CACHE_KEY}{user_id} "
-            f"{user_sid}: {message}"
+        # Send push notification, in the background
+        push_dispatcher.notify_user(
+            user_id=user_id, title=str(client_name), body=message.get("body")
         )
 
+        logger.info(f"Send client->user to {user_room(user_id)}: {message}")
+
     except Exception as e:
         logger.error(f"Error handling client_to_user: {e}")
         raise e
     finally:
-        session.close()
+        await session.close()
 
 
-async def emit_whisper_callback(value):
-    logger.info(f"Emit whisper callback {value}")
+async def whatsapp_to_user(body: str):
+    """
+    Processes the raw WhatsApp messages queued by the Twilio webhook: the
+    media is downloaded, audio transcribed and images uploaded, then the
+    message is routed to the user like any other client message.
+    """
+    values = json.loads(body)
+    # downloads, transcoding and uploads block, keep them off the loop
+    message = await asyncio.to_thread(
+        twilio_client.format_to_queue_message, values
+    )
+    await client_to_user(body=message)
 
 
 @sio_server.on("whisper")
@@ -839,8 +915,8 @@ async def assistant_to_user(body: str):
     to user routing, the message is marked as a whisper and posted to the
     frontend.
     """
+    session = get_async_session()
     try:
-        session = Session(engine)
         message = json.loads(body)
 
         (
@@ -851,7 +927,6 @@ async def assistant_to_user(body: str):
             chat_status,
             client_name,
         ) = await handle_incoming_message(session=session, message=message)
-        user_sid = get_cache(user_id=user_id)
 
         conversation_envelope = get_value_or_raise_error(
             message, "conversation_envelope"
@@ -864,13 +939,14 @@ async def assistant_to_user(body: str):
         message.update({"conversation_envelope": conversation_envelope})
 
         await sio_server.emit(
-            "whisper", message, to=user_sid, callback=emit_whisper_callback
-        )
-        logger.info(
-            f"Send assistant->user to {USER_CACHE_KEY}{user_id} "
-            f"{user_sid}: {message}"
+            "whisper",
+            message,
+            to=user_room(user_id),
         )
+        logger.info(f"Send assistant->user to {user_room(user_id)}: {message}")
 
     except Exception as e:
         logger.error(f"Error handling assistant_to_user: {e}")
         raise e
+    finally:
+        await session.close()
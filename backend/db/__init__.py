@@ -1 +1,13 @@
-from .crud_chat import add_media, check_if_after_24h_window  # noqa
+from .crud_chat import (  # noqa
+    add_media,  # noqa
+    check_if_after_24h_window,  # noqa
+    upsert_client,  # noqa
+    upsert_chat_session,  # noqa
+    upsert_chat_session_summary,  # noqa
+    read_chat_session_summary,  # noqa
+    rebuild_chat_session_summary,  # noqa
+)  # noqa
+from .crud_broadcast import (  # noqa
+    create_broadcast_job,  # noqa
+    count_broadcast_recipients,  # noqa
+)  # noqa
@@ -0,0 +1,166 @@
+import os
+import json
+import phonenumbers
+
+from datetime import datetime, timezone
+from sqlalchemy.orm import joinedload
+from sqlmodel import Session, select, func
+from models import (
+    User,
+    Client,
+    Chat_Session,
+    Chat,
+    Sender_Role_Enum,
+    Chat_Status_Enum,
+    Platform_Enum,
+    Broadcast_Job,
+    Broadcast_Recipient,
+    Broadcast_Recipient_Status_Enum,
+)
+from db.crud_chat import upsert_chat_session_summary
+from utils.util import generate_message_template_lang_by_phone_number
+from utils.templates import template_registry
+
+
+tz = timezone.utc
+
+
+def format_contacts(contacts: list[str]) -> list[str]:
+    formatted = []
+    for phone_number in contacts:
+        phone_number = phonenumbers.parse(phone_number)
+        formatted.append(
+            f"+{phone_number.country_code}{phone_number.national_number}"
+        )
+    return formatted
+
+
+def get_or_create_chat_sessions(
+    session: Session, user_id: int, client_ids: list[int]
+) -> dict[int, Chat_Session]:
+    """
+    Returns the user's chat session for every client, keyed by client id.
+    Existing sessions are fetched in one query and the missing ones are
+    inserted in a single multi-row INSERT.
+    """
+    chat_sessions = {
+        chat_session.client_id: chat_session
+        for chat_session in session.exec(
+            select(Chat_Session)
+            .where(Chat_Session.user_id == user_id)
+            .where(Chat_Session.client_id.in_(client_ids))
+        ).all()
+    }
+    new_chat_sessions = [
+        Chat_Session(
+            user_id=user_id,
+            client_id=client_id,
+            platform=Platform_Enum.WHATSAPP,
+        )
+        for client_id in client_ids
+        if client_id not in chat_sessions
+    ]
+    if new_chat_sessions:
+        session.add_all(new_chat_sessions)
+        session.flush()
+        for chat_session in new_chat_sessions:
+            chat_sessions[chat_session.client_id] = chat_session
+    return chat_sessions
+
+
+def create_broadcast_job(
+    session: Session, user: User, message: str, contacts: list[str]
+) -> Broadcast_Job:
+    """
+    Persists a broadcast job with one pending recipient per known client,
+    and stores the broadcast message in each client's chat history. The
+    messages themselves are sent by the broadcast worker.
+
+    The number of queries doesn't depend on the number of contacts: the
+    clients (with properties) and their chat sessions are read with one
+    query each, and new sessions, chats and recipients are bulk inserted.
+    """
+    TESTING = os.getenv("TESTING")
+    contacts = format_contacts(contacts=contacts)
+    # properties are joined in, so serializing a client doesn't lazy load
+    clients = session.exec(
+        select(Client)
+        .options(joinedload(Client.properties))
+        .where(Client.phone_number.in_(contacts))
+    ).all()
+    chat_sessions = get_or_create_chat_sessions(
+        session=session,
+        user_id=user.id,
+        client_ids=[client.id for client in clients],
+    )
+
+    job = Broadcast_Job(user_id=user.id, message=message)
+    session.add(job)
+    session.flush()
+
+    clean_line_break_message = message.replace("\n", " ")
+    new_chats = []
+    recipients = []
+    for client in clients:
+        client = client.serialize()
+        client_name = client.get("name") or client.get("phone_number")
+        broadcast_message = (
+            f"[Broadcast]\n\nHi {client_name},\n{clean_line_break_message}"
+        )
+
+        # get message template ID
+        message_template_lang = generate_message_template_lang_by_phone_number(
+            phone_number=client.get("phone_number")
+        )
+        template = template_registry.get("broadcast", message_template_lang)
+        if template.content and not TESTING:
+            broadcast_message = template.render(
+                client_name, clean_line_break_message
+            )
+
+        new_chats.append(
+            Chat(
+                chat_session_id=chat_sessions[client.get("id")].id,
+                message=broadcast_message,
+                sender_role=Sender_Role_Enum.USER_BROADCAST,
+                status=Chat_Status_Enum.READ,
+                created_at=datetime.now(tz),
+            )
+        )
+        recipients.append(
+            Broadcast_Recipient(
+                job_id=job.id,
+                client_id=client.get("id"),
+                phone_number=client.get("phone_number"),
+                body=broadcast_message,
+                content_sid=template.content_sid,
+                content_variables=(
+                    json.dumps(
+                        {"1": client_name, "2": clean_line_break_message}
+                    )
+                    if template.content_sid
+                    else None
+                ),
+                status=Broadcast_Recipient_Status_Enum.PENDING,
+            )
+        )
+
+    session.add_all(new_chats)
+    session.add_all(recipients)
+    if new_chats:
+        session.flush()
+        session.exec(upsert_chat_session_summary(chats=new_chats))
+    session.commit()
+    session.refresh(job)
+    return job
+
+
+def count_broadcast_recipients(
+    session: Session, job_id: int
+) -> dict[Broadcast_Recipient_Status_Enum, int]:
+    rows = session.exec(
+        select(Broadcast_Recipient.status, func.count(Broadcast_Recipient.id))
+        .where(Broadcast_Recipient.job_id == job_id)
+        .group_by(Broadcast_Recipient.status)
+    ).all()
+    return {status: count for status, count in rows}
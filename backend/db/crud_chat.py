@@ -1,31 +1,51 @@
 from datetime import datetime, timedelta, timezone
+from typing import Optional
+from sqlalchemy import text, update, case, func, and_, or_, literal_column
+from sqlalchemy.dialects.postgresql import insert
 from sqlmodel import Session, select
-from models import Chat, Chat_Media, Sender_Role_Enum
+from sqlmodel.ext.asyncio.session import AsyncSession
+from models import (
+    Chat,
+    Chat_Media,
+    Chat_Session,
+    Chat_Session_Summary,
+    Chat_Status_Enum,
+    Client,
+    Platform_Enum,
+    Sender_Role_Enum,
+)
 
 
 tz = timezone.utc
 
 
-def add_media(session: Session, chat: Chat, media: list[dict]):
+async def add_media(session: AsyncSession, chat: Chat, media: list[dict]):
+    """
+    Adds the media of a flushed chat, in the caller's transaction.
+    """
     media_objects = [
         Chat_Media(chat_id=chat.id, url=md.get("url"), type=md.get("type"))
         for md in media
     ]
     session.add_all(media_objects)
-    session.commit()
+    await session.flush()
 
 
-def check_if_after_24h_window(session: Session, chat_session_id: int):
+async def check_if_after_24h_window(
+    session: AsyncSession, chat_session_id: int
+):
     current_time = datetime.now(tz)
-    last_message = session.exec(
-        select(Chat)
-        .where(Chat.chat_session_id == chat_session_id)
-        .where(
-            # only chat from client/farmer will be calculated
-            Chat.sender_role
-            == Sender_Role_Enum.CLIENT,
+    last_message = (
+        await session.exec(
+            select(Chat)
+            .where(Chat.chat_session_id == chat_session_id)
+            .where(
+                # only chat from client/farmer will be calculated
+                Chat.sender_role
+                == Sender_Role_Enum.CLIENT,
+            )
+            .order_by(Chat.created_at.desc(), Chat.id.desc())
         )
-        .order_by(Chat.created_at.desc(), Chat.id.desc())
     ).first()
     if not last_message:
         return True
@@ -34,3 +54,182 @@ def check_if_after_24h_window(session: Session, chat_session_id: int):
     if time_diff > timedelta(hours=24):
         return True
     return False
+
+
+def upsert_client(phone_number: int):
+    """
+    Statement that returns the id of the client with the phone number,
+    creating the client if it doesn't exist yet.
+    """
+    statement = insert(Client).values(phone_number=phone_number)
+    return statement.on_conflict_do_update(
+        index_elements=[Client.phone_number],
+        # a no-op update, so the existing client's id is returned
+        set_={"phone_number": statement.excluded.phone_number},
+    ).returning(Client.id)
+
+
+def upsert_chat_session(user_id: int, client_id: int, platform: Platform_Enum):
+    """
+    Statement that returns the id of the user's chat session with the
+    client, and whether this statement created it.
+    """
+    statement = insert(Chat_Session).values(
+        user_id=user_id, client_id=client_id, platform=platform
+    )
+    return statement.on_conflict_do_update(
+        index_elements=[Chat_Session.client_id, Chat_Session.user_id],
+        set_={"client_id": statement.excluded.client_id},
+    ).returning(
+        Chat_Session.id,
+        # xmax is only set on the rows the conflict updated
+        literal_column("xmax = 0").label("created"),
+    )
+
+
+def upsert_chat_session_summary(chats: list[Chat]):
+    """
+    Statement that folds new chats into their sessions' summaries, one
+    row per chat session, creating the summaries that don't exist yet.
+    Must run in the transaction that inserts the chats, after a flush.
+    """
+    # one row per chat session, a statement can't upsert a row twice
+    rows = {}
+    for chat in sorted(chats, key=lambda c: (c.created_at, c.id)):
+        row = rows.setdefault(
+            chat.chat_session_id,
+            {
+                "chat_session_id": chat.chat_session_id,
+                "user_id": select(Chat_Session.user_id)
+                .where(Chat_Session.id == chat.chat_session_id)
+                .scalar_subquery(),
+                "last_message_id": None,
+                "last_message_at": None,
+                "unread_client_count": 0,
+                "unread_assistant": False,
+            },
+        )
+        if chat.sender_role != Sender_Role_Enum.ASSISTANT:
+            row["last_message_id"] = chat.id
+            row["last_message_at"] = chat.created_at
+        if chat.status == Chat_Status_Enum.UNREAD:
+            if chat.sender_role == Sender_Role_Enum.CLIENT:
+                row["unread_client_count"] += 1
+            elif chat.sender_role == Sender_Role_Enum.ASSISTANT:
+                row["unread_assistant"] = True
+    statement = insert(Chat_Session_Summary).values(list(rows.values()))
+    summary = Chat_Session_Summary.__table__.c
+    new = statement.excluded
+    is_newer = and_(
+        new.last_message_id.isnot(None),
+        or_(
+            summary.last_message_at.is_(None),
+            new.last_message_at >= summary.last_message_at,
+        ),
+    )
+    return statement.on_conflict_do_update(
+        index_elements=[summary.chat_session_id],
+        set_={
+            "last_message_id": case(
+                (is_newer, new.last_message_id),
+                else_=summary.last_message_id,
+            ),
+            "last_message_at": func.greatest(
+                summary.last_message_at, new.last_message_at
+            ),
+            "unread_client_count": (
+                summary.unread_client_count + new.unread_client_count
+            ),
+            "unread_assistant": or_(
+                summary.unread_assistant, new.unread_assistant
+            ),
+        },
+    )
+
+
+def read_chat_session_summary(chat_session_id: int, chats: list[Chat]):
+    """
+    Statement that takes the chats just marked as read off the unread
+    counters, in the transaction that marks them. Chats that arrive
+    meanwhile stay counted, the counter is decremented rather than reset.
+    """
+    summary = Chat_Session_Summary.__table__.c
+    read_client_count = sum(
+        1 for chat in chats if chat.sender_role == Sender_Role_Enum.CLIENT
+    )
+    values = {
+        "unread_client_count": func.greatest(
+            summary.unread_client_count - read_client_count, 0
+        )
+    }
+    if any(chat.sender_role == Sender_Role_Enum.ASSISTANT for chat in chats):
+        values["unread_assistant"] = (
+            select(Chat.id)
+            .where(
+                Chat.chat_session_id == chat_session_id,
+                Chat.status == Chat_Status_Enum.UNREAD,
+                Chat.sender_role == Sender_Role_Enum.ASSISTANT,
+            )
+            .exists()
+        )
+    return (
+        update(Chat_Session_Summary)
+        .where(Chat_Session_Summary.chat_session_id == chat_session_id)
+        .values(**values)
+    )
+
+
+REBUILD_CHAT_SESSION_SUMMARY = """
+INSERT INTO chat_session_summary (
+    chat_session_id, user_id, last_message_id, last_message_at,
+    unread_client_count, unread_assistant
+)
+SELECT
+    cs.id,
+    cs.user_id,
+    last_message.id,
+    last_message.created_at,
+    (
+        SELECT count(*) FROM chat
+        WHERE chat.chat_session_id = cs.id
+        AND chat.status = 'UNREAD' AND chat.sender_role = 'CLIENT'
+    ),
+    EXISTS (
+        SELECT 1 FROM chat
+        WHERE chat.chat_session_id = cs.id
+        AND chat.status = 'UNREAD' AND chat.sender_role = 'ASSISTANT'
+    )
+FROM chat_session cs
+LEFT JOIN LATERAL (
+    SELECT chat.id, chat.created_at FROM chat
+    WHERE chat.chat_session_id = cs.id AND chat.sender_role != 'ASSISTANT'
+    ORDER BY chat.created_at DESC, chat.id DESC
+    LIMIT 1
+) last_message ON true
+{where}
+ON CONFLICT (chat_session_id) DO UPDATE SET
+    user_id = EXCLUDED.user_id,
+    last_message_id = EXCLUDED.last_message_id,
+    last_message_at = EXCLUDED.last_message_at,
+    unread_client_count = EXCLUDED.unread_client_count,
+    unread_assistant = EXCLUDED.unread_assistant
+"""
+
+
+def rebuild_chat_session_summary(
+    session: Session, chat_session_ids: Optional[list[int]] = None
+):
+    """
+    Recomputes the summaries from the chats, for the given chat sessions
+    or all of them. For data written without the summary upsert, e.g.
+    seeders and fixtures.
+    """
+    where = ""
+    params = {}
+    if chat_session_ids is not None:
+        where = "WHERE cs.id = ANY(:chat_session_ids)"
+        params = {"chat_session_ids": list(chat_session_ids)}
+    session.exec(
+        text(REBUILD_CHAT_SESSION_SUMMARY.format(where=where)), params=params
+    )
+    session.commit()
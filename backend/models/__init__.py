@@ -1,6 +1,6 @@
 from .user import User, User_Properties  # noqa
 from .client import Client, Client_Properties  # noqa
-from .chat import Chat, Chat_Session, Chat_Media  # noqa
+from .chat import Chat, Chat_Session, Chat_Media, Chat_Session_Summary  # noqa
 from .chat import Sender_Role_Enum, Platform_Enum, Chat_Status_Enum  # noqa
 from .subscription import (  # noqa
     Subscription,  # noqa
@@ -8,3 +8,9 @@ from .subscription import (  # noqa
     VAPID_PUBLIC_KEY,  # noqa
     VAPID_CLAIMS,  # noqa
 )  # noqa
+from .broadcast import (  # noqa
+    Broadcast_Job,  # noqa
+    Broadcast_Recipient,  # noqa
+    Broadcast_Job_Status_Enum,  # noqa
+    Broadcast_Recipient_Status_Enum,  # noqa
+)  # noqa
@@ -0,0 +1,96 @@
+import enum
+from datetime import datetime, timezone
+from sqlalchemy import Column, DateTime, Enum, func
+from sqlmodel import Field, SQLModel, Relationship
+from typing import Optional
+from models import Client, User
+
+
+tz = timezone.utc
+
+
+class Broadcast_Job_Status_Enum(enum.Enum):
+    PENDING = "PENDING"
+    RUNNING = "RUNNING"
+    COMPLETED = "COMPLETED"
+    # finished, but not a single recipient was sent
+    FAILED = "FAILED"
+
+
+class Broadcast_Recipient_Status_Enum(enum.Enum):
+    PENDING = "PENDING"
+    SENT = "SENT"
+    FAILED = "FAILED"
+
+
+class Broadcast_Job(SQLModel, table=True):
+    id: int = Field(default=None, primary_key=True)
+    user_id: int = Field(foreign_key="user.id")
+    message: str
+    status: Broadcast_Job_Status_Enum = Field(
+        sa_column=Column(
+            Enum(Broadcast_Job_Status_Enum),
+            default=Broadcast_Job_Status_Enum.PENDING,
+            nullable=False,
+        )
+    )
+    created_at: datetime = Field(
+        sa_column=Column(
+            DateTime(),
+            server_default=func.now(),
+            nullable=False,
+        ),
+    )
+    completed_at: Optional[datetime] = Field(
+        sa_column=Column(DateTime(), nullable=True),
+    )
+    user: "User" = Relationship()
+    recipients: list["Broadcast_Recipient"] = Relationship(
+        back_populates="job"
+    )
+
+    def __init__(self, **data):
+        super().__init__(**data)
+
+    def serialize(self, progress: dict) -> dict:
+        return {
+            "id": self.id,
+            "message": self.message,
+            "status": self.status.value,
+            "created_at": self.created_at,
+            "completed_at": self.completed_at,
+            "total": sum(progress.values()),
+            "pending": progress.get(
+                Broadcast_Recipient_Status_Enum.PENDING, 0
+            ),
+            "sent": progress.get(Broadcast_Recipient_Status_Enum.SENT, 0),
+            "failed": progress.get(Broadcast_Recipient_Status_Enum.FAILED, 0),
+        }
+
+
+class Broadcast_Recipient(SQLModel, table=True):
+    id: int = Field(default=None, primary_key=True)
+    job_id: int = Field(foreign_key="broadcast_job.id", index=True)
+    client_id: int = Field(foreign_key="client.id")
+    phone_number: str
+    # the rendered message for plain sends, or the template sid and its
+    # variables, so a resumed job sends exactly what was prepared
+    body: str
+    content_sid: Optional[str] = None
+    content_variables: Optional[str] = None
+    status: Broadcast_Recipient_Status_Enum = Field(
+        sa_column=Column(
+            Enum(Broadcast_Recipient_Status_Enum),
+            default=Broadcast_Recipient_Status_Enum.PENDING,
+            nullable=False,
+        )
+    )
+    attempts: int = Field(default=0)
+    sent_at: Optional[datetime] = Field(
+        sa_column=Column(DateTime(), nullable=True),
+    )
+    job: Optional[Broadcast_Job] = Relationship(back_populates="recipients")
+    client: "Client" = Relationship()
+
+    def __init__(self, **data):
+        super().__init__(**data)
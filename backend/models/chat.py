@@ -1,6 +1,6 @@
 import enum
 from datetime import datetime, timezone
-from sqlalchemy import Column, DateTime, Enum, func
+from sqlalchemy import Column, DateTime, Enum, Index, func, text
 from sqlmodel import Field, SQLModel, Relationship
 from typing import Optional
 from models import Client, User
@@ -28,6 +28,17 @@ class Chat_Status_Enum(enum.Enum):
 
 
 class Chat_Session(SQLModel, table=True):
+    __table_args__ = (
+        # one chat session per client and user
+        Index(
+            "ix_chat_session_client_id_user_id",
+            "client_id",
+            "user_id",
+            unique=True,
+        ),
+        Index("ix_chat_session_user_id", "user_id"),
+    )
+
     id: int = Field(default=None, primary_key=True)
     user_id: int = Field(foreign_key="user.id")
     client_id: Optional[int] = Field(
@@ -64,6 +75,32 @@ class Chat_Session(SQLModel, table=True):
 
 
 class Chat(SQLModel, table=True):
+    __table_args__ = (
+        # conversation history, newest first
+        Index(
+            "ix_chat_chat_session_id_created_at",
+            "chat_session_id",
+            "created_at",
+            "id",
+        ),
+        # unread messages (read receipts and resending on reconnect)
+        Index(
+            "ix_chat_unread_chat_session_id_created_at",
+            "chat_session_id",
+            "created_at",
+            "id",
+            postgresql_where=text("status = 'UNREAD'"),
+        ),
+        # last client message (24 hours messaging window)
+        Index(
+            "ix_chat_client_chat_session_id_created_at",
+            "chat_session_id",
+            "created_at",
+            "id",
+            postgresql_where=text("sender_role = 'CLIENT'"),
+        ),
+    )
+
     id: int = Field(default=None, primary_key=True)
     chat_session_id: int = Field(foreign_key="chat_session.id")
     message: str
@@ -134,7 +171,7 @@ class Chat(SQLModel, table=True):
 
 class Chat_Media(SQLModel, table=True):
     id: int = Field(default=None, primary_key=True)
-    chat_id: int = Field(foreign_key="chat.id")
+    chat_id: int = Field(foreign_key="chat.id", index=True)
     url: str
     type: str
 
@@ -145,3 +182,33 @@ class Chat_Media(SQLModel, table=True):
             "url": self.url,
             "type": self.type,
         }
+
+
+class Chat_Session_Summary(SQLModel, table=True):
+    """
+    The chat list entry of a chat session, maintained by every write to
+    the session's chats (see db.crud_chat.upsert_chat_session_summary),
+    so listing chats doesn't have to aggregate the whole chat history.
+    """
+
+    __table_args__ = (
+        Index(
+            "ix_chat_session_summary_user_id_last_message_at",
+            "user_id",
+            "last_message_at",
+            "chat_session_id",
+        ),
+    )
+
+    chat_session_id: int = Field(
+        foreign_key="chat_session.id", primary_key=True
+    )
+    user_id: int = Field(foreign_key="user.id")
+    # the last message, not counting assistant whispers
+    last_message_id: Optional[int] = Field(default=None, foreign_key="chat.id")
+    last_message_at: Optional[datetime] = Field(default=None)
+    unread_client_count: int = Field(default=0)
+    unread_assistant: bool = Field(default=False)
+
+    chat_session: "Chat_Session" = Relationship()
+    last_message: Optional["Chat"] = Relationship()
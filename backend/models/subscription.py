@@ -1,5 +1,6 @@
 import os
 
+from types import MappingProxyType
 from sqlalchemy import Column, String
 from sqlmodel import Field, SQLModel, Relationship
 from models import User
@@ -7,7 +8,9 @@ from models import User
 
 VAPID_PRIVATE_KEY = os.getenv("NEXT_PUBLIC_VAPID_PRIVATE_KEY")
 VAPID_PUBLIC_KEY = os.getenv("NEXT_PUBLIC_VAPID_PUBLIC_KEY")
-VAPID_CLAIMS = {"sub": "mailto:example@mail.com", "aud": ""}
+# read-only, the audience and expiry are added per push service when
+# signing (see clients.webpush_client.VapidSigner)
+VAPID_CLAIMS = MappingProxyType({"sub": "mailto:example@mail.com"})
 
 
 class Subscription(SQLModel, table=True):
@@ -6,4 +6,5 @@ alembic upgrade head
 # get twilio message template
 python -m command.get_twilio_message_template
 
-uvicorn main:app --port "${BACKEND_PORT}" --host 0.0.0.0
+uvicorn main:app --port "${BACKEND_PORT}" --host 0.0.0.0 \
+  --workers "${BACKEND_WORKERS:-1}"
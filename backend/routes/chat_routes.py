@@ -1,34 +1,34 @@
 import os
-import phonenumbers
+import time
 
-from fastapi import APIRouter, Depends, HTTPException, Query, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, Query
 from fastapi.security import HTTPBearer, HTTPBasicCredentials as credentials
 from models import (
     Chat_Session,
     Chat,
-    Sender_Role_Enum,
-    Chat_Status_Enum,
+    Chat_Session_Summary,
     Client,
-    Platform_Enum,
+    Broadcast_Job,
 )
-from sqlmodel import Session, select, func, and_, case
+from datetime import datetime
+from sqlalchemy import tuple_
+from sqlalchemy.orm import selectinload
+from sqlmodel import Session, select, func
 from middleware import verify_user
 from core.database import get_session
+from core.broadcast import broadcast_worker
+from db import create_broadcast_job, count_broadcast_recipients
 from pydantic import BaseModel
 from pydantic_extra_types.phone_numbers import PhoneNumber
-from typing import List
-from clients.twilio_client import TwilioClient
-from datetime import datetime, timezone
-from utils.util import (
-    generate_message_template_lang_by_phone_number,
-    get_template_content_from_json,
-)
+from typing import List, Optional
+from utils.util import encode_cursor, decode_cursor
 
 router = APIRouter()
 security = HTTPBearer()
 
-twilio_client = TwilioClient()
-tz = timezone.utc
+CHAT_LIST_TOTAL_CACHE_TTL = int(os.getenv("CHAT_LIST_TOTAL_CACHE_TTL", 60))
+# user_id -> (total chats, expiry)
+CHAT_LIST_TOTAL_CACHE: dict[int, tuple[int, float]] = {}
 
 
 class BroadcastRequest(BaseModel):
@@ -36,109 +36,109 @@ class BroadcastRequest(BaseModel):
     message: str
 
 
+def get_total_chats(session: Session, user_id: int) -> int:
+    """
+    Number of chats in the chat list of the user, cached for
+    CHAT_LIST_TOTAL_CACHE_TTL seconds
+    """
+    now = time.monotonic()
+    cached = CHAT_LIST_TOTAL_CACHE.get(user_id)
+    if cached and cached[1] > now:
+        return cached[0]
+    total_chats = session.exec(
+        select(func.count(Chat_Session_Summary.chat_session_id))
+        .where(Chat_Session_Summary.user_id == user_id)
+        .where(Chat_Session_Summary.last_message_id.isnot(None))
+    ).one()
+    CHAT_LIST_TOTAL_CACHE[user_id] = (
+        total_chats,
+        now + CHAT_LIST_TOTAL_CACHE_TTL,
+    )
+    return total_chats
+
+
 @router.get("/chat-list")
 async def get_chats(
     session: Session = Depends(get_session),
     auth: dict = Depends(security),
     limit: int = Query(10, ge=1, le=100),
-    offset: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None),
+    include_total: bool = Query(False),
 ):
+    """
+    A page of the user's chats, the most recently active first. Pass
+    `next_cursor` back as `cursor` for the next page, it is null on the
+    last page. `total_chats` is only counted with `include_total`.
+    """
     user = verify_user(session, auth)
 
-    # Total number of chats for pagination
-    total_chats = session.exec(
-        select(func.count(Chat_Session.id)).where(
-            Chat_Session.user_id == user.id
-        )
-    ).one()
-
-    if offset >= total_chats:
-        raise HTTPException(
-            status_code=404, detail="Offset exceeds total number of chats"
-        )
-
-    # Subquery to get the latest chat for each chat session
-    latest_chat_subquery = (
-        select(
-            Chat.chat_session_id,
-            func.max(Chat.created_at).label("latest_created_at"),
-        )
-        .where(Chat.sender_role != Sender_Role_Enum.ASSISTANT)
-        .group_by(Chat.chat_session_id)
-        .subquery()
-    )
-
-    # Main query to fetch chat sessions with latest chat and unread counts
+    # The summary keeps the latest message and the unread counters of
+    # each chat session, maintained on every chat write
     query = (
-        select(
-            Chat_Session,
-            Chat,  # Latest message
-            func.count(
-                case(
-                    (
-                        and_(
-                            Chat.status == Chat_Status_Enum.UNREAD,
-                            Chat.sender_role == Sender_Role_Enum.CLIENT,
-                        ),
-                        1,
-                    )
-                )
-            ).label("unread_message_count"),
-            func.count(
-                case(
-                    (
-                        and_(
-                            Chat.status == Chat_Status_Enum.UNREAD,
-                            Chat.sender_role == Sender_Role_Enum.ASSISTANT,
-                        ),
-                        1,
-                    )
-                )
-            ).label("unread_assistant_message"),
+        select(Chat_Session, Chat, Chat_Session_Summary)
+        .options(
+            selectinload(Chat_Session.client).selectinload(Client.properties),
+            selectinload(Chat.media),
         )
         .join(
-            latest_chat_subquery,
-            Chat_Session.id == latest_chat_subquery.c.chat_session_id,
+            Chat_Session_Summary,
+            Chat_Session_Summary.chat_session_id == Chat_Session.id,
         )
-        .join(
-            Chat,
-            and_(
-                Chat.chat_session_id == latest_chat_subquery.c.chat_session_id,
-                Chat.created_at == latest_chat_subquery.c.latest_created_at,
-            ),
+        .join(Chat, Chat.id == Chat_Session_Summary.last_message_id)
+        .where(Chat_Session_Summary.user_id == user.id)
+        .order_by(
+            Chat_Session_Summary.last_message_at.desc(),
+            Chat_Session_Summary.chat_session_id.desc(),
         )
-        .where(Chat_Session.user_id == user.id)
-        .group_by(Chat_Session.id, Chat.id)
-        .order_by(Chat.created_at.desc())
-        .offset(offset)
-        .limit(limit)
+        # one more chat to know if there is a next page
+        .limit(limit + 1)
     )
+    if cursor:
+        try:
+            last_message_at, chat_session_id = decode_cursor(cursor)
+            last_message_at = datetime.fromisoformat(last_message_at)
+            chat_session_id = int(chat_session_id)
+        except (ValueError, TypeError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        query = query.where(
+            tuple_(
+                Chat_Session_Summary.last_message_at,
+                Chat_Session_Summary.chat_session_id,
+            )
+            < (last_message_at, chat_session_id)
+        )
 
     results = session.exec(query).all()
+    next_cursor = None
+    if len(results) > limit:
+        results = results[:limit]
+        last_summary = results[-1][2]
+        next_cursor = encode_cursor(
+            last_summary.last_message_at, last_summary.chat_session_id
+        )
 
     last_chats = []
-    for (
-        chat_session,
-        latest_chat,
-        unread_message_count,
-        unread_assistant_message,
-    ) in results:
+    for chat_session, latest_chat, summary in results:
         last_chats.append(
             {
                 "chat_session": chat_session.serialize(),
                 "last_message": (
                     latest_chat.to_last_message() if latest_chat else None
                 ),
-                "unread_message_count": unread_message_count,
-                "unread_assistant_message": unread_assistant_message > 0,
+                "unread_message_count": summary.unread_client_count,
+                "unread_assistant_message": summary.unread_assistant,
             }
         )
 
     return {
-        "total_chats": total_chats,
+        "total_chats": (
+            get_total_chats(session=session, user_id=user.id)
+            if include_total
+            else None
+        ),
         "chats": last_chats,
         "limit": limit,
-        "offset": offset,
+        "next_cursor": next_cursor,
     }
 
 
@@ -147,11 +147,22 @@ async def get_chat_details_by_client_id(
     client_id: int,
     session: Session = Depends(get_session),
     auth: credentials = Depends(security),
+    limit: int = Query(20, ge=1, le=100),
+    before: Optional[str] = Query(None),
 ):
+    """
+    A page of the conversation with the client, the `limit` messages
+    before the `before` cursor (the latest messages without a cursor),
+    in chronological order. `next_cursor` points to the older messages,
+    null on the first message of the conversation.
+    """
     user = verify_user(session, auth)
 
     chat_session = session.exec(
         select(Chat_Session)
+        .options(
+            selectinload(Chat_Session.client).selectinload(Client.properties)
+        )
         .where(Chat_Session.client_id == client_id)
         .where(Chat_Session.user_id == user.id)
     ).first()
@@ -162,122 +173,72 @@ async def get_chat_details_by_client_id(
             detail="No chat session found for this client and user",
         )
 
-    messages = session.exec(
+    query = (
         select(Chat)
+        .options(selectinload(Chat.media))
         .where(Chat.chat_session_id == chat_session.id)
-        .order_by(Chat.created_at.asc(), Chat.id.asc())
-    ).all()
+        .order_by(Chat.created_at.desc(), Chat.id.desc())
+        # one more message to know if there are older messages
+        .limit(limit + 1)
+    )
+    if before:
+        try:
+            created_at, chat_id = decode_cursor(before)
+            created_at = datetime.fromisoformat(created_at)
+            chat_id = int(chat_id)
+        except (ValueError, TypeError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        query = query.where(
+            tuple_(Chat.created_at, Chat.id) < (created_at, chat_id)
+        )
+
+    messages = session.exec(query).all()
+    next_cursor = None
+    if len(messages) > limit:
+        messages = messages[:limit]
+        next_cursor = encode_cursor(messages[-1].created_at, messages[-1].id)
 
     return {
         "client_id": client_id,
         "chat_session": chat_session.serialize(),
-        "messages": [m.serialize() for m in messages],
+        "messages": [m.serialize() for m in reversed(messages)],
+        "limit": limit,
+        "next_cursor": next_cursor,
     }
 
 
 @router.post("/send-broadcast")
 async def send_broadcast(
     request: BroadcastRequest,
-    background_tasks: BackgroundTasks,
     session: Session = Depends(get_session),
     auth: credentials = Depends(security),
 ):
-    TESTING = os.getenv("TESTING")
     user = verify_user(session, auth)
-    contacts = []
-    for phone_number in request.contacts:
-        phone_number = phonenumbers.parse(phone_number)
-        phone_number = (
-            f"+{phone_number.country_code}{phone_number.national_number}"
-        )
-        contacts.append(phone_number)
-    # Retrieve clients from the database
-    clients = session.exec(
-        select(Client).where(Client.phone_number.in_(contacts))
-    ).all()
-    new_chats = []
-
-    for client in clients:
-        client = client.serialize()
-        client_name = client.get("name") or client.get("phone_number")
-
-        clean_line_break_message = request.message.replace("\n", " ")
-        broadcast_message = (
-            f"[Broadcast]\n\nHi {client_name},\n{clean_line_break_message}"
-        )
-
-        # get message template ID
-        message_template_lang = generate_message_template_lang_by_phone_number(
-            phone_number=client.get("phone_number")
-        )
-        content_sid = os.getenv(
-            f"BROADCAST_TEMPLATE_ID_{message_template_lang}"
-        )
-        # get message template from twilio
-        template_content = get_template_content_from_json(
-            content_sid=content_sid
-        )
-        if template_content and not TESTING:
-            broadcast_message = template_content.replace("{{1}}", client_name)
-            broadcast_message = broadcast_message.replace(
-                "{{2}}", clean_line_break_message
-            )
-
-        # Check if chat session exists
-        chat_session = session.exec(
-            select(Chat_Session).where(
-                and_(
-                    Chat_Session.user_id == user.id,
-                    Chat_Session.client_id == client.get("id"),
-                )
-            )
-        ).first()
-
-        # Create a new chat session if it does not exist
-        if not chat_session:
-            chat_session = Chat_Session(
-                user_id=user.id,
-                client_id=client.get("id"),
-                platform=Platform_Enum.WHATSAPP,
-            )
-            session.add(chat_session)
-            session.commit()
-            session.refresh(chat_session)
-
-        # Add chat history
-        new_chat = Chat(
-            chat_session_id=chat_session.id,
-            message=broadcast_message,
-            sender_role=Sender_Role_Enum.USER_BROADCAST,
-            status=Chat_Status_Enum.READ,
-            created_at=datetime.now(tz),
-        )
-        new_chats.append(new_chat)
+    job = create_broadcast_job(
+        session=session,
+        user=user,
+        message=request.message,
+        contacts=request.contacts,
+    )
+    if not os.getenv("TESTING"):
+        # the worker outlives the request and is resumed after a restart
+        broadcast_worker.start(job_id=job.id)
+    return {"message": "Broadcast message sent to WhatsApp", "job_id": job.id}
 
-        if not TESTING:
-            # Broadcast a message with/without template
-            if content_sid:
-                # Template
-                background_tasks.add_task(
-                    twilio_client.whatsapp_message_template_create,
-                    to=client.get("phone_number"),
-                    content_variables={
-                        "1": client_name,
-                        "2": clean_line_break_message,
-                    },
-                    content_sid=content_sid,
-                )
-            else:
-                # Without template
-                background_tasks.add_task(
-                    twilio_client.whatsapp_message_create,
-                    to=client.get("phone_number"),
-                    body=broadcast_message,
-                )
 
-    # Bulk insert new chat messages
-    if new_chats:
-        session.add_all(new_chats)
-    session.commit()
-    session.flush()
-    return {"message": "Broadcast message sent to WhatsApp"}
+@router.get("/broadcast/{job_id}")
+async def get_broadcast_job(
+    job_id: int,
+    session: Session = Depends(get_session),
+    auth: credentials = Depends(security),
+):
+    user = verify_user(session, auth)
+    job = session.exec(
+        select(Broadcast_Job)
+        .where(Broadcast_Job.id == job_id)
+        .where(Broadcast_Job.user_id == user.id)
+    ).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Broadcast job not found")
+    progress = count_broadcast_recipients(session=session, job_id=job.id)
+    return job.serialize(progress=progress)
@@ -17,12 +17,11 @@ from models import (
 from core.database import get_session
 from clients.twilio_client import TwilioClient
 from middleware import verify_user
+from db import upsert_chat_session_summary
 from typing_extensions import Annotated
 from datetime import datetime, timezone
-from utils.util import (
-    generate_message_template_lang_by_phone_number,
-    get_template_content_from_json,
-)
+from utils.util import generate_message_template_lang_by_phone_number
+from utils.templates import template_registry
 
 
 router = APIRouter()
@@ -62,12 +61,9 @@ async def add_client(
     message_template_lang = generate_message_template_lang_by_phone_number(
         phone_number=phone_number
     )
-    content_sid = environ.get(f"INTRO_TEMPLATE_ID_{message_template_lang}")
-    # get message template from twilio
-    template_content = get_template_content_from_json(content_sid=content_sid)
-    if template_content and not TESTING:
-        initial_message = template_content.replace("{{1}}", name)
-        initial_message = initial_message.replace("{{2}}", user_name)
+    template = template_registry.get("intro", message_template_lang)
+    if template.content and not TESTING:
+        initial_message = template.render(name, user_name)
 
     client = session.exec(
         select(Client).where(Client.phone_number == phone_number)
@@ -124,6 +120,8 @@ async def add_client(
         created_at=datetime.now(tz),
     )
     session.add(new_chat)
+    session.flush()
+    session.exec(upsert_chat_session_summary(chats=[new_chat]))
     session.commit()
     # eol create new chat session
     session.flush()
@@ -132,13 +130,13 @@ async def add_client(
         return new_chat.serialize()
 
     # send initial chat to client
-    if content_sid:
+    if template.content_sid:
         # send message with template
         background_tasks.add_task(
             twilio_client.whatsapp_message_template_create,
             to=phone_number,
             content_variables={"1": name, "2": user_name},
-            content_sid=content_sid,
+            content_sid=template.content_sid,
         )
     else:
         # send message without template
@@ -4,14 +4,13 @@ import logging
 from fastapi import APIRouter, Request, Depends, HTTPException
 from sqlmodel import Session, select, and_
 from fastapi.security import HTTPBearer, HTTPBasicCredentials as credentials
-from pywebpush import webpush, WebPushException
+from clients.webpush_client import (
+    WebPushClient,
+    EXPIRED_SUBSCRIPTION_STATUS,
+)
 from core.database import get_session
 from middleware import verify_user
-from models import (
-    Subscription,
-    VAPID_PRIVATE_KEY,
-    VAPID_CLAIMS,
-)
+from models import Subscription
 
 router = APIRouter()
 security = HTTPBearer()
@@ -19,6 +18,8 @@ security = HTTPBearer()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+webpush_client = WebPushClient()
+
 
 @router.post("/subscribe")
 async def subscribe(
@@ -59,41 +60,27 @@ async def subscribe(
 @router.post("/send_notification")
 async def send_notification(session: Session = Depends(get_session)):
     subscriptions = session.exec(select(Subscription)).all()
+    data = json.dumps(
+        {
+            "title": "New Notification",
+            "body": "This is a test notification",
+        }
+    )
     for subscription in subscriptions:
-        try:
-            if "updates.push.services.mozilla.com" in subscription.endpoint:
-                VAPID_CLAIMS.update(
-                    {"aud": "https://updates.push.services.mozilla.com"}
-                )
-            elif "fcm.googleapis.com" in subscription.endpoint:
-                VAPID_CLAIMS.update({"aud": "https://fcm.googleapis.com"})
-            else:
-                VAPID_CLAIMS.update({"aud": ""})
-            webpush(
-                subscription_info={
-                    "endpoint": subscription.endpoint,
-                    "keys": json.loads(subscription.keys),
-                },
-                data=json.dumps(
-                    {
-                        "title": "New Notification",
-                        "body": "This is a test notification",
-                    }
-                ),
-                vapid_private_key=VAPID_PRIVATE_KEY,
-                vapid_claims=VAPID_CLAIMS,
-            )
-        except WebPushException as e:
+        status_code = await webpush_client.send(
+            subscription=subscription, data=data
+        )
+        if status_code > 202:
             # Detect if the subscription is invalid or expired
-            if e.response.status_code in {404, 410}:
+            if status_code in EXPIRED_SUBSCRIPTION_STATUS:
                 logger.info(
-                    "Removing invalid subscription:", subscription.endpoint
+                    f"Removing invalid subscription: {subscription.endpoint}"
                 )
                 # Remove the invalid subscription from the database
                 session.delete(subscription)
                 session.commit()
             raise HTTPException(
-                status_code=e.response.status_code,
+                status_code=status_code,
                 detail="Subscription failed.",
             )
     return {"message": "Notifications sent"}
@@ -1,5 +1,4 @@
 import logging
-import asyncio
 import json
 
 from fastapi import (
@@ -18,7 +17,10 @@ from clients.twilio_client import (
     TwilioClient,
     ALLOWED_MESSAGE_TYPES,
 )
-from core.socketio_config import client_to_user
+from core.socketio_config import (
+    get_rabbitmq_client,
+    RABBITMQ_QUEUE_WHATSAPP_MESSAGES,
+)
 
 
 logging.basicConfig(level=logging.INFO)
@@ -37,7 +39,13 @@ async def receive_whatsapp_message(
     request: Request,
     background_tasks: BackgroundTasks,
     twilio_client=Depends(get_twilio_client),
+    rabbitmq_client=Depends(get_rabbitmq_client),
 ):
+    """
+    Acknowledges the webhook once the raw message is queued. The media is
+    downloaded, transcribed and uploaded by `whatsapp_to_user`, which
+    consumes the queue, so Twilio doesn't wait (and retry) on it.
+    """
     try:
         form_data = await request.form()
         values = {key: form_data[key] for key in form_data}
@@ -48,19 +56,26 @@ async def receive_whatsapp_message(
             NumMedia=int(values.get("NumMedia", 0)),
         )
         values.update(data.model_dump())
-        body = twilio_client.format_to_queue_message(values)
+        client_phone_number = twilio_client.validate_and_format_phone_number(
+            phone_number=values.get("From").split(":")[1]
+        )
         # BEGIN repy directly with a notification
         message_type = values["MessageType"]
         if message_type not in ALLOWED_MESSAGE_TYPES:
-            body = json.loads(body)
             background_tasks.add_task(
                 twilio_client.whatsapp_message_create,
-                to=body["conversation_envelope"].get("client_phone_number"),
+                to=client_phone_number,
                 body=f"This ({message_type}) media type is not yet supported.",
             )
             return Response(status_code=status.HTTP_204_NO_CONTENT)
         # END repy directly with a notification
-        asyncio.create_task(client_to_user(body=body))
+        queued = await rabbitmq_client.producer(
+            body=json.dumps(values),
+            routing_key=RABBITMQ_QUEUE_WHATSAPP_MESSAGES,
+        )
+        if not queued:
+            # Twilio retries the webhook later
+            return Response(status_code=status.HTTP_503_SERVICE_UNAVAILABLE)
         return Response(status_code=status.HTTP_204_NO_CONTENT)
 
     except ValidationError as e:
@@ -13,6 +13,7 @@ from utils.jwt_handler import create_jwt_token
 from clients.twilio_client import TwilioClient
 from middleware import verify_user
 from utils.util import generate_message_template_lang_by_phone_number
+from utils.templates import template_registry
 
 router = APIRouter()
 security = HTTPBearer()
@@ -62,15 +63,13 @@ async def send_login_link(
         }
 
     # get message template ID
-    content_sid = environ.get(
-        f"VERIFICATION_TEMPLATE_ID_{message_template_lang}"
-    )
-    if content_sid:
+    template = template_registry.get("verification", message_template_lang)
+    if template.content_sid:
         background_tasks.add_task(
             twilio_client.whatsapp_message_template_create,
             to=phone_number,
             content_variables={"1": user_name, "2": link},
-            content_sid=content_sid,
+            content_sid=template.content_sid,
         )
     else:
         # format login link and message for the user
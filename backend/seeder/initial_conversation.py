@@ -4,6 +4,7 @@ from models.client import Client
 from models.chat import Chat, Sender_Role_Enum, Chat_Session, Platform_Enum
 from sqlalchemy.exc import IntegrityError
 from core.database import engine
+from db import rebuild_chat_session_summary
 from sqlmodel import Session, select
 from typing import List
 from datetime import datetime, timezone
@@ -55,6 +56,9 @@ def seed_chat_data(session: Session, user_id: int, client_id: int):
     )
     session.add(chat)
     session.commit()
+    rebuild_chat_session_summary(
+        session=session, chat_session_ids=[chat_session.id]
+    )
 
 
 if __name__ == "__main__":
@@ -1,8 +1,9 @@
 import json
 import pytest
-from unittest.mock import patch, MagicMock
-from twilio.base.exceptions import TwilioRestException
-from twilio.rest import Client
+import pytest_asyncio
+from types import SimpleNamespace
+from unittest.mock import patch, AsyncMock, MagicMock
+from aiohttp import web
 from clients.twilio_client import TwilioClient
 
 
@@ -114,13 +115,83 @@ def test_format_to_queue_message_invalid_phone_number(twilio_client):
         twilio_client.format_to_queue_message(values)
 
 
-@pytest.mark.asyncio
-@patch.object(Client, "messages", new_callable=MagicMock)
-@patch("clients.twilio_client.logger")
-async def test_send_whatsapp_message_success(
-    mock_logger, mock_messages, twilio_client
-):
-    message_body = json.dumps(
+def test_format_to_queue_message_streams_image_to_storage(twilio_client):
+    media_url = "https://api.twilio.com/Media/ME123"
+    values = {
+        "MessageSid": "1234567890",
+        "From": "whatsapp:+6281234567890",
+        "Body": "Image caption",
+        "NumMedia": 1,
+        "MediaUrl0": media_url,
+        "MediaContentType0": "image/png",
+    }
+    response = MagicMock()
+    response.__enter__.return_value = response
+    response.iter_content.return_value = iter([b"png ", b"chunks"])
+    media_session = MagicMock()
+    media_session.get.return_value = response
+
+    with (
+        patch.object(
+            TwilioClient, "get_media_session", return_value=media_session
+        ),
+        patch(
+            "clients.twilio_client.upload_stream",
+            side_effect=lambda chunks, **kwargs: b"".join(chunks).decode(),
+        ) as upload_stream,
+    ):
+        queue_message = json.loads(
+            twilio_client.format_to_queue_message(values)
+        )
+
+    # fetched once, and streamed into the storage
+    media_session.get.assert_called_once()
+    assert media_session.get.call_args.args == (media_url,)
+    assert media_session.get.call_args.kwargs["stream"] is True
+    assert upload_stream.call_args.kwargs["content_type"] == "image/png"
+    assert upload_stream.call_args.kwargs["public"] is True
+    assert queue_message["media"] == [
+        {"url": "png chunks", "type": "image/png"}
+    ]
+    assert queue_message["context"][0]["caption"] == "Image caption"
+
+
+@pytest_asyncio.fixture
+async def twilio_api(aiohttp_server, twilio_client):
+    """
+    A local stub of the Twilio Messages API. Every request is recorded and
+    answered with `api.status` and `api.payload`.
+    """
+    api = SimpleNamespace(
+        requests=[],
+        peers=set(),
+        status=201,
+        payload={"sid": "SM123", "error_code": None},
+    )
+
+    async def create_message(request):
+        api.requests.append(
+            {
+                "account_sid": request.match_info["account_sid"],
+                "authorization": request.headers.get("Authorization"),
+                "form": dict(await request.post()),
+            }
+        )
+        api.peers.add(request.transport.get_extra_info("peername"))
+        return web.json_response(api.payload, status=api.status)
+
+    app = web.Application()
+    app.router.add_post(
+        "/2010-04-01/Accounts/{account_sid}/Messages.json", create_message
+    )
+    server = await aiohttp_server(app)
+    twilio_client.TWILIO_API_BASE_URL = f"http://{server.host}:{server.port}"
+    yield api
+    await TwilioClient.close_http_session()
+
+
+def queue_message_body() -> bytes:
+    return json.dumps(
         {
             "conversation_envelope": {
                 "message_id": "message_id",
@@ -136,67 +207,105 @@ async def test_send_whatsapp_message_success(
         }
     ).encode()
 
-    mock_messages.create.return_value = MagicMock(error_code=None)
 
-    await twilio_client.send_whatsapp_message(message_body)
+@pytest.mark.asyncio
+@patch("clients.twilio_client.logger")
+async def test_send_whatsapp_message_success(
+    mock_logger, twilio_client, twilio_api
+):
+    await twilio_client.send_whatsapp_message(queue_message_body())
+
+    assert len(twilio_api.requests) == 1
+    request = twilio_api.requests[0]
+    assert request["account_sid"] == twilio_client.TWILIO_ACCOUNT_SID
+    assert request["authorization"].startswith("Basic ")
+    assert request["form"] == {
+        "From": twilio_client.TWILIO_WHATSAPP_FROM,
+        "Body": "Hello, this is a test message.",
+        "To": "whatsapp:+1234567899",
+    }
+
 
-    mock_messages.create.assert_called_with(
-        from_=twilio_client.TWILIO_WHATSAPP_FROM,
-        body="Hello, this is a test message.",
-        to="whatsapp:+1234567899",
+@pytest.mark.asyncio
+async def test_whatsapp_message_create_reuses_connection(
+    twilio_client, twilio_api
+):
+    for i in range(3):
+        sent = await twilio_client.whatsapp_message_create(
+            to="+1234567899", body=f"Message {i}"
+        )
+        assert sent is True
+
+    assert len(twilio_api.requests) == 3
+    # keep-alive: every request went over the same pooled connection
+    assert len(twilio_api.peers) == 1
+
+
+@pytest.mark.asyncio
+async def test_whatsapp_message_template_create(twilio_client, twilio_api):
+    sent = await twilio_client.whatsapp_message_template_create(
+        to="+1234567899",
+        content_variables={"1": "Jane", "2": "Hello"},
+        content_sid="HX123",
     )
 
+    assert sent is True
+    assert twilio_api.requests[0]["form"] == {
+        "From": twilio_client.TWILIO_WHATSAPP_FROM,
+        "To": "whatsapp:+1234567899",
+        "ContentSid": "HX123",
+        "ContentVariables": json.dumps({"1": "Jane", "2": "Hello"}),
+    }
+
 
 @pytest.mark.asyncio
-@patch.object(Client, "messages", new_callable=MagicMock)
 @patch("clients.twilio_client.logger")
-async def test_send_whatsapp_message_twilio_error(
-    mock_logger, mock_messages, twilio_client
+async def test_whatsapp_message_create_error_code(
+    mock_logger, twilio_client, twilio_api
 ):
-    message_body = json.dumps(
-        {
-            "conversation_envelope": {
-                "message_id": "message_id",
-                "client_phone_number": "+1234567899",
-                "user_phone_number": "+1234567890",
-                "sender_role": "system",
-                "platform": "WHATSAPP",
-            },
-            "body": "Hello, this is a test message.",
-            "media": [],
-            "context": [],
-            "transformation_log": ["Hello, this is a test message."],
-        }
-    ).encode()
+    twilio_api.payload = {
+        "sid": "SM123",
+        "error_code": 63016,
+        "error_message": "Outside the allowed window",
+    }
 
-    mock_messages.create.side_effect = TwilioRestException(
-        status=400, uri="http://test.uri", msg="Twilio error"
+    sent = await twilio_client.whatsapp_message_create(
+        to="+1234567899", body="Hello"
     )
 
-    await twilio_client.send_whatsapp_message(message_body)
-
-    mock_messages.create.assert_called_with(
-        from_=twilio_client.TWILIO_WHATSAPP_FROM,
-        body="Hello, this is a test message.",
-        to="whatsapp:+1234567899",
+    assert sent is False
+    mock_logger.error.assert_any_call(
+        "Failed to send message to WhatsApp number +1234567899: "
+        "Outside the allowed window"
     )
 
+
+@pytest.mark.asyncio
+@patch("clients.twilio_client.logger")
+async def test_send_whatsapp_message_twilio_error(
+    mock_logger, twilio_client, twilio_api
+):
+    twilio_api.status = 400
+    twilio_api.payload = {"code": 21211, "message": "Twilio error"}
+
+    await twilio_client.send_whatsapp_message(queue_message_body())
+
+    assert len(twilio_api.requests) == 1
     mock_logger.error.assert_any_call(
         "Error sending message to Twilio: HTTP 400 error: Twilio error"
     )
 
 
 @pytest.mark.asyncio
-@patch.object(Client, "messages", new_callable=MagicMock)
 @patch("clients.twilio_client.logger")
 async def test_send_whatsapp_message_json_decode_error(
-    mock_logger, mock_messages, twilio_client
+    mock_logger, twilio_client, twilio_api
 ):
     message_body = b"invalid json"
 
     await twilio_client.send_whatsapp_message(message_body)
 
-    assert not mock_messages.create.called
+    assert not twilio_api.requests
 
     mock_logger.error.assert_any_call(
         "Error decoding JSON message: Expecting value: line 1 column 1 (char 0)"
@@ -204,35 +313,17 @@ async def test_send_whatsapp_message_json_decode_error(
 
 
 @pytest.mark.asyncio
-@patch.object(Client, "messages", new_callable=MagicMock)
+@patch.object(TwilioClient, "create_message", new_callable=AsyncMock)
 @patch("clients.twilio_client.logger")
 async def test_send_whatsapp_message_unexpected_error(
-    mock_logger, mock_messages, twilio_client
+    mock_logger, mock_create_message, twilio_client
 ):
-    message_body = json.dumps(
-        {
-            "conversation_envelope": {
-                "message_id": "message_id",
-                "client_phone_number": "+1234567899",
-                "user_phone_number": "+1234567890",
-                "sender_role": "system",
-                "platform": "WHATSAPP",
-            },
-            "body": "Hello, this is a test message.",
-            "media": [],
-            "context": [],
-            "transformation_log": ["Hello, this is a test message."],
-        }
-    ).encode()
+    mock_create_message.side_effect = Exception("Unexpected error")
 
-    mock_messages.create.side_effect = Exception("Unexpected error")
-
-    await twilio_client.send_whatsapp_message(message_body)
+    await twilio_client.send_whatsapp_message(queue_message_body())
 
-    mock_messages.create.assert_called_with(
-        from_=twilio_client.TWILIO_WHATSAPP_FROM,
-        body="Hello, this is a test message.",
-        to="whatsapp:+1234567899",
+    mock_create_message.assert_called_with(
+        to="+1234567899", Body="Hello, this is a test message."
     )
 
     mock_logger.error.assert_any_call("Unexpected error: Unexpected error")
@@ -0,0 +1,235 @@
+import os
+import time
+import asyncio
+import pytest
+import pytest_asyncio
+
+from aiohttp import web
+from base64 import urlsafe_b64encode
+from types import SimpleNamespace
+from unittest.mock import patch
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from py_vapid import Vapid, b64urlencode
+from clients.webpush_client import (
+    WebPushClient,
+    VapidSigner,
+    get_push_audience,
+)
+from models import Subscription
+
+
+def b64(value: bytes) -> str:
+    return urlsafe_b64encode(value).decode().rstrip("=")
+
+
+def generate_vapid_private_key() -> str:
+    vapid = Vapid()
+    vapid.generate_keys()
+    private_value = vapid.private_key.private_numbers().private_value
+    return b64urlencode(private_value.to_bytes(32, "big"))
+
+
+def generate_subscription_keys() -> str:
+    # the keys a browser creates for a push subscription
+    public_key = ec.generate_private_key(ec.SECP256R1()).public_key()
+    p256dh = public_key.public_bytes(
+        serialization.Encoding.X962,
+        serialization.PublicFormat.UncompressedPoint,
+    )
+    return f'{{"p256dh": "{b64(p256dh)}", "auth": "{b64(os.urandom(16))}"}}'
+
+
+@pytest.fixture
+def vapid_signer():
+    return VapidSigner(
+        private_key=generate_vapid_private_key(),
+        claims={"sub": "mailto:test@example.com"},
+    )
+
+
+@pytest.fixture
+def webpush_client(vapid_signer):
+    return WebPushClient(signer=vapid_signer, concurrency=2)
+
+
+@pytest_asyncio.fixture
+async def push_service(aiohttp_server):
+    """
+    A local stub of a push service. Every request is recorded and answered
+    with the status set for its subscription in `service.statuses`.
+    """
+    service = SimpleNamespace(
+        requests=[], statuses={}, in_flight=0, max_in_flight=0, url=None
+    )
+
+    async def push(request):
+        service.in_flight += 1
+        service.max_in_flight = max(service.max_in_flight, service.in_flight)
+        await asyncio.sleep(0.05)
+        service.in_flight -= 1
+        name = request.match_info["name"]
+        service.requests.append(
+            {
+                "name": name,
+                "authorization": request.headers.get("Authorization"),
+                "body": await request.read(),
+            }
+        )
+        return web.Response(status=service.statuses.get(name, 201))
+
+    app = web.Application()
+    app.router.add_post("/push/{name}", push)
+    server = await aiohttp_server(app)
+    service.url = f"http://{server.host}:{server.port}/push"
+    yield service
+    await WebPushClient.close_http_session()
+
+
+def create_subscriptions(service, names: list[str]) -> list[Subscription]:
+    return [
+        Subscription(
+            id=i,
+            endpoint=f"{service.url}/{name}",
+            keys=generate_subscription_keys(),
+            user_id=1,
+        )
+        for i, name in enumerate(names)
+    ]
+
+
+@pytest.mark.asyncio
+async def test_send_times_out_on_a_hung_push_service(
+    vapid_signer, aiohttp_server
+):
+    async def hang(request):
+        await asyncio.sleep(60)
+        return web.Response(status=201)
+
+    app = web.Application()
+    app.router.add_post("/push/{name}", hang)
+    server = await aiohttp_server(app)
+    service = SimpleNamespace(url=f"http://{server.host}:{server.port}/push")
+    [subscription] = create_subscriptions(service, ["hung"])
+    webpush_client = WebPushClient(signer=vapid_signer, timeout=0.5)
+
+    started_at = time.monotonic()
+    try:
+        with pytest.raises(asyncio.TimeoutError):
+            await webpush_client.send(subscription=subscription, data="{}")
+        assert time.monotonic() - started_at < 5
+        # send_all logs the failure and carries on
+        assert (
+            await webpush_client.send_all(
+                subscriptions=[subscription], data="{}"
+            )
+            == []
+        )
+    finally:
+        await WebPushClient.close_http_session()
+
+
+def test_get_push_audience():
+    assert (
+        get_push_audience("https://fcm.googleapis.com/fcm/send/abc")
+        == "https://fcm.googleapis.com"
+    )
+    assert (
+        get_push_audience("https://updates.push.services.mozilla.com/wpush/v2")
+        == "https://updates.push.services.mozilla.com"
+    )
+
+
+@pytest.mark.asyncio
+async def test_send_all_returns_expired_subscriptions(
+    webpush_client, push_service
+):
+    push_service.statuses = {"gone": 410, "not-found": 404, "error": 500}
+    subscriptions = create_subscriptions(
+        push_service, ["ok", "gone", "not-found", "error"]
+    )
+
+    expired = await webpush_client.send_all(
+        subscriptions=subscriptions, data='{"title": "Farmer"}'
+    )
+
+    assert [s.endpoint.split("/")[-1] for s in expired] == [
+        "gone",
+        "not-found",
+    ]
+    assert len(push_service.requests) == 4
+    # the payload is encrypted for the subscription
+    assert all(r["body"] for r in push_service.requests)
+    assert all(
+        r["authorization"].startswith("vapid t=")
+        for r in push_service.requests
+    )
+
+
+@pytest.mark.asyncio
+async def test_send_all_limits_concurrent_requests(
+    webpush_client, push_service
+):
+    subscriptions = create_subscriptions(
+        push_service, [f"tab-{i}" for i in range(6)]
+    )
+
+    await webpush_client.send_all(subscriptions=subscriptions, data="{}")
+
+    assert len(push_service.requests) == 6
+    assert push_service.max_in_flight == 2
+
+
+@pytest.mark.asyncio
+async def test_vapid_headers_are_signed_once_per_audience(
+    webpush_client, push_service
+):
+    subscriptions = create_subscriptions(push_service, ["a", "b", "c"])
+
+    with patch.object(Vapid, "sign", autospec=True, side_effect=Vapid.sign):
+        await webpush_client.send_all(subscriptions=subscriptions, data="{}")
+        await webpush_client.send_all(subscriptions=subscriptions, data="{}")
+        assert Vapid.sign.call_count == 1
+
+    authorizations = {r["authorization"] for r in push_service.requests}
+    assert len(authorizations) == 1
+
+
+def test_vapid_signer_signs_each_audience_with_its_own_claims(vapid_signer):
+    signed_claims = []
+    sign = Vapid.sign
+
+    def record_claims(vapid, claims):
+        signed_claims.append(claims)
+        return sign(vapid, claims)
+
+    with patch.object(Vapid, "sign", autospec=True, side_effect=record_claims):
+        fcm = vapid_signer.get_headers("https://fcm.googleapis.com/fcm/a")
+        mozilla = vapid_signer.get_headers(
+            "https://updates.push.services.mozilla.com/wpush/v2/b"
+        )
+        assert vapid_signer.get_headers("https://fcm.googleapis.com/b") == fcm
+
+    assert fcm != mozilla
+    assert [c["aud"] for c in signed_claims] == [
+        "https://fcm.googleapis.com",
+        "https://updates.push.services.mozilla.com",
+    ]
+    assert all(c["sub"] == "mailto:test@example.com" for c in signed_claims)
+    # the base claims are never changed
+    assert dict(vapid_signer.claims) == {"sub": "mailto:test@example.com"}
+    with pytest.raises(TypeError):
+        vapid_signer.claims["aud"] = "https://fcm.googleapis.com"
+
+
+def test_vapid_signer_renews_headers_before_expiry(vapid_signer):
+    endpoint = "https://fcm.googleapis.com/fcm/a"
+    with patch("clients.webpush_client.time.time", return_value=1000):
+        headers = vapid_signer.get_headers(endpoint)
+    # still valid
+    renew_at = 1000 + vapid_signer.lifetime - vapid_signer.renew_margin
+    with patch("clients.webpush_client.time.time", return_value=renew_at - 1):
+        assert vapid_signer.get_headers(endpoint) == headers
+    # about to expire
+    with patch("clients.webpush_client.time.time", return_value=renew_at):
+        assert vapid_signer.get_headers(endpoint) != headers
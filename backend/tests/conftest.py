@@ -1,18 +1,24 @@
 import os
 import warnings
 import pytest
+import pytest_asyncio
 import shutil
 
-from collections.abc import Generator
+from collections.abc import AsyncGenerator, Generator
 from alembic import command
 from alembic.config import Config
 from fastapi.testclient import TestClient
+from sqlalchemy.pool import NullPool
 from sqlalchemy.sql import text
+from sqlalchemy.ext.asyncio import create_async_engine
 from sqlmodel import create_engine, Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from core.config import app
-from core.database import get_db_url, get_session
+from core.database import get_db_url, get_async_db_url, get_session
+from db import rebuild_chat_session_summary
 from routes.twilio_routes import get_twilio_client
+from core.socketio_config import get_rabbitmq_client
 from models import (
     User,
     Client,
@@ -103,6 +109,7 @@ def init_db(session: Session) -> None:
     )
     session.add(user)
     session.commit()
+    rebuild_chat_session_summary(session=session)
 
 
 @pytest.fixture
@@ -113,6 +120,15 @@ def session() -> Session:
     return session
 
 
+@pytest_asyncio.fixture
+async def async_session() -> AsyncGenerator[AsyncSession, None]:
+    # asyncpg connections are bound to the event loop of the test
+    engine = create_async_engine(get_async_db_url(), poolclass=NullPool)
+    async with AsyncSession(engine, expire_on_commit=False) as session:
+        yield session
+    await engine.dispose()
+
+
 @pytest.fixture(scope="session", autouse=True)
 def db() -> Generator[Session, None, None]:
     os.environ["TESTING"] = "1"
@@ -147,6 +163,9 @@ def client() -> Generator[TestClient, None, None]:
 
 
 class MockRabbitMQClient:
+    def __init__(self):
+        self.messages = []
+
     async def initialize(self):
         pass
 
@@ -157,7 +176,8 @@ class MockRabbitMQClient:
         pass
 
     async def producer(self, body, routing_key):
-        pass
+        self.messages.append((body, routing_key))
+        return True
 
 
 class MockTwilioBotClient:
@@ -167,6 +187,9 @@ class MockTwilioBotClient:
     def whatsapp_message_create(self, to, body):
         pass
 
+    def validate_and_format_phone_number(self, phone_number):
+        return phone_number
+
     def format_to_queue_message(self, data):
         return "formatted_message"
 
@@ -180,8 +203,10 @@ def get_mock_twilio_client():
 
 @pytest.fixture
 def run_app():
+    rabbitmq_client = MockRabbitMQClient()
     app.dependency_overrides[get_twilio_client] = get_mock_twilio_client
-    yield
+    app.dependency_overrides[get_rabbitmq_client] = lambda: rabbitmq_client
+    yield rabbitmq_client
     app.dependency_overrides = {}
 
 
@@ -0,0 +1,166 @@
+import asyncio
+import pytest
+import pytest_asyncio
+from unittest.mock import AsyncMock, patch
+from core.broadcast import BroadcastWorker, BROADCAST_LOCK_NAMESPACE
+from db import create_broadcast_job
+from models import (
+    User,
+    Client,
+    Broadcast_Job,
+    Broadcast_Recipient,
+    Broadcast_Job_Status_Enum,
+    Broadcast_Recipient_Status_Enum,
+)
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+from sqlmodel import Session, select
+from core.database import get_async_db_url
+
+
+@pytest_asyncio.fixture
+async def async_engine():
+    # asyncpg connections are bound to the event loop of the test
+    engine = create_async_engine(get_async_db_url(), poolclass=NullPool)
+    with patch("core.broadcast.async_engine", engine):
+        yield engine
+    await engine.dispose()
+
+
+def create_job(session: Session, contacts: list[str]) -> Broadcast_Job:
+    # not the user the chat list tests look at
+    user = session.exec(
+        select(User).where(User.phone_number == "+254201234567")
+    ).first()
+    for contact in contacts:
+        if not session.exec(
+            select(Client).where(Client.phone_number == contact)
+        ).first():
+            session.add(Client(phone_number=contact))
+    session.commit()
+    return create_broadcast_job(
+        session=session,
+        user=user,
+        message="Broadcast worker test",
+        contacts=contacts,
+    )
+
+
+def get_recipients(session: Session, job_id: int):
+    session.expire_all()
+    return session.exec(
+        select(Broadcast_Recipient)
+        .where(Broadcast_Recipient.job_id == job_id)
+        .order_by(Broadcast_Recipient.id)
+    ).all()
+
+
+@pytest.mark.asyncio
+async def test_broadcast_worker_retries_and_completes(
+    session: Session, async_engine
+):
+    job = create_job(session, contacts=["+12345678911", "+12345678912"])
+
+    sender = AsyncMock()
+    # the first recipient fails once and succeeds on the retry
+    sender.whatsapp_message_create.side_effect = [False, True, True]
+    worker = BroadcastWorker(
+        sender=sender, rate=1000, max_attempts=3, backoff=0
+    )
+
+    await worker.run(job_id=job.id)
+
+    recipients = get_recipients(session, job_id=job.id)
+    assert [r.status for r in recipients] == [
+        Broadcast_Recipient_Status_Enum.SENT,
+        Broadcast_Recipient_Status_Enum.SENT,
+    ]
+    assert sorted(r.attempts for r in recipients) == [1, 2]
+    assert all(r.sent_at is not None for r in recipients)
+    assert sender.whatsapp_message_create.call_count == 3
+
+    job = session.get(Broadcast_Job, job.id)
+    assert job.status == Broadcast_Job_Status_Enum.COMPLETED
+    assert job.completed_at is not None
+
+
+@pytest.mark.asyncio
+async def test_broadcast_worker_marks_failed_after_max_attempts(
+    session: Session, async_engine
+):
+    job = create_job(session, contacts=["+12345678913"])
+
+    sender = AsyncMock()
+    sender.whatsapp_message_create.return_value = False
+    worker = BroadcastWorker(
+        sender=sender, rate=1000, max_attempts=2, backoff=0
+    )
+
+    await worker.run(job_id=job.id)
+
+    recipients = get_recipients(session, job_id=job.id)
+    assert recipients[0].status == Broadcast_Recipient_Status_Enum.FAILED
+    assert recipients[0].attempts == 2
+    assert sender.whatsapp_message_create.call_count == 2
+
+    # nobody received the broadcast
+    job = session.get(Broadcast_Job, job.id)
+    session.refresh(job)
+    assert job.status == Broadcast_Job_Status_Enum.FAILED
+    assert job.completed_at is not None
+
+    # and it isn't resumed after a restart
+    assert job.id not in await worker.resume()
+
+
+@pytest.mark.asyncio
+async def test_broadcast_worker_resumes_unfinished_jobs(
+    session: Session, async_engine
+):
+    job = create_job(session, contacts=["+12345678914"])
+
+    sender = AsyncMock()
+    sender.whatsapp_message_create.return_value = True
+    worker = BroadcastWorker(sender=sender, rate=1000, backoff=0)
+
+    job_ids = await worker.resume()
+    assert job.id in job_ids
+    await asyncio.gather(*worker.tasks.values())
+
+    recipients = get_recipients(session, job_id=job.id)
+    assert recipients[0].status == Broadcast_Recipient_Status_Enum.SENT
+    session.refresh(job)
+    assert job.status == Broadcast_Job_Status_Enum.COMPLETED
+
+
+@pytest.mark.asyncio
+async def test_broadcast_worker_skips_job_running_on_another_worker(
+    session: Session, async_engine
+):
+    job = create_job(session, contacts=["+12345678915"])
+
+    sender = AsyncMock()
+    worker = BroadcastWorker(sender=sender, rate=1000, backoff=0)
+
+    engine = session.get_bind()
+    with engine.connect() as other_worker:
+        other_worker.execute(
+            text("SELECT pg_advisory_lock(:namespace, :job_id)"),
+            {"namespace": BROADCAST_LOCK_NAMESPACE, "job_id": job.id},
+        )
+        await worker.run(job_id=job.id)
+        other_worker.execute(
+            text("SELECT pg_advisory_unlock(:namespace, :job_id)"),
+            {"namespace": BROADCAST_LOCK_NAMESPACE, "job_id": job.id},
+        )
+
+    sender.whatsapp_message_create.assert_not_called()
+    recipients = get_recipients(session, job_id=job.id)
+    assert recipients[0].status == Broadcast_Recipient_Status_Enum.PENDING
+
+    # the job is picked up once the other worker released it
+    sender.whatsapp_message_create.return_value = True
+    await worker.run(job_id=job.id)
+    recipients = get_recipients(session, job_id=job.id)
+    assert recipients[0].status == Broadcast_Recipient_Status_Enum.SENT
@@ -0,0 +1,140 @@
+import pytest
+
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock, MagicMock
+from core.chat_history import ChatHistoryCache
+from models import Chat, Sender_Role_Enum
+
+
+started_at = datetime(2024, 7, 16, 4, 0)
+
+
+def make_chat(
+    chat_id: int,
+    chat_session_id: int = 1,
+    sender_role: Sender_Role_Enum = Sender_Role_Enum.CLIENT,
+    minutes: int = None,
+) -> Chat:
+    return Chat(
+        id=chat_id,
+        chat_session_id=chat_session_id,
+        message=f"Message {chat_id}",
+        sender_role=sender_role,
+        created_at=started_at
+        + timedelta(minutes=chat_id if minutes is None else minutes),
+    )
+
+
+def get_contents(history: list[dict]) -> list[str]:
+    return [h["content"] for h in history]
+
+
+@pytest.mark.asyncio
+async def test_cold_session_is_loaded_with_one_query():
+    cache = ChatHistoryCache(max_sessions=10, size=3)
+    session = AsyncMock()
+    # the query returns the latest chats first
+    session.exec.return_value = MagicMock()
+    session.exec.return_value.all.return_value = [
+        make_chat(3),
+        make_chat(2, sender_role=Sender_Role_Enum.USER),
+        make_chat(1),
+    ]
+
+    history = await cache.get_history(
+        session=session, chat_session_id=1, chat_id=3
+    )
+    assert history == [
+        {"role": "user", "content": "Message 1"},
+        {"role": "assistant", "content": "Message 2"},
+    ]
+    session.exec.assert_awaited_once()
+
+    # cached now, no more queries
+    cache.append(make_chat(4))
+    history = await cache.get_history(
+        session=session, chat_session_id=1, chat_id=4
+    )
+    assert get_contents(history) == ["Message 2", "Message 3"]
+    session.exec.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_history_ends_before_the_current_chat():
+    cache = ChatHistoryCache(max_sessions=10, size=4)
+    cache.set(1, [make_chat(2), make_chat(1)])
+    session = AsyncMock()
+
+    # another consumer wrote the next message of the session first
+    cache.append(make_chat(3))
+    cache.append(make_chat(4))
+    history = await cache.get_history(
+        session=session, chat_session_id=1, chat_id=3
+    )
+    assert get_contents(history) == ["Message 1", "Message 2"]
+    history = await cache.get_history(
+        session=session, chat_session_id=1, chat_id=4
+    )
+    assert get_contents(history) == ["Message 1", "Message 2", "Message 3"]
+
+    # the same without the cache
+    cache = ChatHistoryCache(max_sessions=0, size=4)
+    session.exec.return_value = MagicMock()
+    session.exec.return_value.all.return_value = [
+        make_chat(4),
+        make_chat(3),
+        make_chat(2),
+        make_chat(1),
+    ]
+    history = await cache.get_history(
+        session=session, chat_session_id=1, chat_id=3
+    )
+    assert get_contents(history) == ["Message 1", "Message 2"]
+    assert len(cache) == 0
+
+
+def test_append_keeps_the_latest_chats_in_order():
+    cache = ChatHistoryCache(max_sessions=10, size=3)
+    cache.set(1, [make_chat(2), make_chat(1)])
+
+    # a chat committed out of order is inserted in its place
+    cache.append(make_chat(4))
+    cache.append(make_chat(3))
+    assert get_contents(cache.get(1)) == [
+        "Message 2",
+        "Message 3",
+        "Message 4",
+    ]
+    # older than the cached chats, already cached, not part of the history
+    cache.append(make_chat(5, minutes=0))
+    cache.append(make_chat(4))
+    cache.append(make_chat(6, sender_role=Sender_Role_Enum.SYSTEM))
+    assert get_contents(cache.get(1)) == [
+        "Message 2",
+        "Message 3",
+        "Message 4",
+    ]
+
+    # sessions that aren't cached are loaded on their next message
+    cache.append(make_chat(7, chat_session_id=2))
+    assert 2 not in cache
+
+
+def test_least_recently_used_session_is_evicted():
+    cache = ChatHistoryCache(max_sessions=2, size=3)
+    cache.set(1, [make_chat(1)])
+    cache.set(2, [make_chat(2, chat_session_id=2)])
+    assert cache.get(1)
+
+    cache.set(3, [make_chat(3, chat_session_id=3)])
+    assert len(cache) == 2
+    assert 1 in cache
+    assert 2 not in cache
+    assert 3 in cache
+
+
+def test_disabled_cache_keeps_nothing():
+    cache = ChatHistoryCache(max_sessions=0, size=3)
+    cache.set(1, [make_chat(1)])
+    assert len(cache) == 0
+    assert cache.get(1) is None
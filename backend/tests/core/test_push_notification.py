@@ -0,0 +1,79 @@
+import json
+import pytest
+
+from unittest.mock import AsyncMock, patch
+from core.push_notification import PushDispatcher
+from models import User, Subscription
+from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+
+def create_subscriptions(session: Session, names: list[str]):
+    user = session.exec(
+        select(User).where(User.phone_number == "+254201234567")
+    ).first()
+    subscriptions = [
+        Subscription(
+            endpoint=f"https://push.example.com/{name}",
+            keys='{"p256dh": "key", "auth": "auth"}',
+            user_id=user.id,
+        )
+        for name in names
+    ]
+    session.add_all(subscriptions)
+    session.commit()
+    return user, subscriptions
+
+
+@pytest.mark.asyncio
+async def test_push_dispatcher_deletes_expired_subscriptions(
+    session: Session, async_session: AsyncSession
+):
+    user, subscriptions = create_subscriptions(
+        session, ["active", "expired-1", "expired-2"]
+    )
+    client = AsyncMock()
+    client.send_all.return_value = subscriptions[1:]
+    dispatcher = PushDispatcher(client=client)
+
+    with patch(
+        "core.push_notification.get_async_session",
+        return_value=async_session,
+    ):
+        await dispatcher.notify_user(
+            user_id=user.id, title="Farmer", body="x" * 200
+        )
+
+    sent = client.send_all.call_args.kwargs
+    assert {s.endpoint for s in sent["subscriptions"]} == {
+        s.endpoint for s in subscriptions
+    }
+    assert json.loads(sent["data"]) == {
+        "title": "Farmer",
+        "body": "x" * 150 + "...",
+    }
+
+    session.expire_all()
+    remaining = session.exec(
+        select(Subscription).where(Subscription.user_id == user.id)
+    ).all()
+    assert [s.endpoint for s in remaining] == [
+        "https://push.example.com/active"
+    ]
+
+
+@pytest.mark.asyncio
+async def test_push_dispatcher_without_subscriptions(
+    async_session: AsyncSession,
+):
+    client = AsyncMock()
+    dispatcher = PushDispatcher(client=client)
+
+    with patch(
+        "core.push_notification.get_async_session",
+        return_value=async_session,
+    ):
+        await dispatcher.notify_user(user_id=0, title="Farmer", body="Hi")
+
+    client.send_all.assert_not_called()
+    assert not dispatcher.tasks
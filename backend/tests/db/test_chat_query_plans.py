@@ -0,0 +1,189 @@
+import json
+import pytest
+
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql
+from models import (
+    User,
+    Chat,
+    Chat_Session,
+    Sender_Role_Enum,
+    Chat_Status_Enum,
+)
+from sqlmodel import Session, create_engine, select
+from core.database import get_db_url
+
+
+SEEDED_CHAT_SESSIONS = 1000
+SEEDED_CHATS = 1_000_000
+
+
+@pytest.fixture(scope="module")
+def seeded_session():
+    """
+    A million chats over a thousand chat sessions, rolled back after the
+    tests so the other tests keep their small dataset.
+    """
+    session = Session(create_engine(get_db_url()))
+    user = session.exec(
+        select(User).where(User.phone_number == "+254201234567")
+    ).first()
+    session.exec(
+        text(
+            """
+            INSERT INTO client (phone_number)
+            SELECT 990000000000 + g FROM generate_series(1, :total) g
+            """
+        ),
+        params={"total": SEEDED_CHAT_SESSIONS},
+    )
+    session.exec(
+        text(
+            """
+            INSERT INTO chat_session (user_id, client_id, platform)
+            SELECT :user_id, client.id, 'WHATSAPP' FROM client
+            WHERE client.phone_number > 990000000000
+            """
+        ),
+        params={"user_id": user.id},
+    )
+    session.exec(
+        text(
+            """
+            WITH sessions AS (
+                SELECT array_agg(id ORDER BY id) AS ids FROM chat_session
+                WHERE user_id = :user_id
+            )
+            INSERT INTO chat (
+                chat_session_id, message, sender_role, status, created_at
+            )
+            SELECT
+                ids[g % array_length(ids, 1) + 1],
+                'Message ' || g,
+                (ARRAY['CLIENT', 'USER', 'ASSISTANT', 'CLIENT'])[g % 4 + 1]
+                ::sender_role_enum,
+                CASE WHEN g % 100 = 0 THEN 'UNREAD' ELSE 'READ' END
+                ::chat_status_enum,
+                now() - g * interval '1 second'
+            FROM sessions, generate_series(1, :total) g
+            """
+        ),
+        params={"user_id": user.id, "total": SEEDED_CHATS},
+    )
+    session.exec(text("ANALYZE client, chat_session, chat"))
+    yield session, user
+    session.rollback()
+    session.close()
+
+
+def get_query_plan(session: Session, statement) -> tuple[set, set]:
+    """
+    Returns the tables the statement's query plan scans sequentially and
+    the indexes it scans.
+    """
+    sql = statement.compile(
+        dialect=postgresql.dialect(),
+        compile_kwargs={"literal_binds": True},
+    )
+    plan = session.exec(text(f"EXPLAIN (FORMAT JSON) {sql}")).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    seq_scans, indexes = set(), set()
+    nodes = [plan[0]["Plan"]]
+    while nodes:
+        node = nodes.pop()
+        if node["Node Type"] == "Seq Scan":
+            seq_scans.add(node["Relation Name"])
+        if "Index Name" in node:
+            indexes.add(node["Index Name"])
+        nodes.extend(node.get("Plans", []))
+    return seq_scans, indexes
+
+
+def get_chat_session_id(session: Session, user: User) -> int:
+    return session.exec(
+        select(Chat_Session.id)
+        .where(Chat_Session.user_id == user.id)
+        .order_by(Chat_Session.id)
+    ).first()
+
+
+def test_last_client_message_uses_client_index(seeded_session):
+    session, user = seeded_session
+    statement = (
+        select(Chat)
+        .where(Chat.chat_session_id == get_chat_session_id(session, user))
+        .where(Chat.sender_role == Sender_Role_Enum.CLIENT)
+        .order_by(Chat.created_at.desc(), Chat.id.desc())
+        .limit(1)
+    )
+    seq_scans, indexes = get_query_plan(session, statement)
+    assert "chat" not in seq_scans
+    assert indexes == {"ix_chat_client_chat_session_id_created_at"}
+
+
+def test_unread_messages_use_unread_index(seeded_session):
+    session, user = seeded_session
+    statement = select(Chat).where(
+        Chat.chat_session_id == get_chat_session_id(session, user),
+        Chat.status == Chat_Status_Enum.UNREAD,
+    )
+    seq_scans, indexes = get_query_plan(session, statement)
+    assert "chat" not in seq_scans
+    assert indexes == {"ix_chat_unread_chat_session_id_created_at"}
+
+
+def test_resend_unread_messages_use_unread_index(seeded_session):
+    session, user = seeded_session
+    chat_session_ids = session.exec(
+        select(Chat_Session.id).where(Chat_Session.user_id == user.id)
+    ).all()
+    statement = (
+        select(Chat)
+        .where(
+            Chat.chat_session_id.in_(chat_session_ids),
+            Chat.status == Chat_Status_Enum.UNREAD,
+        )
+        .order_by(Chat.created_at.desc())
+        .limit(20)
+    )
+    seq_scans, indexes = get_query_plan(session, statement)
+    assert "chat" not in seq_scans
+    assert indexes == {"ix_chat_unread_chat_session_id_created_at"}
+
+
+def test_chat_history_uses_chat_session_index(seeded_session):
+    session, user = seeded_session
+    statement = (
+        select(Chat)
+        .where(
+            Chat.chat_session_id == get_chat_session_id(session, user),
+            Chat.sender_role.in_(
+                [
+                    Sender_Role_Enum.USER,
+                    Sender_Role_Enum.CLIENT,
+                    Sender_Role_Enum.ASSISTANT,
+                ]
+            ),
+        )
+        .order_by(Chat.created_at.desc())
+        .offset(1)
+        .limit(10)
+    )
+    seq_scans, indexes = get_query_plan(session, statement)
+    assert "chat" not in seq_scans
+    assert indexes == {"ix_chat_chat_session_id_created_at"}
+
+
+def test_chat_session_lookup_uses_client_user_index(seeded_session):
+    session, user = seeded_session
+    client_id = session.get(
+        Chat_Session, get_chat_session_id(session, user)
+    ).client_id
+    statement = select(Chat_Session).where(
+        Chat_Session.user_id == user.id,
+        Chat_Session.client_id == client_id,
+    )
+    seq_scans, indexes = get_query_plan(session, statement)
+    assert "chat_session" not in seq_scans
+    assert indexes == {"ix_chat_session_client_id_user_id"}
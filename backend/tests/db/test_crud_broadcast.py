@@ -0,0 +1,96 @@
+from contextlib import contextmanager
+from sqlalchemy import event
+from db import create_broadcast_job
+from models import (
+    User,
+    Client,
+    Client_Properties,
+    Chat_Session,
+    Platform_Enum,
+    Broadcast_Recipient,
+)
+from sqlmodel import Session, select
+
+
+@contextmanager
+def count_queries(session: Session):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    engine = session.get_bind()
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+def create_contacts(session: Session, user: User, prefix: str, total: int):
+    contacts = [f"+{prefix}{i:03d}" for i in range(total)]
+    clients = [Client(phone_number=contact) for contact in contacts]
+    session.add_all(clients)
+    session.flush()
+    session.add_all(
+        [
+            Client_Properties(client_id=client.id, name=f"Farmer {prefix}{i}")
+            for i, client in enumerate(clients)
+        ]
+    )
+    # half of the contacts already have a conversation with the user
+    session.add_all(
+        [
+            Chat_Session(
+                user_id=user.id,
+                client_id=client.id,
+                platform=Platform_Enum.WHATSAPP,
+            )
+            for client in clients[::2]
+        ]
+    )
+    session.commit()
+    return contacts
+
+
+def test_create_broadcast_job_uses_constant_number_of_queries(
+    session: Session,
+):
+    user = session.exec(
+        select(User).where(User.phone_number == "+254201234567")
+    ).first()
+    small = create_contacts(session, user=user, prefix="3161000", total=2)
+    large = create_contacts(session, user=user, prefix="3162000", total=20)
+    session.expire_all()
+
+    query_counts = []
+    for contacts in (small, large):
+        user = session.get(User, user.id)
+        with count_queries(session) as statements:
+            job = create_broadcast_job(
+                session=session,
+                user=user,
+                message="Constant query broadcast",
+                contacts=contacts,
+            )
+        query_counts.append(len(statements))
+
+        recipients = session.exec(
+            select(Broadcast_Recipient).where(
+                Broadcast_Recipient.job_id == job.id
+            )
+        ).all()
+        assert len(recipients) == len(contacts)
+        assert all(r.body.startswith("[Broadcast]") for r in recipients)
+        session.expire_all()
+
+    assert query_counts[0] == query_counts[1]
+
+    # every contact ends up with exactly one chat session with the user
+    chat_sessions = session.exec(
+        select(Chat_Session)
+        .join(Client)
+        .where(Chat_Session.user_id == user.id)
+        .where(Client.phone_number.in_(small + large))
+    ).all()
+    assert len(chat_sessions) == len(small + large)
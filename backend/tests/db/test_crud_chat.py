@@ -1,5 +1,15 @@
+import pytest
+
 from datetime import datetime, timezone, timedelta
-from db import check_if_after_24h_window, add_media
+from db import (
+    check_if_after_24h_window,
+    add_media,
+    upsert_client,
+    upsert_chat_session,
+    upsert_chat_session_summary,
+    read_chat_session_summary,
+    rebuild_chat_session_summary,
+)
 from models import (
     Chat,
     Chat_Session,
@@ -9,22 +19,30 @@ from models import (
     Client,
     Platform_Enum,
     Chat_Media,
+    Chat_Session_Summary,
 )
 from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 
 tz = timezone.utc
 
 
-def test_check_if_after_24h_window_return_false(session: Session):
+@pytest.mark.asyncio
+async def test_check_if_after_24h_window_return_false(
+    session: Session, async_session: AsyncSession
+):
     chat = session.exec(select(Chat)).first()
-    res = check_if_after_24h_window(
-        session=session, chat_session_id=chat.chat_session_id
+    res = await check_if_after_24h_window(
+        session=async_session, chat_session_id=chat.chat_session_id
     )
     assert res is False
 
 
-def test_check_if_after_24h_window_return_true(session: Session):
+@pytest.mark.asyncio
+async def test_check_if_after_24h_window_return_true(
+    session: Session, async_session: AsyncSession
+):
     # create new conversation > 24hr for this condition
     user = session.exec(select(User)).first()
     new_client = Client(phone_number="+62819991035101")
@@ -61,13 +79,16 @@ def test_check_if_after_24h_window_return_true(session: Session):
     session.commit()
     session.flush()
 
-    res = check_if_after_24h_window(
-        session=session, chat_session_id=new_chat_session.id
+    res = await check_if_after_24h_window(
+        session=async_session, chat_session_id=new_chat_session.id
     )
     assert res is True
 
 
-def test_add_media_for_a_chat(session: Session):
+@pytest.mark.asyncio
+async def test_add_media_for_a_chat(
+    session: Session, async_session: AsyncSession
+):
     client = session.exec(
         select(Client).where(Client.phone_number == "+62819991035101")
     ).first()
@@ -91,7 +112,8 @@ def test_add_media_for_a_chat(session: Session):
         },
         {"url": "https://mediaurl.test/filename2.jpg", "type": "image/jpg"},
     ]
-    add_media(session=session, chat=new_chat, media=media)
+    await add_media(session=async_session, chat=new_chat, media=media)
+    await async_session.commit()
 
     media = session.exec(
         select(Chat_Media).where(Chat_Media.chat_id == new_chat.id)
@@ -107,3 +129,144 @@ def test_add_media_for_a_chat(session: Session):
             "url": "https://mediaurl.test/filename2.jpg",
         },
     ]
+
+
+def test_chat_session_summary_follows_chat_writes(session: Session):
+    user = session.exec(
+        select(User).where(User.phone_number == "+254201234567")
+    ).first()
+    client = Client(phone_number="+62819991035102")
+    session.add(client)
+    session.commit()
+    chat_session = Chat_Session(
+        user_id=user.id, client_id=client.id, platform=Platform_Enum.WHATSAPP
+    )
+    session.add(chat_session)
+    session.commit()
+
+    def write_chats(*chats: tuple[Sender_Role_Enum, Chat_Status_Enum]):
+        new_chats = [
+            Chat(
+                chat_session_id=chat_session.id,
+                message=f"Message {i}",
+                sender_role=sender_role,
+                status=status,
+                created_at=datetime.now(tz),
+            )
+            for i, (sender_role, status) in enumerate(chats)
+        ]
+        session.add_all(new_chats)
+        session.flush()
+        session.exec(upsert_chat_session_summary(chats=new_chats))
+        session.commit()
+        return new_chats
+
+    def get_summary():
+        session.expire_all()
+        return session.get(Chat_Session_Summary, chat_session.id)
+
+    _, question = write_chats(
+        (Sender_Role_Enum.CLIENT, Chat_Status_Enum.UNREAD),
+        (Sender_Role_Enum.CLIENT, Chat_Status_Enum.UNREAD),
+    )
+    summary = get_summary()
+    assert summary.user_id == user.id
+    assert summary.last_message_id == question.id
+    assert summary.unread_client_count == 2
+    assert summary.unread_assistant is False
+
+    # assistant whispers are unread, but never the last message
+    write_chats((Sender_Role_Enum.ASSISTANT, Chat_Status_Enum.UNREAD))
+    summary = get_summary()
+    assert summary.last_message_id == question.id
+    assert summary.unread_client_count == 2
+    assert summary.unread_assistant is True
+
+    # a client message that arrives while the others are marked as read
+    read_chats = session.exec(
+        select(Chat).where(
+            Chat.chat_session_id == chat_session.id,
+            Chat.status == Chat_Status_Enum.UNREAD,
+        )
+    ).all()
+    for chat in read_chats:
+        chat.status = Chat_Status_Enum.READ
+    session.flush()
+    (arrived,) = write_chats(
+        (Sender_Role_Enum.CLIENT, Chat_Status_Enum.UNREAD)
+    )
+    session.exec(read_chat_session_summary(chat_session.id, chats=read_chats))
+    session.commit()
+    summary = get_summary()
+    assert summary.unread_client_count == 1
+    assert summary.unread_assistant is False
+
+    # nothing to read, nothing changes
+    session.exec(read_chat_session_summary(chat_session.id, chats=[]))
+    session.commit()
+    assert get_summary().unread_client_count == 1
+
+    arrived.status = Chat_Status_Enum.READ
+    session.flush()
+    session.exec(read_chat_session_summary(chat_session.id, chats=[arrived]))
+    session.commit()
+    assert get_summary().unread_client_count == 0
+
+    (reply,) = write_chats((Sender_Role_Enum.USER, Chat_Status_Enum.READ))
+    summary = get_summary()
+    assert summary.last_message_id == reply.id
+    assert summary.last_message_at == reply.created_at.replace(tzinfo=None)
+    assert summary.unread_client_count == 0
+
+    # rebuilding from the chats gives the same summary
+    for chat in session.exec(
+        select(Chat).where(Chat.chat_session_id == chat_session.id)
+    ).all():
+        chat.status = Chat_Status_Enum.READ
+    session.commit()
+    expected = get_summary().model_dump()
+    session.exec(
+        read_chat_session_summary(chat_session.id, chats=[]).values(
+            last_message_id=None, unread_client_count=5
+        )
+    )
+    session.commit()
+    rebuild_chat_session_summary(
+        session=session, chat_session_ids=[chat_session.id]
+    )
+    assert get_summary().model_dump() == expected
+
+
+def test_upsert_client_and_chat_session(session: Session):
+    user = session.exec(select(User)).first()
+
+    client_id = session.exec(
+        upsert_client(phone_number=6281299990001)
+    ).scalar_one()
+    assert (
+        session.exec(upsert_client(phone_number=6281299990001)).scalar_one()
+        == client_id
+    )
+
+    chat_session_id, created = session.exec(
+        upsert_chat_session(
+            user_id=user.id,
+            client_id=client_id,
+            platform=Platform_Enum.WHATSAPP,
+        )
+    ).one()
+    assert created is True
+    assert session.exec(
+        upsert_chat_session(
+            user_id=user.id,
+            client_id=client_id,
+            platform=Platform_Enum.WHATSAPP,
+        )
+    ).one() == (chat_session_id, False)
+    session.commit()
+
+    chat_sessions = session.exec(
+        select(Chat_Session).where(Chat_Session.client_id == client_id)
+    ).all()
+    assert [cs.id for cs in chat_sessions] == [chat_session_id]
+    assert chat_sessions[0].user_id == user.id
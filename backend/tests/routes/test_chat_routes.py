@@ -1,13 +1,34 @@
+from contextlib import contextmanager
+from datetime import datetime, timedelta
 from fastapi.testclient import TestClient
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
 from models import (
     Sender_Role_Enum,
     Chat_Session,
     User,
     Client,
     Chat,
+    Chat_Media,
     Chat_Status_Enum,
+    Platform_Enum,
 )
 from sqlmodel import Session, select, and_
+from db import upsert_chat_session_summary
+
+
+@contextmanager
+def count_queries():
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(Engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(Engine, "before_cursor_execute", before_cursor_execute)
 
 
 def test_get_chats(client: TestClient) -> None:
@@ -41,10 +62,10 @@ def test_get_chats_authenticated(client: TestClient, session: Session) -> None:
     assert "total_chats" in content
     assert "chats" in content
     assert "limit" in content
-    assert "offset" in content
+    assert "next_cursor" in content
 
     assert content["limit"] == 10
-    assert content["offset"] == 0
+    assert content["total_chats"] is None
 
     assert isinstance(content["chats"], list)
     assert len(content["chats"]) >= 1
@@ -69,6 +90,89 @@ def test_get_chats_authenticated(client: TestClient, session: Session) -> None:
     )
 
 
+def test_get_chats_paginates_with_cursor(
+    client: TestClient, session: Session
+) -> None:
+    response = client.post("/login?phone_number=%2B254201234567")
+    assert response.status_code == 200
+    user = session.exec(
+        select(User).where(User.phone_number == "+254201234567")
+    ).first()
+    response = client.get(f"/verify/{user.login_code}")
+    assert response.status_code == 200
+    headers = {"Authorization": f"Bearer {response.json()['token']}"}
+
+    started_at = datetime(2024, 2, 1, 8, 0)
+    for i in range(5):
+        farmer = Client(phone_number=f"+628123450{i:04d}")
+        session.add(farmer)
+        session.commit()
+        chat_session = Chat_Session(
+            user_id=user.id,
+            client_id=farmer.id,
+            platform=Platform_Enum.WHATSAPP,
+        )
+        session.add(chat_session)
+        session.commit()
+        chat = Chat(
+            chat_session_id=chat_session.id,
+            message=f"Farmer {i}",
+            sender_role=Sender_Role_Enum.CLIENT,
+            status=Chat_Status_Enum.READ,
+            # two chat sessions share each time, the id breaks the tie
+            created_at=started_at + timedelta(minutes=i // 2),
+        )
+        session.add(chat)
+        session.flush()
+        session.exec(upsert_chat_session_summary(chats=[chat]))
+        session.commit()
+
+    chats = []
+    query_counts = []
+    cursor = None
+    while True:
+        params = {"limit": 2}
+        if cursor:
+            params["cursor"] = cursor
+        with count_queries() as statements:
+            response = client.get("/chat-list", params=params, headers=headers)
+        assert response.status_code == 200
+        content = response.json()
+        assert len(content["chats"]) <= 2
+        query_counts.append(len(statements))
+        chats.extend(content["chats"])
+        cursor = content["next_cursor"]
+        if not cursor:
+            break
+
+    chat_session_ids = [c["chat_session"]["id"] for c in chats]
+    assert len(chat_session_ids) == len(set(chat_session_ids))
+    sort_keys = [
+        (c["last_message"]["created_at"], c["chat_session"]["id"])
+        for c in chats
+    ]
+    assert sort_keys == sorted(sort_keys, reverse=True)
+    farmers = [
+        c["last_message"]["message"]
+        for c in chats
+        if c["last_message"]["message"].startswith("Farmer ")
+    ]
+    assert farmers == [f"Farmer {i}" for i in reversed(range(5))]
+    # every page costs the same, however deep
+    assert len(set(query_counts)) == 1
+
+    response = client.get(
+        "/chat-list", params={"include_total": True}, headers=headers
+    )
+    assert response.status_code == 200
+    assert response.json()["total_chats"] == len(chats)
+
+    response = client.get(
+        "/chat-list", params={"cursor": "not-a-cursor"}, headers=headers
+    )
+    assert response.status_code == 400
+
+
 def test_get_chat_details_by_client_id(
     client: TestClient, session: Session
 ) -> None:
@@ -123,6 +227,88 @@ def test_get_chat_details_by_client_id(
     assert "media" in first_message
 
 
+def test_get_chat_details_paginates_with_cursor(
+    client: TestClient, session: Session
+) -> None:
+    response = client.post("/login?phone_number=%2B254201234567")
+    assert response.status_code == 200
+    user = session.exec(
+        select(User).where(User.phone_number == "+254201234567")
+    ).first()
+    response = client.get(f"/verify/{user.login_code}")
+    assert response.status_code == 200
+    headers = {"Authorization": f"Bearer {response.json()['token']}"}
+
+    farmer = Client(phone_number="+6281234567999")
+    session.add(farmer)
+    session.commit()
+    chat_session = Chat_Session(
+        user_id=user.id, client_id=farmer.id, platform=Platform_Enum.WHATSAPP
+    )
+    session.add(chat_session)
+    session.commit()
+    started_at = datetime(2024, 1, 1, 8, 0)
+    chats = [
+        Chat(
+            chat_session_id=chat_session.id,
+            message=f"Message {i}",
+            sender_role=Sender_Role_Enum.CLIENT,
+            status=Chat_Status_Enum.READ,
+            # two messages share each timestamp, the id breaks the tie
+            created_at=started_at + timedelta(minutes=i // 2),
+        )
+        for i in range(25)
+    ]
+    session.add_all(chats)
+    session.flush()
+    session.add_all(
+        [
+            Chat_Media(
+                chat_id=chat.id, url=f"/photo-{chat.id}.jpg", type="img"
+            )
+            for chat in chats
+        ]
+    )
+    session.commit()
+    farmer_id = farmer.id
+
+    pages = []
+    query_counts = []
+    cursor = None
+    while True:
+        params = {"limit": 10}
+        if cursor:
+            params["before"] = cursor
+        with count_queries() as statements:
+            response = client.get(
+                f"/chat-details/{farmer_id}", params=params, headers=headers
+            )
+        assert response.status_code == 200
+        content = response.json()
+        query_counts.append(len(statements))
+        pages.append([m["message"] for m in content["messages"]])
+        assert all(len(m["media"]) == 1 for m in content["messages"])
+        cursor = content["next_cursor"]
+        if not cursor:
+            break
+
+    # newest page first, messages of a page in chronological order
+    assert pages == [
+        [f"Message {i}" for i in range(15, 25)],
+        [f"Message {i}" for i in range(5, 15)],
+        [f"Message {i}" for i in range(0, 5)],
+    ]
+    # the media are loaded in one query, whatever the number of messages
+    assert len(set(query_counts)) == 1
+
+    response = client.get(
+        f"/chat-details/{farmer_id}",
+        params={"before": "not-a-cursor"},
+        headers=headers,
+    )
+    assert response.status_code == 400
+
+
 def test_send_broadcast_unauthorized(client: TestClient) -> None:
     response = client.post(
         "/send-broadcast",
@@ -203,3 +389,54 @@ def test_send_broadcast_success(client: TestClient, session: Session) -> None:
         assert messages[-1].message == content
         assert messages[-1].sender_role == Sender_Role_Enum.USER_BROADCAST
         assert messages[-1].status == Chat_Status_Enum.READ
+
+
+def test_get_broadcast_job(client: TestClient, session: Session) -> None:
+    response = client.post("/login?phone_number=%2B12345678900")
+    assert response.status_code == 200
+
+    user = session.exec(
+        select(User).where(User.phone_number == "+12345678900")
+    ).first()
+
+    response = client.get(f"/verify/{user.login_code}")
+    assert response.status_code == 200
+    token = response.json()["token"]
+
+    contacts = ["+12345678903", "+12345678904"]
+    session.add_all([Client(phone_number=contact) for contact in contacts])
+    session.commit()
+
+    response = client.post(
+        "/send-broadcast",
+        headers={"Authorization": f"Bearer {token}"},
+        json={
+            "contacts": contacts,
+            "message": "Hello, this is a broadcast message.",
+        },
+    )
+    assert response.status_code == 200
+    content = response.json()
+    assert content["message"] == "Broadcast message sent to WhatsApp"
+    job_id = content["job_id"]
+
+    # the broadcast is queued as a job whose progress can be polled
+    response = client.get(
+        f"/broadcast/{job_id}", headers={"Authorization": f"Bearer {token}"}
+    )
+    assert response.status_code == 200
+    content = response.json()
+    assert content["id"] == job_id
+    assert content["message"] == "Hello, this is a broadcast message."
+    assert content["status"] == "PENDING"
+    assert content["total"] == 2
+    assert content["pending"] == 2
+    assert content["sent"] == 0
+    assert content["failed"] == 0
+
+    response = client.get(
+        f"/broadcast/{job_id + 1}",
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    assert response.status_code == 404
+    assert response.json()["detail"] == "Broadcast job not found"
@@ -1,4 +1,7 @@
+import json
+
 from fastapi.testclient import TestClient
+from core.socketio_config import RABBITMQ_QUEUE_WHATSAPP_MESSAGES
 
 
 def test_receive_whatsapp_message_from_wrong_phone_number(
@@ -40,6 +43,32 @@ def test_receive_whatsapp_message_with_num_media(
     response = client.post("/whatsapp", data=form_data)
     assert response.status_code == 204
 
+    # the raw message is queued, the media is processed by the consumer
+    [(body, routing_key)] = run_app.messages
+    assert routing_key == RABBITMQ_QUEUE_WHATSAPP_MESSAGES
+    body = json.loads(body)
+    assert body["MessageSid"] == "test_sid"
+    assert body["NumMedia"] == 1
+    assert body["MediaUrl0"] == "https://example_media.com"
+
+
+def test_receive_whatsapp_message_not_queued(
+    run_app, client: TestClient
+) -> None:
+    async def producer(body, routing_key):
+        return False
+
+    run_app.producer = producer
+    form_data = {
+        "MessageSid": "test_sid",
+        "From": "whatsapp:+6281234567890",
+        "Body": "Test message",
+        "MessageType": "text",
+    }
+    response = client.post("/whatsapp", data=form_data)
+    # Twilio retries the webhook
+    assert response.status_code == 503
+
 
 def test_receive_whatsapp_message_format_error(client: TestClient) -> None:
     form_data = {
@@ -0,0 +1,27 @@
+import time
+import pytest
+from utils.rate_limiter import TokenBucket
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_allows_burst_up_to_capacity():
+    bucket = TokenBucket(rate=1, capacity=5)
+    start = time.monotonic()
+    for _ in range(5):
+        await bucket.acquire()
+    assert time.monotonic() - start < 0.1
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_limits_throughput():
+    bucket = TokenBucket(rate=50, capacity=1)
+    start = time.monotonic()
+    for _ in range(11):
+        await bucket.acquire()
+    # the first token is available immediately, the next ten take 1/50s each
+    assert time.monotonic() - start >= 0.19
+
+
+def test_token_bucket_invalid_rate():
+    with pytest.raises(ValueError, match="rate must be greater than 0"):
+        TokenBucket(rate=0)
@@ -1,6 +1,9 @@
 import os
+import pytest
 import utils.storage as storage
 
+from unittest.mock import patch, MagicMock
+
 
 def test_upload_local(setup_local_storage):
     test_file = setup_local_storage["test_file"]
@@ -51,3 +54,71 @@ def test_download_local(setup_local_storage):
     with open(downloaded_file, "r") as f:
         content = f.read()
     assert content == test_file_content
+
+
+def test_upload_stream_local(setup_local_storage):
+    test_folder = setup_local_storage["test_folder"]
+    chunks = [b"This is ", b"a streamed ", b"file."]
+
+    file_url = storage.upload_stream(
+        chunks=iter(chunks),
+        folder="test_folder",
+        filename="test_stream.txt",
+        content_type="text/plain",
+    )
+
+    assert file_url == f"{test_folder}/test_stream.txt"
+    with open(file_url, "rb") as f:
+        assert f.read() == b"".join(chunks)
+
+
+@pytest.mark.asyncio
+async def test_memory_storage():
+    backend = storage.MemoryStorage()
+    url = await backend.aupload_stream(
+        chunks=[b"voice ", b"note"], folder="media", filename="note.ogg"
+    )
+    assert url == "memory://media/note.ogg"
+    assert await backend.acheck(url)
+
+    other_url = backend.upload_stream(
+        chunks=[b"image"], folder="media", filename="image.png"
+    )
+    assert await backend.adelete_many([url, other_url]) == [url, other_url]
+    assert not backend.check(url)
+    assert backend.files == {}
+
+
+def test_gcs_storage_deletes_in_batches():
+    client = MagicMock()
+    with (
+        patch.object(storage, "get_storage_client", return_value=client),
+        patch.object(storage, "GCS_BATCH_SIZE", 2),
+    ):
+        backend = storage.GCSStorage(bucket_name="test-bucket")
+        deleted = backend.delete_many(
+            [
+                "https://storage.googleapis.com/test-bucket/media/1.png",
+                "https://storage.googleapis.com/test-bucket/media/2.png",
+                "https://storage.googleapis.com/test-bucket/media/3.png",
+            ]
+        )
+
+    assert deleted == ["media/1.png", "media/2.png", "media/3.png"]
+    # the bucket is looked up once, and 3 deletes take 2 batch requests
+    client.bucket.assert_called_once_with("test-bucket")
+    assert client.batch.call_count == 2
+    assert client.bucket.return_value.blob.return_value.delete.call_count == 3
+
+
+def test_storage_backend_is_reused():
+    assert storage.get_storage_backend() is storage.get_storage_backend()
+
+
+def test_incomplete_storage_backend_fails_on_creation():
+    class UploadOnlyStorage(storage.StorageBackend):
+        def upload(self, file, folder, filename=None, public=False):
+            return file
+
+    with pytest.raises(TypeError):
+        UploadOnlyStorage()
@@ -0,0 +1,98 @@
+import os
+import json
+
+from unittest.mock import patch
+from utils.templates import MessageTemplate, TemplateRegistry
+
+
+template_ids = {
+    "INTRO_TEMPLATE_ID_en": "HX123456",
+    "INTRO_TEMPLATE_ID_sw": "HX223456",
+    "BROADCAST_TEMPLATE_ID_en": "HX323456",
+}
+
+
+def write_templates(path, content_data: dict):
+    with open(path, "w") as json_file:
+        json.dump(content_data, json_file)
+
+
+def test_message_template_render():
+    template = MessageTemplate(
+        content_sid="HX123456", content="Hi {{1}}, I'm {{2}}. Bye {{1}}!"
+    )
+    assert template.render("John", "Jane") == "Hi John, I'm Jane. Bye John!"
+    # placeholders without a value are left as they are
+    assert template.render("John") == "Hi John, I'm {{2}}. Bye John!"
+    # values aren't substituted again
+    assert template.render("{{2}}", "Jane") == "Hi {{2}}, I'm Jane. Bye {{2}}!"
+    assert MessageTemplate(content_sid="HX123456").render("John") is None
+
+
+def test_template_registry_is_indexed_by_purpose_and_language(tmp_path):
+    path = tmp_path / "twilio_message_template.json"
+    write_templates(
+        path, {"HX123456": "Hello {{1}}", "HX223456": "Jambo {{1}}"}
+    )
+    registry = TemplateRegistry(path=str(path))
+    with patch.dict(os.environ, template_ids):
+        intro = registry.get("intro", "sw")
+        assert intro.content_sid == "HX223456"
+        assert intro.render("John") == "Jambo John"
+
+        # the ID is configured, the content wasn't fetched
+        broadcast = registry.get("broadcast", "en")
+        assert broadcast.content_sid == "HX323456"
+        assert broadcast.render("John") is None
+
+        # not configured
+        verification = registry.get("verification", "fr")
+        assert verification.content_sid is None
+        assert verification.render("John") is None
+
+
+def test_template_registry_reloads_when_the_file_changes(tmp_path):
+    path = tmp_path / "twilio_message_template.json"
+    write_templates(path, {"HX123456": "Hello {{1}}"})
+    registry = TemplateRegistry(path=str(path))
+    with patch.dict(os.environ, template_ids):
+        assert registry.get("intro", "en").render("John") == "Hello John"
+        assert registry.reload_if_changed() is False
+
+        write_templates(path, {"HX123456": "Hi {{1}}"})
+        os.utime(path, (registry.mtime + 1, registry.mtime + 1))
+        assert registry.reload_if_changed() is True
+        assert registry.get("intro", "en").render("John") == "Hi John"
+
+        # a broken file keeps the loaded templates
+        path.write_text("{")
+        os.utime(path, (registry.mtime + 1, registry.mtime + 1))
+        registry.reload_if_changed()
+        assert registry.get("intro", "en").render("John") == "Hi John"
+
+
+def test_template_registry_without_file(tmp_path):
+    registry = TemplateRegistry(path=str(tmp_path / "notfound.json"))
+    with patch.dict(os.environ, template_ids):
+        intro = registry.get("intro", "en")
+    assert intro.content_sid == "HX123456"
+    assert intro.content is None
+    assert registry.mtime is None
+
+
+def test_template_registry_get_content_by_template_id(tmp_path):
+    path = tmp_path / "twilio_message_template.json"
+    write_templates(
+        path,
+        {
+            "HX123456": "Template 1",
+            "HX223456": "Template 2",
+            "HX323456": "Template 3",
+        },
+    )
+    registry = TemplateRegistry(path=str(path))
+    assert registry.get_content("HX223456") == "Template 2"
+    assert registry.get_content("HX999999") is None
+
+    registry = TemplateRegistry(path=str(tmp_path / "notfound.json"))
+    assert registry.get_content("HX223456") is None
@@ -0,0 +1,69 @@
+import pytest
+
+from unittest.mock import patch
+from utils import transcription
+from utils.transcription import Transcriber, TranscriptionEngine
+
+
+class EchoEngine(TranscriptionEngine):
+    def transcribe(self, wav):
+        return wav.decode()
+
+
+def test_transcriber_uses_the_configured_engine():
+    transcriber = Transcriber(engine="echo", workers=0)
+    with (
+        patch.dict(transcription.ENGINES, {"echo": EchoEngine}),
+        patch.object(
+            transcription,
+            "decode_audio",
+            side_effect=lambda audio, format: audio,
+        ),
+    ):
+        assert transcriber.transcribe(b"Hello") == "Hello"
+
+
+def test_transcriber_caches_by_content_hash():
+    transcriber = Transcriber(engine="echo", workers=0, cache_size=1)
+    with patch.object(
+        transcription, "transcribe_audio", return_value="Hello"
+    ) as transcribe_audio:
+        # a forwarded voice note is the same audio
+        assert transcriber.transcribe(b"voice note") == "Hello"
+        assert transcriber.transcribe(b"voice note") == "Hello"
+        assert transcribe_audio.call_count == 1
+
+        # the least recently used transcription is evicted
+        transcriber.transcribe(b"another voice note")
+        transcriber.transcribe(b"voice note")
+        assert transcribe_audio.call_count == 3
+
+
+def test_transcriber_failures_are_not_cached():
+    transcriber = Transcriber(engine="echo", workers=0)
+    with patch.object(
+        transcription,
+        "transcribe_audio",
+        side_effect=[ConnectionError("unreachable"), "Hello"],
+    ):
+        assert transcriber.transcribe(b"voice note") is None
+        assert transcriber.transcribe(b"voice note") == "Hello"
+
+
+def test_incomplete_engine_fails_on_creation():
+    class SilentEngine(TranscriptionEngine):
+        pass
+
+    with pytest.raises(TypeError):
+        SilentEngine()
+
+
+def test_transcriber_pool_spawns_workers_that_load_the_engine():
+    transcriber = Transcriber(engine="echo", workers=2)
+    with patch.object(transcription, "ProcessPoolExecutor") as pool:
+        transcriber.get_pool()
+    kwargs = pool.call_args.kwargs
+    assert kwargs["max_workers"] == 2
+    assert kwargs["mp_context"].get_start_method() == "spawn"
+    assert kwargs["initializer"] is transcription.get_engine
+    assert kwargs["initargs"] == ("echo",)
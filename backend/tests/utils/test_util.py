@@ -1,11 +1,12 @@
-import os
 import pytest
-import json
+import base64
 
+from datetime import datetime
 from utils.util import (
     TextConverter,
     generate_message_template_lang_by_phone_number,
-    get_template_content_from_json,
+    encode_cursor,
+    decode_cursor,
 )
 
 
@@ -55,7 +56,7 @@ def test_convert_headers_to_uppercase():
     sample_text = "# header\n## subheader"
     expected_output = "*HEADER*\n\n*SUBHEADER*"
     converter = TextConverter(sample_text)
-    output = converter._convert_headers_to_uppercase_bold(converter.text)
+    output = converter.format_whatsapp()
     assert output == expected_output
 
 
@@ -64,7 +65,7 @@ def test_convert_italics_to_whatsapp():
     sample_text = "This is _italic_ text."
     expected_output = "This is _italic_ text."
     converter = TextConverter(sample_text)
-    output = converter._convert_italics_to_whatsapp(converter.text)
+    output = converter.format_whatsapp()
     assert output == expected_output
 
 
@@ -73,7 +74,7 @@ def test_convert_bold_to_whatsapp():
     sample_text = "This is **bold** text."
     expected_output = "This is *bold* text."
     converter = TextConverter(sample_text)
-    output = converter._convert_bold_to_whatsapp(converter.text)
+    output = converter.format_whatsapp()
     assert output == expected_output
 
 
@@ -81,7 +82,7 @@ def test_not_to_convert_hypen_between_words():
     """Test the conversion of hypen between words."""
     sample_text = "This is word-hypenbold-word text."
     converter = TextConverter(sample_text)
-    output = converter._convert_bold_to_whatsapp(converter.text)
+    output = converter.format_whatsapp()
     assert output == sample_text
 
 
@@ -91,10 +92,76 @@ def test_not_to_convert_hypen_inside_urls():
         "This is http://localhost:3001/verification/unique-uuid-here text."
     )
     converter = TextConverter(sample_text)
-    output = converter._convert_bold_to_whatsapp(converter.text)
+    output = converter.format_whatsapp()
     assert output == sample_text
 
 
+def test_not_to_convert_double_underscores_in_urls_and_identifiers():
+    sample_text = (
+        "See http://example.com/a__b__c and http://example.com/__b__/c\n"
+        "Call obj.__init__ or __init__() with my__private__var."
+    )
+    converter = TextConverter(sample_text)
+    assert converter.format_whatsapp() == sample_text
+    assert converter.format_slack() == sample_text
+
+    converter = TextConverter("This is __bold__ text, __not bold __.")
+    assert converter.format_whatsapp() == "This is *bold* text, __not bold __."
+
+
+def test_convert_lists_and_keep_code_as_is():
+    sample_text = (
+        "- item\n"
+        "  + nested item with **bold**\n"
+        "Use C# - or F# - for `**code**`\n"
+        "```\n"
+        "# not a header\n"
+        "- not a list\n"
+        "```\n"
+        "~~removed~~"
+    )
+    expected_output = (
+        "* item\n"
+        "  * nested item with *bold*\n"
+        "Use C# - or F# - for `**code**`\n"
+        "```\n"
+        "# not a header\n"
+        "- not a list\n"
+        "```\n"
+        "~removed~"
+    )
+    converter = TextConverter(sample_text)
+    assert converter.format_whatsapp() == expected_output
+
+
+def test_format_slack(sample_text):
+    converter = TextConverter(sample_text)
+    assert converter.format_slack() == (
+        "*Header 1*\n"
+        "*Header 2*\n"
+        "*Header 3*\n"
+        "• Bullet point 1\n"
+        "• Bullet point 2\n"
+        "This is _italic_ text.\n"
+        "This is *bold* text."
+        "This is `code block` text."
+        "This is hypen-between-words."
+        "Check this <https://example.com/verify/unique-uuid|link>."
+    )
+
+
+def test_convert_links_with_parentheses():
+    converter = TextConverter(
+        "See [a](http://x.y/a_(b)) and ([c](http://x.y/c))."
+    )
+    assert converter.format_slack() == (
+        "See <http://x.y/a_(b)|a> and (<http://x.y/c|c>)."
+    )
+    assert converter.format_whatsapp() == (
+        "See a (http://x.y/a_(b)) and (c (http://x.y/c))."
+    )
+
+
 def test_generate_message_template_lang_by_phone_number():
     # expected sw
     lang = generate_message_template_lang_by_phone_number(
@@ -118,28 +185,13 @@ def test_generate_message_template_lang_by_phone_number():
     assert lang == "en"
 
 
-def test_get_template_content_from_json_file_not_exist():
-    file_path = "./twilio_message_template_notfound.json"
-    res = get_template_content_from_json(
-        content_sid="HX123456", testing_file_path=file_path
-    )
-    assert res is False
-
-
-def test_get_template_content_from_json_success():
-    file_path = "./tests/utils/twilio_message_template_testing.json"
-    # create file for testing
-    content_data = {
-        "HX123456": "Template 1",
-        "HX223456": "Template 2",
-        "HX323456": "Template 3",
-    }
-    with open(file_path, "w") as json_file:
-        json.dump(content_data, json_file, indent=2)
-    res = get_template_content_from_json(
-        content_sid="HX223456", testing_file_path=file_path
-    )
-    assert res == "Template 2"
-    # remove file after testing
-    if os.path.exists(file_path):
-        os.remove(file_path)
+def test_encode_and_decode_cursor():
+    created_at = datetime(2024, 7, 16, 4, 29, 47, 799230)
+    cursor = encode_cursor(created_at, 42)
+    assert isinstance(cursor, str)
+    assert decode_cursor(cursor) == [created_at.isoformat(), 42]
+
+    not_a_list = base64.urlsafe_b64encode(b'{"id": 42}').decode()
+    for invalid in ["not-a-cursor", not_a_list]:
+        with pytest.raises(ValueError):
+            decode_cursor(invalid)
@@ -1,4 +1,6 @@
-from sqlmodel import Session
+import pytest
+
+from sqlmodel.ext.asyncio.session import AsyncSession
 from core.socketio_config import (
     check_conversation_exist_and_generate_queue_message,
     Sender_Role_Enum,
@@ -6,7 +8,10 @@ from core.socketio_config import (
 )
 
 
-def test_check_conversation_exist_and_generate_queue_message(session: Session):
+@pytest.mark.asyncio
+async def test_check_conversation_exist_and_generate_queue_message(
+    async_session: AsyncSession,
+):
     msg = {
         "conversation_envelope": {
             "client_phone_number": "+6281234567890",
@@ -20,8 +25,8 @@ def test_check_conversation_exist_and_generate_queue_message(session: Session):
         "transformation_log": None,
     }
 
-    result = check_conversation_exist_and_generate_queue_message(
-        session=session, msg=msg, user_phone_number="+12345678900"
+    result = await check_conversation_exist_and_generate_queue_message(
+        session=async_session, msg=msg, user_phone_number="+12345678900"
     )
 
     assert result is not None
@@ -35,8 +40,9 @@ def test_check_conversation_exist_and_generate_queue_message(session: Session):
     assert result["body"] == "Hello"
 
 
-def test_check_conversation_exist_and_generate_queue_message_no_conversation(
-    session: Session,
+@pytest.mark.asyncio
+async def test_check_conversation_exist_and_generate_queue_message_no_conversation(  # noqa: E501
+    async_session: AsyncSession,
 ):
     msg = {
         "conversation_envelope": {
@@ -51,8 +57,8 @@ def test_check_conversation_exist_and_generate_queue_message_no_conversation(
         "transformation_log": None,
     }
 
-    result = check_conversation_exist_and_generate_queue_message(
-        session=session, msg=msg, user_phone_number="+1234567890"
+    result = await check_conversation_exist_and_generate_queue_message(
+        session=async_session, msg=msg, user_phone_number="+1234567890"
     )
 
     assert result is None
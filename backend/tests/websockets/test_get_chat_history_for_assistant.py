@@ -1,5 +1,8 @@
-import json
+import pytest
+
 from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from core.chat_history import chat_history_cache
 from core.socketio_config import (
     get_chat_history_for_assistant,
     Chat,
@@ -10,72 +13,61 @@ from core.socketio_config import (
 )
 
 
-MESSAGE = {
-    "conversation_envelope": {
-        "message_id": "SM48e12712cab50ba0a061cf8058d6ed48",
-        "client_phone_number": "+6281222304050",
-        "user_phone_number": None,
-        "sender_role": "client",
-        "platform": "WHATSAPP",
-        "timestamp": "2024-07-16T04:29:47.799230+00:00",
-    },
-    "body": "Message with history",
-    "media": [],
-    "context": [],
-    "transformation_log": ["Message with history"],
-}
+@pytest.fixture(autouse=True)
+def clear_chat_history_cache():
+    # the chats of these tests are written directly, not through the cache
+    chat_history_cache.clear()
+    yield
+    chat_history_cache.clear()
 
 
-def test_get_chat_history_for_assistant_if_chat_session_exist(
+@pytest.mark.asyncio
+async def test_get_chat_history_for_assistant_if_chat_session_exist(
     session: Session,
+    async_session: AsyncSession,
 ):
     chat = session.exec(select(Chat)).first()
+    # the message the assistant answers
+    latest_chat = session.exec(
+        select(Chat)
+        .where(Chat.chat_session_id == chat.chat_session_id)
+        .order_by(Chat.created_at.desc(), Chat.id.desc())
+    ).first()
 
-    res = get_chat_history_for_assistant(
-        session=session,
+    res = await get_chat_history_for_assistant(
+        session=async_session,
         chat_session_id=chat.chat_session_id,
-        body=json.dumps(MESSAGE),
+        chat_id=latest_chat.id,
     )
 
-    assert res is not None
-    res = json.loads(res)
-    assert res == {
-        "conversation_envelope": {
-            "message_id": "SM48e12712cab50ba0a061cf8058d6ed48",
-            "client_phone_number": "+6281222304050",
-            "user_phone_number": None,
-            "sender_role": "client",
-            "platform": "WHATSAPP",
-            "timestamp": "2024-07-16T04:29:47.799230+00:00",
+    assert res == [
+        {"role": "user", "content": "Hello Admin!"},
+        {"role": "assistant", "content": "Hello, +62 812 3456 7890"},
+        {
+            "role": "assistant",
+            "content": "Is there anything I can help you with?",
         },
-        "body": "Message with history",
-        "media": [],
-        "context": [],
-        "transformation_log": ["Message with history"],
-        "history": [
-            {"role": "user", "content": "Hello Admin!"},
-            {"role": "assistant", "content": "Hello, +62 812 3456 7890"},
-            {
-                "role": "assistant",
-                "content": "Is there anything I can help you with?",
-            },
-        ],
-    }
+    ]
+    # the next message of the session is answered from the cache
+    assert chat.chat_session_id in chat_history_cache
 
 
-def test_get_chat_history_for_assistant_if_chat_session_not_exist(
-    session: Session,
+@pytest.mark.asyncio
+async def test_get_chat_history_for_assistant_if_chat_session_not_exist(
+    async_session: AsyncSession,
 ):
-    res = get_chat_history_for_assistant(
-        session=session,
+    res = await get_chat_history_for_assistant(
+        session=async_session,
         chat_session_id=0,
-        body=json.dumps(MESSAGE),
+        chat_id=0,
     )
-    assert res == json.dumps(MESSAGE)
+    assert res == []
 
 
-def test_get_chat_history_for_assistant_if_chat_session_doesnt_have_chats(
+@pytest.mark.asyncio
+async def test_get_chat_history_for_assistant_if_chat_session_doesnt_have_chats(  # noqa: E501
     session: Session,
+    async_session: AsyncSession,
 ):
     user = session.exec(select(User)).first()
 
@@ -96,9 +88,9 @@ def test_get_chat_history_for_assistant_if_chat_session_doesnt_have_chats(
     ).first()
     assert find_chat is None
 
-    res = get_chat_history_for_assistant(
-        session=session,
+    res = await get_chat_history_for_assistant(
+        session=async_session,
         chat_session_id=new_chat_session.id,
-        body=json.dumps(MESSAGE),
+        chat_id=0,
     )
-    assert res == json.dumps(MESSAGE)
+    assert res == []
@@ -1,6 +1,9 @@
 import pytest
 
+from unittest.mock import patch
+
 from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from core.socketio_config import (
     handle_incoming_message,
     Chat,
@@ -8,7 +11,7 @@ from core.socketio_config import (
     Client,
     Sender_Role_Enum,
 )
-from models import Chat_Media
+from models import Chat_Media, Chat_Session_Summary
 
 
 MESSAGE = {
@@ -30,8 +33,9 @@ MESSAGE = {
 @pytest.mark.asyncio
 async def test_handle_incoming_message_new_conversation_n_send_initial_message(
     session: Session,
+    async_session: AsyncSession,
 ):
-    await handle_incoming_message(session=session, message=MESSAGE)
+    await handle_incoming_message(session=async_session, message=MESSAGE)
 
     new_client = session.exec(
         select(Client).where(Client.phone_number == "+6281222304050")
@@ -53,13 +57,21 @@ async def test_handle_incoming_message_new_conversation_n_send_initial_message(
     )
     assert new_chat[1].sender_role == Sender_Role_Enum.SYSTEM
 
+    # the initial message is the last one, the client message is unread
+    summary = session.get(Chat_Session_Summary, new_chat_session.id)
+    assert summary.last_message_id == new_chat[1].id
+    assert summary.unread_client_count == 1
+
 
 @pytest.mark.asyncio
-async def test_handle_incoming_message_existing_conversation(session: Session):
+async def test_handle_incoming_message_existing_conversation(
+    session: Session,
+    async_session: AsyncSession,
+):
     MESSAGE["body"] = "Second message"
     MESSAGE["transformation_log"] = ["Second message"]
 
-    await handle_incoming_message(session=session, message=MESSAGE)
+    await handle_incoming_message(session=async_session, message=MESSAGE)
 
     updated_chat_session = session.exec(
         select(Chat_Session)
@@ -80,6 +92,7 @@ async def test_handle_incoming_message_existing_conversation(session: Session):
 
 async def test_handle_incoming_message_existing_conversation_with_image(
     session: Session,
+    async_session: AsyncSession,
 ):
     image_url = "https://akvo.org/wp-content/themes/Akvo-Theme"
     image_url += "/images/logos/akvologoblack.png"
@@ -93,7 +106,7 @@ async def test_handle_incoming_message_existing_conversation_with_image(
         {"url": image_url, "type": "image/png", "caption": "Image caption"},
     ]
 
-    await handle_incoming_message(session=session, message=MESSAGE)
+    await handle_incoming_message(session=async_session, message=MESSAGE)
 
     updated_chat_session = session.exec(
         select(Chat_Session)
@@ -115,3 +128,67 @@ async def test_handle_incoming_message_existing_conversation_with_image(
     assert len(chat_media) == 1
     assert chat_media[0].url == image_url
     assert chat_media[0].type == "image/png"
+
+
+@pytest.mark.asyncio
+async def test_handle_incoming_message_commits_once(
+    session: Session,
+    async_session: AsyncSession,
+):
+    message = {
+        **MESSAGE,
+        "conversation_envelope": {
+            **MESSAGE["conversation_envelope"],
+            "client_phone_number": "+6281222304051",
+        },
+        "body": "Hello",
+    }
+    with patch.object(
+        async_session, "commit", wraps=async_session.commit
+    ) as commit:
+        await handle_incoming_message(session=async_session, message=message)
+    # the client, chat session, chat, media and initial message
+    assert commit.call_count == 1
+
+    chat_session = session.exec(
+        select(Chat_Session)
+        .join(Client)
+        .where(Client.phone_number == "+6281222304051")
+    ).one()
+    chats = session.exec(
+        select(Chat)
+        .where(Chat.chat_session_id == chat_session.id)
+        .order_by(Chat.id)
+    ).all()
+    assert [chat.sender_role for chat in chats] == [
+        Sender_Role_Enum.CLIENT,
+        Sender_Role_Enum.SYSTEM,
+    ]
+    assert len(
+        session.exec(
+            select(Chat_Media).where(Chat_Media.chat_id == chats[0].id)
+        ).all()
+    ) == len(message["media"])
+
+
+@pytest.mark.asyncio
+async def test_handle_incoming_message_failure_leaves_no_rows(
+    session: Session,
+    async_session: AsyncSession,
+):
+    message = {
+        **MESSAGE,
+        "conversation_envelope": {
+            **MESSAGE["conversation_envelope"],
+            "client_phone_number": "+6281222304052",
+            "sender_role": "unknown",
+        },
+    }
+    with pytest.raises(KeyError):
+        await handle_incoming_message(session=async_session, message=message)
+    await async_session.rollback()
+
+    client = session.exec(
+        select(Client).where(Client.phone_number == "+6281222304052")
+    ).first()
+    assert client is None
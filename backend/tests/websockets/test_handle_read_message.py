@@ -1,16 +1,85 @@
+import pytest
+
+from datetime import datetime, timezone
+from sqlalchemy import func, update
 from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from core.socketio_config import handle_read_message, Chat, Chat_Status_Enum
+from db import upsert_chat_session_summary
+from models import Chat_Session, Chat_Session_Summary, Sender_Role_Enum
 
 
-def test_handle_read_message(session: Session):
+@pytest.mark.asyncio
+async def test_handle_read_message(
+    session: Session, async_session: AsyncSession
+):
     unread_message = session.exec(
         select(Chat).where(Chat.status == Chat_Status_Enum.UNREAD)
     ).first()
     assert unread_message is not None
 
-    res = handle_read_message(
-        session=session, chat_session_id=unread_message.chat_session_id
+    res = await handle_read_message(
+        session=async_session, chat_session_id=unread_message.chat_session_id
     )
 
     for r in res:
         assert r.status == Chat_Status_Enum.READ
+
+    summary = session.get(Chat_Session_Summary, unread_message.chat_session_id)
+    session.refresh(summary)
+    assert summary.unread_client_count == 0
+    assert summary.unread_assistant is False
+
+
+@pytest.mark.asyncio
+async def test_handle_read_message_keeps_chats_that_arrive_meanwhile(
+    session: Session, async_session: AsyncSession
+):
+    chat_session = session.exec(select(Chat_Session)).first()
+    chat = Chat(
+        chat_session_id=chat_session.id,
+        message="Are you there?",
+        sender_role=Sender_Role_Enum.CLIENT,
+        status=Chat_Status_Enum.UNREAD,
+        created_at=datetime.now(timezone.utc),
+    )
+    session.add(chat)
+    session.flush()
+    session.exec(upsert_chat_session_summary(chats=[chat]))
+    # a client message counted, but not yet committed, when reading
+    session.exec(
+        update(Chat_Session_Summary)
+        .where(Chat_Session_Summary.chat_session_id == chat_session.id)
+        .values(
+            unread_client_count=Chat_Session_Summary.unread_client_count + 1
+        )
+    )
+    session.commit()
+    unread_count = session.exec(
+        select(func.count(Chat.id)).where(
+            Chat.chat_session_id == chat_session.id,
+            Chat.status == Chat_Status_Enum.UNREAD,
+            Chat.sender_role == Sender_Role_Enum.CLIENT,
+        )
+    ).one()
+
+    res = await handle_read_message(
+        session=async_session, chat_session_id=chat_session.id
+    )
+    assert chat.id in [r.id for r in res]
+    assert (
+        len([r for r in res if r.sender_role == Sender_Role_Enum.CLIENT])
+        == unread_count
+    )
+
+    summary = session.get(Chat_Session_Summary, chat_session.id)
+    session.refresh(summary)
+    assert summary.unread_client_count == 1
+
+    # put the summary back for the other tests
+    session.exec(
+        update(Chat_Session_Summary)
+        .where(Chat_Session_Summary.chat_session_id == chat_session.id)
+        .values(unread_client_count=0)
+    )
+    session.commit()
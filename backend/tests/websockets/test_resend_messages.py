@@ -1,18 +1,31 @@
 import pytest
 
+from unittest.mock import AsyncMock, patch
+from sqlalchemy import event
 from sqlmodel import Session, select
-from core.socketio_config import resend_messages, Chat_Session, Chat
+from sqlmodel.ext.asyncio.session import AsyncSession
+from core.socketio_config import (
+    resend_messages,
+    sio_server,
+    Chat_Session,
+    Chat,
+)
 
 
 @pytest.mark.asyncio
-async def test_resend_messages_chat_session_exist(session: Session):
+async def test_resend_messages_chat_session_exist(
+    session: Session,
+    async_session: AsyncSession,
+):
     chat = session.exec(select(Chat)).first()
     chat_session = session.exec(
         select(Chat_Session).where(Chat_Session.id == chat.chat_session_id)
     ).first()
 
     res = await resend_messages(
-        session=session, user_id=chat_session.user_id, user_sid="userSid"
+        session=async_session,
+        user_id=chat_session.user_id,
+        user_sid="userSid",
     )
 
     assert res is not None
@@ -20,6 +33,64 @@ async def test_resend_messages_chat_session_exist(session: Session):
 
 
 @pytest.mark.asyncio
-async def test_resend_messages_chat_session_not_exist(session: Session):
-    res = await resend_messages(session=session, user_id=0, user_sid="userSid")
+async def test_resend_messages_chat_session_not_exist(
+    async_session: AsyncSession,
+):
+    res = await resend_messages(
+        session=async_session, user_id=0, user_sid="userSid"
+    )
+    assert res is None
+
+
+@pytest.mark.asyncio
+async def test_resend_messages_in_one_batch_after_high_water_mark(
+    session: Session,
+    async_session: AsyncSession,
+):
+    chat = session.exec(select(Chat)).first()
+    chat_session = session.exec(
+        select(Chat_Session).where(Chat_Session.id == chat.chat_session_id)
+    ).first()
+
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    engine = async_session.bind.sync_engine
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        with patch.object(sio_server, "emit", AsyncMock()) as emit:
+            res = await resend_messages(
+                session=async_session,
+                user_id=chat_session.user_id,
+                user_sid="userSid",
+            )
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+    # the chats, their chat sessions, clients and media in one query
+    assert len(statements) == 1
+    emit.assert_awaited_once()
+    event_name, batch = emit.await_args.args
+    assert event_name == "chats_batch"
+    assert emit.await_args.kwargs == {"to": "userSid"}
+    assert [
+        m["conversation_envelope"]["message_id"] for m in batch["messages"]
+    ] == [c.id for c in res]
+    assert batch["last_chat_id"] == max(c.id for c in res)
+    assert all(
+        m["conversation_envelope"]["client_phone_number"].startswith("+")
+        for m in batch["messages"]
+    )
+
+    # the tab acknowledged the batch, nothing is sent again
+    with patch.object(sio_server, "emit", AsyncMock()) as emit:
+        res = await resend_messages(
+            session=async_session,
+            user_id=chat_session.user_id,
+            user_sid="userSid",
+            last_chat_id=batch["last_chat_id"],
+        )
     assert res is None
+    emit.assert_not_awaited()
@@ -1,6 +1,7 @@
 import pytest
 
 from sqlmodel import Session, select, and_
+from sqlmodel.ext.asyncio.session import AsyncSession
 from core.socketio_config import (
     save_chat_history,
     Sender_Role_Enum,
@@ -17,6 +18,7 @@ from models import Chat_Media
 @pytest.mark.asyncio
 async def test_save_chat_history_when_send_a_message_into_platform(
     session: Session,
+    async_session: AsyncSession,
 ):
     chat = session.exec(select(Chat)).first()
     conversation = session.exec(
@@ -39,7 +41,7 @@ async def test_save_chat_history_when_send_a_message_into_platform(
     }
 
     result = await save_chat_history(
-        session=session,
+        session=async_session,
         conversation_envelope=conversation_envelope,
         message_body="Saved message",
     )
@@ -57,7 +59,10 @@ async def test_save_chat_history_when_send_a_message_into_platform(
 
 
 @pytest.mark.asyncio
-async def test_save_chat_history_with_image(session: Session):
+async def test_save_chat_history_with_image(
+    session: Session,
+    async_session: AsyncSession,
+):
     chat = session.exec(select(Chat)).first()
     conversation = session.exec(
         select(Chat_Session).where(Chat_Session.id == chat.chat_session_id)
@@ -87,7 +92,7 @@ async def test_save_chat_history_with_image(session: Session):
     ]
 
     result = await save_chat_history(
-        session=session,
+        session=async_session,
         conversation_envelope=conversation_envelope,
         message_body="Saved message with image",
         media=media,
@@ -113,6 +118,7 @@ async def test_save_chat_history_with_image(session: Session):
 @pytest.mark.asyncio
 async def test_save_chat_history_for_a_conversation_without_chat_before(
     session: Session,
+    async_session: AsyncSession,
 ):
     chats = session.exec(select(Chat)).all()
     conversation_ids = [c.chat_session_id for c in chats]
@@ -139,7 +145,7 @@ async def test_save_chat_history_for_a_conversation_without_chat_before(
     }
 
     result = await save_chat_history(
-        session=session,
+        session=async_session,
         conversation_envelope=conversation_envelope,
         message_body="First message",
     )
@@ -1,3 +1,4 @@
+import json
 import asyncio
 import pytest
 import socketio
@@ -8,6 +9,11 @@ from core.socketio_config import (
     User,
     Client,
     Chat_Session,
+    sio_server,
+    user_room,
+    get_client_manager,
+    chats_ack,
+    assistant_to_user,
 )
 from socketio.exceptions import ConnectionRefusedError
 from fastapi import HTTPException
@@ -23,16 +29,18 @@ async def test_socketio_connection(session: Session):
         logger=True,
     )
 
-    with patch.object(
-        sio_client, "connect", new=AsyncMock()
-    ) as mock_connect, patch.object(
-        sio_client, "disconnect", new=AsyncMock()
-    ) as mock_disconnect:
+    with (
+        patch.object(sio_client, "connect", new=AsyncMock()) as mock_connect,
+        patch.object(
+            sio_client, "disconnect", new=AsyncMock()
+        ) as mock_disconnect,
+    ):
         # Mock token verification to raise HTTPException for invalid token
-        with patch(
-            "core.socketio_config.verify_jwt_token"
-        ) as mock_verify_jwt_token, patch(
-            "core.socketio_config.cookie", SimpleCookie()
+        with (
+            patch(
+                "core.socketio_config.verify_jwt_token"
+            ) as mock_verify_jwt_token,
+            patch("core.socketio_config.cookie", SimpleCookie()),
         ):  # Mock the cookie behavior
 
             # Mock loading of cookies and extraction of auth_token
@@ -128,13 +136,13 @@ async def test_chats_event_handler(session: Session):
     def on_message_received(data):
         future.set_result(data)
 
-    with patch.object(
-        sio_client, "connect", new=AsyncMock()
-    ) as mock_connect, patch.object(
-        sio_client, "emit", new=AsyncMock()
-    ) as mock_emit, patch.object(
-        sio_client, "disconnect", new=AsyncMock()
-    ) as mock_disconnect:
+    with (
+        patch.object(sio_client, "connect", new=AsyncMock()) as mock_connect,
+        patch.object(sio_client, "emit", new=AsyncMock()) as mock_emit,
+        patch.object(
+            sio_client, "disconnect", new=AsyncMock()
+        ) as mock_disconnect,
+    ):
 
         async def mock_emit_side_effect(event, data, *args, **kwargs):
             if event == "chats":
@@ -167,3 +175,65 @@ async def test_chats_event_handler(session: Session):
         mock_disconnect.assert_called_once()
 
         assert future.result() == message
+
+
+@pytest.mark.asyncio
+async def test_chats_ack():
+    assert await chats_ack("sid", {"last_chat_id": 12}) == {
+        "success": True,
+        "last_chat_id": 12,
+    }
+    for ack in (None, {}, {"last_chat_id": "12"}, 12):
+        assert (await chats_ack("sid", ack))["success"] is False
+
+
+@pytest.mark.asyncio
+async def test_assistant_to_user_emits_to_the_room_without_callback():
+    message = {
+        "conversation_envelope": {"client_phone_number": "+6281234567890"},
+        "body": "Whisper",
+    }
+    with (
+        patch(
+            "core.socketio_config.handle_incoming_message",
+            new=AsyncMock(return_value=(904, "+62123", 1, 2, "UNREAD", "")),
+        ),
+        patch.object(sio_server, "emit", new=AsyncMock()) as emit,
+    ):
+        await assistant_to_user(body=json.dumps(message))
+
+    emit.assert_awaited_once()
+    assert emit.await_args.args[0] == "whisper"
+    # callbacks can't be requested from a room, the client sends chats_ack
+    assert emit.await_args.kwargs == {"to": user_room(904)}
+
+
+def test_get_client_manager():
+    assert type(get_client_manager("memory")) is socketio.AsyncManager
+    assert isinstance(
+        get_client_manager("rabbitmq"), socketio.AsyncAioPikaManager
+    )
+    with pytest.raises(ValueError):
+        get_client_manager("redis")
+
+
+@pytest.mark.asyncio
+async def test_user_room_reaches_every_tab():
+    manager = sio_server.manager
+    sids = [
+        await manager.connect(eio_sid, "/")
+        for eio_sid in ("eio-tab-1", "eio-tab-2", "eio-other-user")
+    ]
+    await sio_server.enter_room(sids[0], user_room(902))
+    await sio_server.enter_room(sids[1], user_room(902))
+    await sio_server.enter_room(sids[2], user_room(903))
+
+    # emits to the user's room are sent to these participants
+    participants = manager.get_participants("/", user_room(902))
+    assert {eio_sid for _, eio_sid in participants} == {
+        "eio-tab-1",
+        "eio-tab-2",
+    }
+
+    for sid in sids:
+        await manager.disconnect(sid, "/")
@@ -0,0 +1,30 @@
+import json
+import pytest
+
+from unittest.mock import patch, AsyncMock
+from core.socketio_config import whatsapp_to_user, twilio_client
+
+
+@pytest.mark.asyncio
+async def test_whatsapp_to_user_processes_the_queued_message():
+    values = {
+        "MessageSid": "test_sid",
+        "From": "whatsapp:+6281234567890",
+        "Body": "Test message",
+        "NumMedia": 0,
+        "MessageType": "text",
+    }
+    with (
+        patch.object(
+            twilio_client,
+            "format_to_queue_message",
+            return_value="formatted_message",
+        ) as format_to_queue_message,
+        patch(
+            "core.socketio_config.client_to_user", new_callable=AsyncMock
+        ) as client_to_user,
+    ):
+        await whatsapp_to_user(body=json.dumps(values))
+
+    format_to_queue_message.assert_called_once_with(values)
+    client_to_user.assert_awaited_once_with(body="formatted_message")
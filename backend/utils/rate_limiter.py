@@ -0,0 +1,34 @@
+import time
+import asyncio
+
+
+class TokenBucket:
+    """
+    Asynchronous token bucket. Tokens are refilled continuously at `rate`
+    per second up to `capacity`; `acquire` waits until a token is
+    available, so callers never exceed the configured throughput.
+    """
+
+    def __init__(self, rate: float, capacity: int = None):
+        if rate <= 0:
+            raise ValueError("rate must be greater than 0")
+        self.rate = rate
+        self.capacity = capacity or max(1, int(rate))
+        self.tokens = float(self.capacity)
+        self.updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self.updated_at
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+        self.updated_at = now
+
+    async def acquire(self):
+        # the lock keeps waiters in FIFO order
+        async with self._lock:
+            self._refill()
+            while self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= 1
@@ -1,86 +1,286 @@
 import os
+import asyncio
+import shutil
+from abc import ABC, abstractmethod
+from functools import lru_cache
 from pathlib import Path
+from typing import Iterable
 from google.cloud import storage
-import shutil
 
 BUCKET_NAME = os.environ["BUCKET_NAME"]
 STORAGE_LOCATION = os.environ.get("STORAGE_LOCATION")
+TESTING_STORAGE_LOCATION = "./tmp/fake-storage"
+# resumable uploads are sent in chunks of a multiple of 256 KB
+RESUMABLE_UPLOAD_CHUNK_SIZE = 4 * 256 * 1024
+# the maximum number of calls in a Cloud Storage batch request
+GCS_BATCH_SIZE = 100
 
 
-def upload(file: str, folder: str, filename: str = None, public: bool = False):
-    """Uploads a file to Google Cloud Storage or local storage."""
-    if not filename:
-        filename = os.path.basename(file)
+@lru_cache(maxsize=1)
+def get_storage_client() -> storage.Client:
+    """
+    One client per process, creating one authenticates and opens a new
+    HTTP session.
+    """
+    return storage.Client()
 
-    TESTING = os.environ.get("TESTING")
-    if TESTING:
-        fake_location = f"./tmp/fake-storage/{filename}"
-        shutil.copy2(file, fake_location)
-        return fake_location
 
-    if STORAGE_LOCATION:
-        location = f"{STORAGE_LOCATION}/{filename}"
+class StorageBackend(ABC):
+    """
+    Where media files are stored. The methods block, the `a` prefixed
+    ones run them in a worker thread for the event loop.
+    """
+
+    @abstractmethod
+    def upload(
+        self,
+        file: str,
+        folder: str,
+        filename: str = None,
+        public: bool = False,
+    ) -> str: ...
+
+    @abstractmethod
+    def upload_stream(
+        self,
+        chunks: Iterable[bytes],
+        folder: str,
+        filename: str,
+        content_type: str = None,
+        public: bool = False,
+    ) -> str: ...
+
+    @abstractmethod
+    def delete_many(self, urls: list[str]) -> list[str]: ...
+
+    @abstractmethod
+    def check(self, url: str) -> bool: ...
+
+    @abstractmethod
+    def download(self, url: str) -> str:
+        """Returns the path of a local copy of the file."""
+
+    def delete(self, url: str) -> str:
+        return self.delete_many([url])[0]
+
+    async def aupload(self, *args, **kwargs) -> str:
+        return await asyncio.to_thread(self.upload, *args, **kwargs)
+
+    async def aupload_stream(self, *args, **kwargs) -> str:
+        return await asyncio.to_thread(self.upload_stream, *args, **kwargs)
+
+    async def adelete(self, url: str) -> str:
+        return await asyncio.to_thread(self.delete, url)
+
+    async def adelete_many(self, urls: list[str]) -> list[str]:
+        return await asyncio.to_thread(self.delete_many, urls)
+
+    async def acheck(self, url: str) -> bool:
+        return await asyncio.to_thread(self.check, url)
+
+    async def adownload(self, url: str) -> str:
+        return await asyncio.to_thread(self.download, url)
+
+
+class GCSStorage(StorageBackend):
+    def __init__(self, bucket_name: str = BUCKET_NAME):
+        self.bucket_name = bucket_name
+
+    @property
+    def client(self) -> storage.Client:
+        return get_storage_client()
+
+    @property
+    def bucket(self) -> storage.Bucket:
+        return self.client.bucket(self.bucket_name)
+
+    def get_blob_url(self, blob: storage.Blob, public: bool) -> str:
+        if public:
+            blob.make_public()
+            return blob.public_url
+        return blob.name
+
+    def upload(self, file, folder, filename=None, public=False):
+        filename = filename or os.path.basename(file)
+        blob = self.bucket.blob(f"{folder}/{filename}")
+        blob.upload_from_filename(file)
+        os.remove(file)
+        return self.get_blob_url(blob=blob, public=public)
+
+    def upload_stream(
+        self, chunks, folder, filename, content_type=None, public=False
+    ):
+        # a resumable upload, only one chunk is held in memory
+        blob = self.bucket.blob(f"{folder}/{filename}")
+        with blob.open(
+            "wb",
+            chunk_size=RESUMABLE_UPLOAD_CHUNK_SIZE,
+            content_type=content_type,
+        ) as f:
+            for chunk in chunks:
+                f.write(chunk)
+        return self.get_blob_url(blob=blob, public=public)
+
+    def delete_many(self, urls):
+        bucket = self.bucket
+        names = []
+        for url in urls:
+            folder = os.path.dirname(url).split("/")[-1]
+            names.append(f"{folder}/{os.path.basename(url)}")
+        for start in range(0, len(names), GCS_BATCH_SIZE):
+            end = start + GCS_BATCH_SIZE
+            # one HTTP request for the whole batch
+            with self.client.batch():
+                for name in names[start:end]:
+                    bucket.blob(name).delete()
+        return names
+
+    def check(self, url):
+        return storage.Blob(name=url, bucket=self.bucket).exists(self.client)
+
+    def download(self, url):
+        tmp_file = f"./tmp/{os.path.basename(url)}"
+        self.bucket.blob(url).download_to_filename(tmp_file)
+        return tmp_file
+
+
+class LocalStorage(StorageBackend):
+    """Files in a local directory, without folders."""
+
+    def __init__(self, location: str):
+        self.location = location
+
+    def get_path(self, filename: str) -> str:
+        return f"{self.location}/{filename}"
+
+    def upload(self, file, folder, filename=None, public=False):
+        location = self.get_path(filename or os.path.basename(file))
         shutil.copy2(file, location)
         return location
 
-    storage_client = storage.Client()
-    bucket = storage_client.bucket(BUCKET_NAME)
-    destination_blob_name = f"{folder}/{filename}"
-    blob = bucket.blob(destination_blob_name)
-    blob.upload_from_filename(file)
-    os.remove(file)
+    def upload_stream(
+        self, chunks, folder, filename, content_type=None, public=False
+    ):
+        location = self.get_path(filename)
+        with open(location, "wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
+        return location
+
+    def delete_many(self, urls):
+        for url in urls:
+            os.remove(url)
+        return urls
+
+    def check(self, url):
+        return Path(url).is_file()
+
+    def download(self, url):
+        return self.get_path(os.path.basename(url))
+
+
+class MemoryStorage(StorageBackend):
+    """Files in a dict, for tests."""
+
+    def __init__(self):
+        self.files: dict[str, bytes] = {}
+
+    def upload(self, file, folder, filename=None, public=False):
+        with open(file, "rb") as f:
+            content = f.read()
+        return self.upload_stream(
+            chunks=[content],
+            folder=folder,
+            filename=filename or os.path.basename(file),
+        )
+
+    def upload_stream(
+        self, chunks, folder, filename, content_type=None, public=False
+    ):
+        url = f"memory://{folder}/{filename}"
+        self.files[url] = b"".join(chunks)
+        return url
+
+    def delete_many(self, urls):
+        for url in urls:
+            del self.files[url]
+        return urls
+
+    def check(self, url):
+        return url in self.files
+
+    def download(self, url):
+        tmp_file = f"./tmp/{os.path.basename(url)}"
+        with open(tmp_file, "wb") as f:
+            f.write(self.files[url])
+        return tmp_file
+
 
-    if public:
-        blob.make_public()
-        return blob.public_url
+@lru_cache(maxsize=None)
+def get_local_storage(location: str) -> LocalStorage:
+    return LocalStorage(location=location)
 
-    return blob.name
+
+@lru_cache(maxsize=1)
+def get_gcs_storage() -> GCSStorage:
+    return GCSStorage()
+
+
+def get_storage_backend() -> StorageBackend:
+    """
+    The process-wide storage backend: a local directory when testing or
+    with STORAGE_LOCATION, Google Cloud Storage otherwise.
+    """
+    if os.environ.get("TESTING"):
+        return get_local_storage(TESTING_STORAGE_LOCATION)
+    if STORAGE_LOCATION:
+        return get_local_storage(STORAGE_LOCATION)
+    return get_gcs_storage()
+
+
+def upload(file: str, folder: str, filename: str = None, public: bool = False):
+    """Uploads a file to Google Cloud Storage or local storage."""
+    return get_storage_backend().upload(
+        file=file, folder=folder, filename=filename, public=public
+    )
+
+
+def upload_stream(
+    chunks: Iterable[bytes],
+    folder: str,
+    filename: str,
+    content_type: str = None,
+    public: bool = False,
+):
+    """
+    Uploads a file from a stream of chunks, without a local copy. Google
+    Cloud Storage gets a resumable upload, which only holds one chunk in
+    memory at a time.
+    """
+    return get_storage_backend().upload_stream(
+        chunks=chunks,
+        folder=folder,
+        filename=filename,
+        content_type=content_type,
+        public=public,
+    )
 
 
 def delete(url: str):
     """Deletes a file from Google Cloud Storage or local storage."""
-    file = os.path.basename(url)
-    folder = os.path.dirname(url).split("/")[-1]
+    return get_storage_backend().delete(url)
 
-    TESTING = os.environ.get("TESTING")
-    if TESTING or STORAGE_LOCATION:
-        os.remove(url)
-        return url
 
-    storage_client = storage.Client()
-    bucket = storage_client.bucket(BUCKET_NAME)
-    blob = bucket.blob(f"{folder}/{file}")
-    blob.delete()
-    return blob.name
+def delete_many(urls: list[str]):
+    """Deletes files from Google Cloud Storage or local storage."""
+    return get_storage_backend().delete_many(urls)
 
 
 def check(url: str):
     """Checks if a file exists in Google Cloud Storage or local storage."""
-    TESTING = os.environ.get("TESTING")
-    if TESTING or STORAGE_LOCATION:
-        return Path(url).is_file()
-
-    storage_client = storage.Client()
-    bucket = storage_client.bucket(BUCKET_NAME)
-    return storage.Blob(name=url, bucket=bucket).exists(storage_client)
+    return get_storage_backend().check(url)
 
 
 def download(url: str):
     """Downloads a file from Google Cloud Storage or local storage."""
-    TESTING = os.environ.get("TESTING")
-    if TESTING:
-        tmp_file = os.path.basename(url)
-        tmp_file = f"./tmp/{tmp_file}"
-        return tmp_file
-
-    if STORAGE_LOCATION:
-        original_filename = os.path.basename(url)
-        return f"{STORAGE_LOCATION}/{original_filename}"
-
-    storage_client = storage.Client()
-    bucket = storage_client.bucket(BUCKET_NAME)
-    blob = bucket.blob(url)
-    tmp_file = os.path.basename(url)
-    tmp_file = f"./tmp/{tmp_file}"
-    blob.download_to_filename(tmp_file)
-    return tmp_file
+    return get_storage_backend().download(url)
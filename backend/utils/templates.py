@@ -0,0 +1,177 @@
+import os
+import re
+import json
+import signal
+import asyncio
+import logging
+
+from typing import Optional
+
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+TEMPLATE_FILE_PATH = "./sources/twilio_message_template.json"
+TEMPLATE_RELOAD_INTERVAL = int(os.getenv("TEMPLATE_RELOAD_INTERVAL", 60))
+TEMPLATE_LANGUAGES = ("en", "sw", "fr")
+# template purpose -> prefix of the template ID environment variables,
+# one per language, e.g. INTRO_TEMPLATE_ID_en
+TEMPLATE_ID_PREFIXES = {
+    "verification": "VERIFICATION_TEMPLATE_ID",
+    "broadcast": "BROADCAST_TEMPLATE_ID",
+    "intro": "INTRO_TEMPLATE_ID",
+    "conversation_reconnect": "CONVERSATION_RECONNECT_TEMPLATE",
+}
+PLACEHOLDER = re.compile(r"\{\{(\d+)\}\}")
+
+
+def get_template_ids() -> dict[tuple[str, str], str]:
+    """The configured template IDs by (purpose, language)."""
+    template_ids = {}
+    for purpose, prefix in TEMPLATE_ID_PREFIXES.items():
+        for lang in TEMPLATE_LANGUAGES:
+            content_sid = os.getenv(f"{prefix}_{lang}")
+            if content_sid:
+                template_ids[(purpose, lang)] = content_sid
+    return template_ids
+
+
+class MessageTemplate:
+    """
+    A Twilio message template, its content is split on the `{{n}}`
+    placeholders once so rendering only joins the parts.
+    """
+
+    def __init__(
+        self, content_sid: Optional[str] = None, content: Optional[str] = None
+    ):
+        self.content_sid = content_sid
+        self.content = content
+        # literal text at even indexes, placeholder numbers at odd ones
+        self.parts = PLACEHOLDER.split(content) if content else []
+
+    def render(self, *values: str) -> Optional[str]:
+        """
+        Fills `{{1}}`, `{{2}}`, ... with the values in order, None when the
+        content isn't known.
+        """
+        if not self.content:
+            return None
+        parts = self.parts[:]
+        for i in range(1, len(parts), 2):
+            index = int(parts[i]) - 1
+            # placeholders without a value are left as they are
+            parts[i] = (
+                values[index]
+                if 0 <= index < len(values)
+                else f"{{{{{parts[i]}}}}}"
+            )
+        return "".join(parts)
+
+
+class TemplateRegistry:
+    """
+    The Twilio message templates by (purpose, language), loaded from the
+    JSON file of `command.get_twilio_message_template` and the template
+    ID environment variables. Lookups are dict lookups, the file is read
+    again when it changes or on SIGHUP. Each backend worker has its own
+    registry.
+    """
+
+    def __init__(self, path: str = TEMPLATE_FILE_PATH):
+        self.path = path
+        self.mtime: Optional[float] = None
+        self.loaded = False
+        self.contents: dict[str, Optional[str]] = {}
+        self.templates: dict[tuple[str, str], MessageTemplate] = {}
+        self._watcher: Optional[asyncio.Task] = None
+
+    def get_mtime(self) -> Optional[float]:
+        try:
+            return os.stat(self.path).st_mtime
+        except FileNotFoundError:
+            return None
+
+    def load(self):
+        mtime = self.get_mtime()
+        contents = {}
+        if mtime is not None:
+            try:
+                with open(self.path, "r") as json_file:
+                    contents = json.load(json_file)
+            except (OSError, ValueError) as e:
+                # keep the templates we have, a half written file is
+                # picked up on the next change
+                logger.error(f"Error loading message templates: {e}")
+                return
+        templates = {
+            key: MessageTemplate(
+                content_sid=content_sid, content=contents.get(content_sid)
+            )
+            for key, content_sid in get_template_ids().items()
+        }
+        # swapped as a whole, a lookup never sees a partial registry
+        self.contents, self.templates = contents, templates
+        self.mtime = mtime
+        self.loaded = True
+        logger.info(f"Loaded {len(contents)} message templates")
+
+    def reload_if_changed(self) -> bool:
+        mtime = self.get_mtime()
+        if self.loaded and mtime == self.mtime:
+            return False
+        self.load()
+        return True
+
+    def get(self, purpose: str, lang: str) -> MessageTemplate:
+        """
+        The template of a purpose in a language, without a content_sid
+        when no template ID is configured.
+        """
+        if not self.loaded:
+            self.load()
+        return self.templates.get((purpose, lang)) or MessageTemplate()
+
+    def get_content(self, content_sid: str) -> Optional[str]:
+        if not self.loaded:
+            self.load()
+        return self.contents.get(content_sid)
+
+    async def watch(self, interval: int = TEMPLATE_RELOAD_INTERVAL):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(self.reload_if_changed)
+            except Exception as e:
+                logger.error(f"Error reloading message templates: {e}")
+
+    def start(self, interval: int = TEMPLATE_RELOAD_INTERVAL):
+        """
+        Loads the templates, and reloads them on SIGHUP and every
+        `interval` seconds if the file changed (0 to only load once).
+        """
+        self.load()
+        loop = asyncio.get_running_loop()
+        try:
+            loop.add_signal_handler(signal.SIGHUP, self.load)
+        except (NotImplementedError, RuntimeError, ValueError):
+            # not on the main thread or not supported on this platform
+            pass
+        if interval > 0 and self._watcher is None:
+            self._watcher = asyncio.create_task(self.watch(interval))
+
+    async def stop(self):
+        try:
+            asyncio.get_running_loop().remove_signal_handler(signal.SIGHUP)
+        except (NotImplementedError, RuntimeError, ValueError):
+            pass
+        if self._watcher is not None:
+            self._watcher.cancel()
+            try:
+                await self._watcher
+            except asyncio.CancelledError:
+                pass
+            self._watcher = None
+
+
+template_registry = TemplateRegistry()
@@ -0,0 +1,208 @@
+import os
+import io
+import json
+import wave
+import hashlib
+import logging
+import threading
+import multiprocessing
+import speech_recognition as sr
+
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+from pydub import AudioSegment
+
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+TRANSCRIPTION_ENGINE = os.getenv("TRANSCRIPTION_ENGINE", "google")
+TRANSCRIPTION_WORKERS = int(os.getenv("TRANSCRIPTION_WORKERS", 2))
+TRANSCRIPTION_CACHE_SIZE = int(os.getenv("TRANSCRIPTION_CACHE_SIZE", 1000))
+VOSK_MODEL_PATH = os.getenv("VOSK_MODEL_PATH")
+# what the engines expect: 16 kHz, mono, 16 bit PCM
+SAMPLE_RATE = 16000
+
+
+def decode_audio(audio: bytes, format: str = "ogg") -> bytes:
+    """
+    Decodes a voice note to WAV in memory, ffmpeg reads it from stdin and
+    writes to stdout.
+    """
+    segment = AudioSegment.from_file(io.BytesIO(audio), format=format)
+    segment = (
+        segment.set_channels(1).set_sample_width(2).set_frame_rate(SAMPLE_RATE)
+    )
+    wav = io.BytesIO()
+    segment.export(wav, format="wav")
+    return wav.getvalue()
+
+
+class TranscriptionEngine(ABC):
+    """Turns WAV audio into text, None when nothing was recognized."""
+
+    @abstractmethod
+    def transcribe(self, wav: bytes) -> Optional[str]: ...
+
+
+class GoogleEngine(TranscriptionEngine):
+    """The Google Web Speech API."""
+
+    def __init__(self):
+        self.recognizer = sr.Recognizer()
+
+    def transcribe(self, wav):
+        with sr.AudioFile(io.BytesIO(wav)) as source:
+            audio_data = self.recognizer.record(source)
+        try:
+            return self.recognizer.recognize_google(audio_data)
+        except sr.UnknownValueError:
+            logger.error(
+                "Google Speech Recognition could not understand audio"
+            )
+            return None
+
+
+class VoskEngine(TranscriptionEngine):
+    """
+    Offline speech recognition on the CPU, for local development. Needs
+    `pip install vosk`, and a model in VOSK_MODEL_PATH or one is
+    downloaded.
+    """
+
+    def __init__(self):
+        from vosk import Model, KaldiRecognizer
+
+        self.recognizer_class = KaldiRecognizer
+        self.model = (
+            Model(model_path=VOSK_MODEL_PATH)
+            if VOSK_MODEL_PATH
+            else Model(lang="en-us")
+        )
+
+    def transcribe(self, wav):
+        with wave.open(io.BytesIO(wav)) as audio:
+            recognizer = self.recognizer_class(
+                self.model, audio.getframerate()
+            )
+            while data := audio.readframes(4000):
+                recognizer.AcceptWaveform(data)
+        text = json.loads(recognizer.FinalResult()).get("text")
+        return text or None
+
+
+ENGINES = {
+    "google": GoogleEngine,
+    "vosk": VoskEngine,
+}
+
+# the engines of this process, models are loaded once per worker
+_engines: dict[str, TranscriptionEngine] = {}
+
+
+def get_engine(name: str) -> TranscriptionEngine:
+    if name not in _engines:
+        _engines[name] = ENGINES[name]()
+    return _engines[name]
+
+
+def transcribe_audio(
+    audio: bytes, format: str = "ogg", engine: str = TRANSCRIPTION_ENGINE
+) -> Optional[str]:
+    """Decodes and transcribes a voice note, in a worker process."""
+    return get_engine(engine).transcribe(decode_audio(audio, format=format))
+
+
+class Transcriber:
+    """
+    Transcribes voice notes in a pool of `workers` processes, or in the
+    calling thread with 0 workers. Transcriptions are cached by the hash
+    of the audio, so a forwarded voice note is only transcribed once.
+    """
+
+    def __init__(
+        self,
+        engine: str = TRANSCRIPTION_ENGINE,
+        workers: int = TRANSCRIPTION_WORKERS,
+        cache_size: int = TRANSCRIPTION_CACHE_SIZE,
+    ):
+        self.engine = engine
+        self.workers = workers
+        self.cache_size = cache_size
+        self.cache: OrderedDict[str, Optional[str]] = OrderedDict()
+        self.lock = threading.Lock()
+        self.pool: Optional[ProcessPoolExecutor] = None
+
+    def get_pool(self) -> ProcessPoolExecutor:
+        with self.lock:
+            if self.pool is None:
+                # forking the threaded event loop process could leave a
+                # lock held in the child, spawned workers start clean and
+                # load the engine once, not in the API process
+                self.pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=get_engine,
+                    initargs=(self.engine,),
+                )
+            return self.pool
+
+    def shutdown(self):
+        with self.lock:
+            if self.pool is not None:
+                self.pool.shutdown(cancel_futures=True)
+                self.pool = None
+
+    def get_cached(self, key: str) -> tuple[bool, Optional[str]]:
+        with self.lock:
+            if key not in self.cache:
+                return False, None
+            self.cache.move_to_end(key)
+            return True, self.cache[key]
+
+    def set_cached(self, key: str, text: Optional[str]):
+        if self.cache_size <= 0:
+            return
+        with self.lock:
+            self.cache[key] = text
+            self.cache.move_to_end(key)
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+
+    def transcribe(self, audio: bytes, format: str = "ogg") -> Optional[str]:
+        """
+        Blocks until the voice note is transcribed, call it from a worker
+        thread. Returns None when it couldn't be transcribed.
+        """
+        key = hashlib.sha256(audio).hexdigest()
+        cached, text = self.get_cached(key)
+        if cached:
+            return text
+        try:
+            if self.workers > 0:
+                text = (
+                    self.get_pool()
+                    .submit(
+                        transcribe_audio,
+                        audio,
+                        format=format,
+                        engine=self.engine,
+                    )
+                    .result()
+                )
+            else:
+                text = transcribe_audio(
+                    audio, format=format, engine=self.engine
+                )
+        except Exception as e:
+            # e.g. the engine is unreachable, try again next time
+            logger.error(f"Error transcribing audio: {e}")
+            return None
+        logger.info(f"Audio transcription: {text}")
+        self.set_cached(key, text)
+        return text
+
+
+transcriber = Transcriber()
@@ -1,10 +1,11 @@
 import re
 import phonenumbers
 import json
+import base64
+import binascii
 
 from pydantic_extra_types.phone_numbers import PhoneNumber
-from pathlib import Path
-from typing import Optional
+from datetime import datetime
 
 
 def sanitize_phone_number(phone_number: PhoneNumber):
@@ -39,65 +40,97 @@ def generate_message_template_lang_by_phone_number(phone_number: PhoneNumber):
     return message_template_lang
 
 
-def get_template_content_from_json(
-    content_sid: str, testing_file_path: Optional[str] = None
-):
-    JSON_FILE_PATH = "./sources/twilio_message_template.json"
-    if testing_file_path:
-        JSON_FILE_PATH = testing_file_path
-    file_path = Path(JSON_FILE_PATH)
-    if file_path.exists():
-        with file_path.open("r") as json_file:
-            content_data = json.load(json_file)
-            return content_data.get(content_sid)
-    else:
-        return False
-
-
 class TextConverter:
+    """
+    Renders the markdown of assistant answers and officer messages for a
+    chat platform, in a single pass over the text. Code is left as is,
+    single `*` and `_` are already WhatsApp and Slack emphasis.
+    """
+
+    PATTERN = re.compile(
+        r"""
+        # skip the characters that can't start any markdown quickly
+        (?=[`\#\-+*\[_~]|^[ \t])
+        (?:
+            (?P<fence>```(?s:.*?)```)
+            | (?P<code>`[^`\n]+`)
+            | ^(?P<level>\#{1,6})[ \t]+(?P<header>[^\n]+)
+            | ^(?P<list_item>[ \t]*)[-+*][ \t]+
+            # one level of balanced parentheses in the URL
+            | \[(?P<text>[^\]\n]+)\]
+              \((?P<link>https?://(?:[^\s()]|\([^\s()]*\))+)\)
+            | \*\*(?P<bold>[^\n]+?)\*\*
+            # not inside words, paths or names like obj.__init__()
+            | (?<![\w./])__(?!\s)(?P<underscore_bold>[^\n]+?)
+              (?<!\s)__(?![\w(/])
+            | ~~(?P<strike>[^\n]+?)~~
+        )
+        """,
+        re.MULTILINE | re.VERBOSE,
+    )
+
     def __init__(self, text: str):
         self.text = text
 
     def format_whatsapp(self) -> str:
-        content = self.text
-        content = self._convert_bold_to_whatsapp(content)
-        content = self._convert_headers_to_uppercase_bold(content)
-        content = self._convert_italics_to_whatsapp(content)
-        content = self._convert_links_to_plaintext(content)
-        return content
+        return self.PATTERN.sub(self._render_whatsapp, self.text)
 
     def format_slack(self) -> str:
-        """Format text for Slack (future implementation)."""
-        # Placeholder for future Slack-specific formatting
-        pass
-
-    def _convert_headers_to_uppercase_bold(self, content: str) -> str:
-        content = re.sub(
-            r"#### (.+)", lambda m: f"*{m.group(1).upper()}*", content
-        )
-        content = re.sub(
-            r"### (.+)", lambda m: f"*{m.group(1).upper()}*", content
-        )
-        content = re.sub(
-            r"## (.+)", lambda m: f"*{m.group(1).upper()}*", content
-        )
-        content = re.sub(
-            r"# (.+)",
-            lambda m: f"*{m.group(1).upper()}*\n",
-            content,
-        )
-        return content
-
-    def _convert_italics_to_whatsapp(self, content: str) -> str:
-        return re.sub(r"_(.+?)_", r"_\1_", content)
-
-    def _convert_bold_to_whatsapp(self, content: str) -> str:
-        # Convert bold formatting
-        content = re.sub(r"\*\*(.+?)\*\*", r"*\1*", content)
-        # Replace standalone hyphens with asterisks
-        # ignoring hyphens within URLs or between words
-        content = re.sub(r"(?<!\w)-{1}(?!\w)", "*", content)
-        return content
-
-    def _convert_links_to_plaintext(self, content: str) -> str:
-        return re.sub(r"\[(.+?)\]\((https?://[^\s]+)\)", r"\1 (\2)", content)
+        """Format text for Slack mrkdwn."""
+        return self.PATTERN.sub(self._render_slack, self.text)
+
+    def _render_whatsapp(self, match: re.Match) -> str:
+        group = match.lastgroup
+        if group == "header":
+            header = self.PATTERN.sub(self._render_whatsapp, match["header"])
+            header = f"*{header.replace('*', '').upper()}*"
+            # top level headers are followed by an empty line
+            return f"{header}\n" if len(match["level"]) == 1 else header
+        if group == "list_item":
+            return f"{match['list_item']}* "
+        if group == "link":
+            return f"{match['text']} ({match['link']})"
+        return self._render_inline(match, self._render_whatsapp)
+
+    def _render_slack(self, match: re.Match) -> str:
+        group = match.lastgroup
+        if group == "header":
+            header = self.PATTERN.sub(self._render_slack, match["header"])
+            return f"*{header.replace('*', '')}*"
+        if group == "list_item":
+            return f"{match['list_item']}• "
+        if group == "link":
+            return f"<{match['link']}|{match['text']}>"
+        return self._render_inline(match, self._render_slack)
+
+    def _render_inline(self, match: re.Match, render) -> str:
+        """The formatting that WhatsApp and Slack have in common."""
+        group = match.lastgroup
+        if group in ("bold", "underscore_bold"):
+            return f"*{self.PATTERN.sub(render, match[group])}*"
+        if group == "strike":
+            return f"~{self.PATTERN.sub(render, match[group])}~"
+        # code
+        return match[0]
+
+
+def encode_cursor(*values) -> str:
+    """
+    Opaque pagination cursor of the sort key of the last row of a page
+    """
+    values = [v.isoformat() if isinstance(v, datetime) else v for v in values]
+    data = json.dumps(values, separators=(",", ":"))
+    return base64.urlsafe_b64encode(data.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> list:
+    """
+    Values of a cursor from encode_cursor, raises ValueError if invalid
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (binascii.Error, UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+    if not isinstance(values, list):
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return values
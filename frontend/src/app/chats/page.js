@@ -9,7 +9,7 @@ import {
   ChatNotification,
   PushNotifications,
 } from "@/components";
-import { socket, dbLib } from "@/lib";
+import { socket, dbLib, setLastChatId } from "@/lib";
 import { PhotoIcon } from "@/utils/icons";
 
 const SHOW_IN_APP_NOTIFICATION = false;
@@ -105,8 +105,17 @@ const Chats = () => {
 
   // Handle socket events
   useEffect(() => {
-    const handleChats = (value, callback) => {
+    // room emits can't request a callback, the handled messages are
+    // acknowledged with a chats_ack event instead
+    const ackChats = (lastChatId) => {
+      if (lastChatId) {
+        socket.emit("chats_ack", { last_chat_id: lastChatId });
+      }
+    };
+
+    const addChat = (value) => {
       if (value) {
+        setLastChatId(value.conversation_envelope.message_id);
         const isMediaMessage = value?.media?.length > 0;
 
         const selectedClient = clients.find(
@@ -159,15 +168,12 @@ const Chats = () => {
             return [...prev, value];
           });
         }
-
-        if (callback) {
-          callback({ success: true, message: value });
-        }
       }
     };
 
-    const handleWhisper = (value, callback) => {
+    const addWhisper = (value) => {
       if (value) {
+        setLastChatId(value.conversation_envelope.message_id);
         setUseWhisperAsTemplate(false);
         setWhisperChats((prev) =>
           prev.map((p) => {
@@ -186,19 +192,41 @@ const Chats = () => {
             return p;
           })
         );
+      }
+    };
 
-        if (callback) {
-          callback({ success: true, message: value });
+    const handleChats = (value) => {
+      addChat(value);
+      ackChats(value?.conversation_envelope?.message_id);
+    };
+
+    const handleWhisper = (value) => {
+      addWhisper(value);
+      ackChats(value?.conversation_envelope?.message_id);
+    };
+
+    // unread messages resent on (re)connect, oldest first
+    const handleChatsBatch = (batch) => {
+      batch?.messages?.forEach((value) => {
+        if (value.conversation_envelope.sender_role === "assistant") {
+          addWhisper(value);
+        } else {
+          addChat(value);
         }
-      }
+      });
+      // acknowledge the batch, it's not resent on the next reconnect
+      setLastChatId(batch?.last_chat_id);
+      ackChats(batch?.last_chat_id);
     };
 
     socket.on("chats", handleChats);
     socket.on("whisper", handleWhisper);
+    socket.on("chats_batch", handleChatsBatch);
 
     return () => {
       socket.off("chats", handleChats);
       socket.off("whisper", handleWhisper);
+      socket.off("chats_batch", handleChatsBatch);
     };
   }, [clients, clientPhoneNumber]);
 
@@ -15,7 +15,7 @@ import FloatingPlusButton from "./FloatingPlusButton";
 import Loading from "@/app/loading";
 import { ChatStatusEnum, SenderRoleEnum } from "./ChatWindow";
 
-const initialChatItems = { chats: [], limit: 10, offset: 0 };
+const initialChatItems = { chats: [], limit: 10 };
 
 const ChatList = ({
   newMessage,
@@ -29,7 +29,9 @@ const ChatList = ({
   const authDispatch = useAuthDispatch();
   const chatDispatch = useChatDispatch();
   const [chatItems, setChatItems] = useState(initialChatItems);
-  const [offset, setOffset] = useState(0);
+  // cursor of the page to fetch, null for the first page
+  const [cursor, setCursor] = useState(null);
+  const [nextCursor, setNextCursor] = useState(null);
   const limit = 10;
   const [loading, setLoading] = useState(false);
   const [hasMoreData, setHasMoreData] = useState(true);
@@ -48,16 +50,20 @@ const ChatList = ({
   };
 
   const loadMoreChats = useCallback(() => {
-    if (hasMoreData) {
-      setOffset((prevOffset) => prevOffset + limit);
+    if (hasMoreData && nextCursor) {
+      setCursor(nextCursor);
     }
-  }, [hasMoreData]);
+  }, [hasMoreData, nextCursor]);
 
   const fetchData = useCallback(async () => {
     if (!hasMoreData) return; // Prevent fetch if no more data
     setLoading(true);
 
-    const res = await api.get(`chat-list?limit=${limit}&offset=${offset}`);
+    const res = await api.get(
+      cursor
+        ? `chat-list?limit=${limit}&cursor=${encodeURIComponent(cursor)}`
+        : `chat-list?limit=${limit}`
+    );
     if (res.status === 200) {
       let resData = await res.json();
       resData = resData?.chats
@@ -67,8 +73,9 @@ const ChatList = ({
           }
         : resData;
 
-      if (resData.chats.length < limit) {
-        // No more data if fewer items than limit are returned
+      // No more data on the last page
+      setNextCursor(resData.next_cursor);
+      if (!resData.next_cursor) {
         setHasMoreData(false);
       }
 
@@ -115,13 +122,9 @@ const ChatList = ({
           ...prev,
           chats: sortedChats,
           limit: prev.limit,
-          offset: resData.offset,
         };
       });
       setLoading(false);
-    } else if (res.status === 404) {
-      setHasMoreData(false); // Set flag to false on 404
-      setLoading(false);
     } else if (res.status === 401 || res.status === 403) {
       userDispatch({ type: "DELETE" });
       authDispatch({ type: "DELETE" });
@@ -131,7 +134,7 @@ const ChatList = ({
     } else {
       setLoading(false);
     }
-  }, [offset, hasMoreData, authDispatch, router, setClients, userDispatch]);
+  }, [cursor, hasMoreData, authDispatch, router, setClients, userDispatch]);
 
   useEffect(() => {
     fetchData();
@@ -140,7 +143,7 @@ const ChatList = ({
   useEffect(() => {
     if (reloadChatList) {
       setHasMoreData(true);
-      setOffset(0);
+      setCursor(null);
       setTimeout(() => {
         fetchData();
       }, 100);
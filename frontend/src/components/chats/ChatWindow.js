@@ -4,6 +4,7 @@ import {
   useRef,
   useState,
   useEffect,
+  useLayoutEffect,
   useCallback,
   useMemo,
   forwardRef,
@@ -43,6 +44,7 @@ export const ChatStatusEnum = {
 };
 
 const ChatIDPrefix = "CHAT-";
+const CHAT_HISTORY_PAGE_SIZE = 20;
 const CHECK_24_HR_INTERVAL = 10000; // in miliseconds
 const conversationReconnectInformation =
   "Since the last message was sent over 24 hours ago, please include everything you want to communicate in your next message. You will not be able to send any additional messages until the farmer responds.";
@@ -155,9 +157,13 @@ const ChatWindow = ({
   const messagesContainerRef = useRef(null);
   const lastMessageRef = useRef(null);
   const dropdownRef = useRef(null);
+  const loadingOlderChatsRef = useRef(false);
+  const previousScrollHeightRef = useRef(null);
 
   const [message, setMessage] = useState("");
   const [chatHistory, setChatHistory] = useState([]);
+  // cursor of the older messages, null when the whole history is loaded
+  const [nextCursor, setNextCursor] = useState(null);
   const [loading, setLoading] = useState(true);
   const [isDropdownOpen, setDropdownOpen] = useState(false);
   const [isEdit, setIsEdit] = useState(false);
@@ -221,6 +227,11 @@ const ChatWindow = ({
 
   // Scroll to the last message whenever chats or chatHistory state changes
   useEffect(() => {
+    if (loadingOlderChatsRef.current) {
+      // keep the scroll position when older messages are prepended
+      loadingOlderChatsRef.current = false;
+      return;
+    }
     const scrollToLastMessageWithDelay = () => {
       setTimeout(() => {
         if (
@@ -262,37 +273,55 @@ const ChatWindow = ({
     };
   }, [lastMessageRef, scrollToLastMessage]);
 
-  // Load previous chats from /api/chat-details/{clientId}
+  // Load a page of previous chats from /api/chat-details/{clientId},
+  // the latest messages without a cursor
+  const fetchChatHistory = useCallback(
+    async (cursor = null) => {
+      let url = `/chat-details/${clientId}?limit=${CHAT_HISTORY_PAGE_SIZE}`;
+      if (cursor) {
+        url = `${url}&before=${encodeURIComponent(cursor)}`;
+      }
+      const res = await api.get(url);
+      if (res.status === 401 || res.status === 403) {
+        userDispatch({
+          type: "DELETE",
+        });
+        authDispatch({ type: "DELETE" });
+        deleteCookie("AUTH_TOKEN");
+        router.replace("/login");
+        return null;
+      }
+      if (res.status !== 200) {
+        return null;
+      }
+      const data = await res.json();
+      setNextCursor(data.next_cursor);
+      setClients((prev) =>
+        prev.map((p) => {
+          if (p.client_id === clientId) {
+            const messageIds = data.messages.map((d) => d.id);
+            return {
+              ...p,
+              message_ids: cursor
+                ? [...messageIds, ...(p.message_ids || [])]
+                : messageIds,
+            };
+          }
+          return p;
+        })
+      );
+      return data.messages;
+    },
+    [clientId, authDispatch, router, userDispatch, setClients]
+  );
+
   useEffect(() => {
     async function fetchChats() {
       try {
         setLoading(true);
-        const res = await api.get(`/chat-details/${clientId}`);
-        if (res.status === 200) {
-          const data = await res.json();
-          setChatHistory(data.messages);
-          setClients((prev) =>
-            prev.map((p) => {
-              if (p.client_id === clientId) {
-                return {
-                  ...p,
-                  message_ids: data.messages.map((d) => d.id),
-                };
-              }
-              return p;
-            })
-          );
-        }
-        if (res.status === 401 || res.status === 403) {
-          userDispatch({
-            type: "DELETE",
-          });
-          authDispatch({ type: "DELETE" });
-          deleteCookie("AUTH_TOKEN");
-          setLoading(false);
-          router.replace("/login");
-        } else {
-          setLoading(false);
+        const messages = await fetchChatHistory();
+        if (messages) {
+          setChatHistory(messages);
         }
       } catch (error) {
         console.error(error);
@@ -301,14 +330,44 @@ const ChatWindow = ({
       }
     }
     fetchChats();
-  }, [
-    clientId,
-    scrollToLastMessage,
-    authDispatch,
-    router,
-    userDispatch,
-    setClients,
-  ]);
+  }, [fetchChatHistory]);
+
+  // Load the older chats when scrolled to the top of the conversation
+  const handleLoadOlderChats = useCallback(async () => {
+    const container = messagesContainerRef.current;
+    if (!nextCursor || loadingOlderChatsRef.current || !container) {
+      return;
+    }
+    loadingOlderChatsRef.current = true;
+    try {
+      const messages = await fetchChatHistory(nextCursor);
+      if (messages?.length) {
+        previousScrollHeightRef.current = container.scrollHeight;
+        setChatHistory((prev) => [...messages, ...prev]);
+        return;
+      }
+    } catch (error) {
+      console.error(error);
+    }
+    loadingOlderChatsRef.current = false;
+  }, [nextCursor, fetchChatHistory]);
+
+  // Keep the first visible message in place when older chats are prepended
+  useLayoutEffect(() => {
+    const container = messagesContainerRef.current;
+    if (previousScrollHeightRef.current === null || !container) {
+      return;
+    }
+    container.scrollTop =
+      container.scrollHeight - previousScrollHeightRef.current;
+    previousScrollHeightRef.current = null;
+  }, [chatHistory]);
+
+  const handleMessagesScroll = (event) => {
+    if (event.currentTarget.scrollTop === 0) {
+      handleLoadOlderChats();
+    }
+  };
 
   // handle check the conversation timeout
   const getLastMessage = useCallback(async () => {
@@ -669,6 +728,7 @@ const ChatWindow = ({
                 <div
                   ref={messagesContainerRef}
                   className="flex-1 p-4 overflow-auto"
+                  onScroll={handleMessagesScroll}
                 >
                   {renderChatHistory}
                   {renderChats}
@@ -1,3 +1,3 @@
 export { default as api } from "./api";
-export { default as socket } from "./socket";
+export { default as socket, setLastChatId } from "./socket";
 export { default as dbLib } from "./db";
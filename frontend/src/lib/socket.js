@@ -3,6 +3,15 @@
 import { io } from "socket.io-client";
 
 let socket;
+// the highest chat id this tab received, sent on (re)connect so the
+// backend only resends the newer unread messages
+let lastChatId = null;
+
+export const setLastChatId = (chatId) => {
+  if (Number.isInteger(chatId) && (!lastChatId || chatId > lastChatId)) {
+    lastChatId = chatId;
+  }
+};
 
 if (typeof window !== "undefined") {
   const { hostname, origin } = window.location;
@@ -21,6 +30,7 @@ if (typeof window !== "undefined") {
     pingInterval: 130000, // 130 seconds
     pingTimeout: 120000, // 120 seconds
     upgrade: isLocalhost ? false : true,
+    auth: (cb) => cb({ last_chat_id: lastChatId }),
   });
 }
 
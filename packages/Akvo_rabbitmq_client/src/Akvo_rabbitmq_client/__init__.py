@@ -3,7 +3,4 @@ from .queue_message_util import queue_message_util
 
 
 __version__ = "0.1.0"
-__all__ = [
-    "rabbitmq_client",
-    "queue_message_util"
-]
+__all__ = ["rabbitmq_client", "queue_message_util"]
@@ -1,13 +1,26 @@
 import os
+import time
 import aio_pika
 import logging
 import asyncio
-from typing import Callable
-from aiormq.exceptions import AMQPConnectionError, ConnectionClosed
+from functools import partial
+from typing import Callable, List, Optional, Tuple
+from aiormq.exceptions import (
+    AMQPConnectionError,
+    ChannelInvalidStateError,
+    ConnectionClosed,
+)
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# errors after which the connection is re-established and the publish retried
+CONNECTION_ERRORS = (
+    ConnectionClosed,
+    AMQPConnectionError,
+    ChannelInvalidStateError,
+)
+
 
 class MissingEnvironmentVariableError(Exception):
     def __init__(self, variable_name):
@@ -18,6 +31,35 @@ class MissingEnvironmentVariableError(Exception):
         super().__init__(self.message)
 
 
+class PublisherMetrics:
+    """Counters describing the health of the long-lived publisher."""
+
+    def __init__(self):
+        self.reconnect_count = 0
+        self.publish_count = 0
+        self.total_publish_latency = 0.0
+        self.max_publish_latency = 0.0
+
+    def record_publish(self, latency: float):
+        self.publish_count += 1
+        self.total_publish_latency += latency
+        self.max_publish_latency = max(self.max_publish_latency, latency)
+
+    @property
+    def average_publish_latency(self) -> float:
+        if not self.publish_count:
+            return 0.0
+        return self.total_publish_latency / self.publish_count
+
+    def to_dict(self) -> dict:
+        return {
+            "reconnect_count": self.reconnect_count,
+            "publish_count": self.publish_count,
+            "average_publish_latency": self.average_publish_latency,
+            "max_publish_latency": self.max_publish_latency,
+        }
+
+
 class RabbitMQClient:
     def __init__(self):
         self.RABBITMQ_USER = os.getenv("RABBITMQ_USER")
@@ -32,6 +74,14 @@ class RabbitMQClient:
         self.connection = None
         self.channel = None
         self.exchange = None
+        self.metrics = PublisherMetrics()
+        # serialises (re)connecting, so concurrent publishers share a single
+        # connection instead of each opening their own
+        self._lock = asyncio.Lock()
+        # queue_name -> consumer registration, re-registered after reconnect
+        self.consumers = {}
+        self._closing = False
+        self._restore_task = None
 
     def validate_environment_variables(self):
         required_variables = [
@@ -69,44 +119,209 @@ class RabbitMQClient:
             raise Exception("Maximum retries exceeded")
 
     async def disconnect(self):
+        # an intentional close must not trigger the consumer restore
+        self._closing = True
+        if self._restore_task and not self._restore_task.done():
+            self._restore_task.cancel()
+        await self._close_connection()
+
+    async def _close_connection(self):
         if self.connection and not self.connection.is_closed:
             await self.connection.close()
             logger.info("RabbitMQ connection closed.")
 
-    async def initialize(self):
+    def is_connected(self) -> bool:
+        return (
+            self.connection is not None
+            and not self.connection.is_closed
+            and self.channel is not None
+            and not self.channel.is_closed
+        )
+
+    async def initialize(self, max_retries=5):
+        """
+        Opens the connection, channel and exchange once and reuses them for
+        every publish. Calling it again is cheap while the connection is
+        alive; a lost connection is re-established and counted as a
+        reconnect. When only the channel closed, the channel is reopened on
+        the open connection.
+        """
+        async with self._lock:
+            if self.is_connected():
+                return
+            try:
+                if self.connection and not self.connection.is_closed:
+                    # only the channel closed, a new connection would leak
+                    # the open one and its heartbeats
+                    self.metrics.reconnect_count += 1
+                    logger.warning("RabbitMQ channel lost, reopening...")
+                else:
+                    if self.connection is not None:
+                        self.metrics.reconnect_count += 1
+                        logger.warning(
+                            "RabbitMQ connection lost, reconnecting..."
+                        )
+                        await self._close_connection()
+                    await self.connect(max_retries=max_retries)
+                    self.connection.close_callbacks.add(
+                        self._on_connection_close
+                    )
+                # confirm mode: every publish is acknowledged by the broker
+                self.channel = await self.connection.channel(
+                    publisher_confirms=True
+                )
+                self.exchange = await self.channel.declare_exchange(
+                    self.RABBITMQ_EXCHANGE_USER_CHATS,
+                    aio_pika.ExchangeType.DIRECT,
+                    durable=True,
+                )
+                for queue_name in self.consumers:
+                    await self._start_consumer(queue_name)
+            except (ConnectionClosed, AMQPConnectionError) as e:
+                logger.error(f"RabbitMQ initialization error: {e}")
+            except Exception as e:
+                logger.error(
+                    f"Unexpected error initializing RabbitMQ client: {e}"
+                )
+
+    async def reconnect(self):
         try:
-            await self.connect()
-            self.channel = await self.connection.channel()
-            self.exchange = await self.channel.declare_exchange(
-                self.RABBITMQ_EXCHANGE_USER_CHATS,
-                aio_pika.ExchangeType.DIRECT,
-                durable=True,
-            )
-        except (ConnectionClosed, AMQPConnectionError) as e:
-            logger.error(f"RabbitMQ initialization error: {e}")
-            self.initialize()
+            await self._close_connection()
         except Exception as e:
-            logger.error(f"Unexpected error initializing RabbitMQ client: {e}")
+            logger.warning(f"Error closing stale RabbitMQ connection: {e}")
+        self.channel = None
+        self.exchange = None
+        await self.initialize()
 
-    async def producer(self, body: str, routing_key: str):
+    @staticmethod
+    def build_message(body: str) -> aio_pika.Message:
+        return aio_pika.Message(
+            body=body.encode("utf-8"),
+            delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
+        )
+
+    async def publish(self, body: str, routing_key: str):
+        """
+        Publishes a persistent message over the shared channel. If the
+        connection turns out to be broken, it reconnects once and retries.
+        Errors are raised to the caller.
+        """
+        message = self.build_message(body)
+        await self.initialize()
+        start = time.monotonic()
         try:
-            await self.initialize()
-            message = aio_pika.Message(
-                body=body.encode("utf-8"),
-                delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
-            )
             await self.exchange.publish(message, routing_key=routing_key)
+        except CONNECTION_ERRORS as e:
+            logger.warning(f"RabbitMQ publish failed, reconnecting: {e}")
+            await self.reconnect()
+            await self.exchange.publish(message, routing_key=routing_key)
+        self.metrics.record_publish(time.monotonic() - start)
+
+    async def _publish_pipelined(
+        self, messages: List[Tuple[str, str]]
+    ) -> list:
+        """
+        Sends all messages before waiting for any broker confirmation, then
+        collects the confirmations together. Returns the confirmation or the
+        exception for each message, in order.
+        """
+        if self.exchange is None:
+            error = AMQPConnectionError("RabbitMQ exchange is not available")
+            return [error] * len(messages)
+        return await asyncio.gather(
+            *[
+                self.exchange.publish(
+                    self.build_message(body), routing_key=routing_key
+                )
+                for body, routing_key in messages
+            ],
+            return_exceptions=True,
+        )
+
+    async def publish_many(
+        self, messages: List[Tuple[str, str]]
+    ) -> List[bool]:
+        """
+        Publishes many `(body, routing_key)` messages over the confirm-mode
+        channel. The messages are pipelined, so the whole batch costs one
+        round-trip of waiting instead of one per message. Messages that fail
+        because of a broken connection are retried once after reconnecting.
+
+        Returns a list with, for each message, whether the broker confirmed
+        it. Failed messages are logged, never dropped silently.
+        """
+        if not messages:
+            return []
+        await self.initialize()
+        start = time.monotonic()
+        results = await self._publish_pipelined(messages)
+
+        retry = [
+            i
+            for i, result in enumerate(results)
+            if isinstance(result, CONNECTION_ERRORS)
+        ]
+        if retry:
+            logger.warning(
+                f"RabbitMQ batch publish lost {len(retry)} messages to a "
+                "connection error, reconnecting..."
+            )
+            await self.reconnect()
+            retried = await self._publish_pipelined(
+                [messages[i] for i in retry]
+            )
+            for i, result in zip(retry, retried):
+                results[i] = result
+
+        latency = time.monotonic() - start
+        confirmed = []
+        for (body, routing_key), result in zip(messages, results):
+            if isinstance(result, BaseException):
+                logger.error(
+                    f"Message not confirmed by RabbitMQ: {body}, "
+                    f"routing_key: {routing_key}: {result}"
+                )
+                confirmed.append(False)
+            else:
+                self.metrics.record_publish(latency)
+                confirmed.append(True)
+        logger.info(
+            f"Batch sent: {sum(confirmed)}/{len(messages)} messages "
+            f"confirmed in {latency:.3f}s"
+        )
+        return confirmed
+
+    async def producer(self, body: str, routing_key: str) -> bool:
+        try:
+            await self.publish(body=body, routing_key=routing_key)
             logger.info(f"Message sent: {body}, routing_key: {routing_key}")
+            return True
         except (ConnectionClosed, AMQPConnectionError) as e:
             logger.error(f"RabbitMQ publish error: {e}")
         except Exception as e:
             logger.error(f"Unexpected error publishing message: {e}")
+        return False
 
     async def consumer_callback(
         self,
         message: aio_pika.IncomingMessage,
         routing_key: str,
         callback: Callable,
+        semaphore: Optional[asyncio.Semaphore] = None,
+    ):
+        if semaphore is None:
+            await self._process_message(message, routing_key, callback)
+            return
+        # the message stays unacked while it waits for a free slot, so the
+        # prefetch count keeps the number of waiting messages bounded
+        async with semaphore:
+            await self._process_message(message, routing_key, callback)
+
+    async def _process_message(
+        self,
+        message: aio_pika.IncomingMessage,
+        routing_key: str,
+        callback: Callable,
     ):
         try:
             async with message.process():
@@ -117,35 +332,115 @@ class RabbitMQClient:
         except Exception as e:
             logger.error(f"Error processing {routing_key} message: {e}")
 
+    def _on_connection_close(self, sender, exc=None):
+        """
+        Called by aio-pika whenever a connection closes. Unless the client
+        is shutting down, the connection and every registered consumer are
+        restored in the background.
+        """
+        if self._closing or sender is not self.connection:
+            return
+        logger.warning(f"RabbitMQ connection closed unexpectedly: {exc}")
+        if self._restore_task is None or self._restore_task.done():
+            self._restore_task = asyncio.ensure_future(self._restore())
+
+    async def _restore(self, delay=5):
+        while not self._closing and not self.is_connected():
+            await self.initialize()
+            if not self.is_connected():
+                await asyncio.sleep(delay)
+
+    async def _start_consumer(self, queue_name: str):
+        """
+        Opens a dedicated channel for the consumer, applies its prefetch
+        limit, declares and binds the queue and registers the callback.
+        Does nothing while the consumer's channel is still open.
+        """
+        consumer = self.consumers[queue_name]
+        if consumer["channel"] and not consumer["channel"].is_closed:
+            return
+        channel = await self.connection.channel()
+        if consumer["prefetch_count"]:
+            # limit the number of unacknowledged messages the broker
+            # pushes to this consumer
+            await channel.set_qos(prefetch_count=consumer["prefetch_count"])
+        queue = await channel.declare_queue(queue_name, durable=True)
+        await queue.bind(
+            self.RABBITMQ_EXCHANGE_USER_CHATS,
+            routing_key=consumer["routing_key"],
+        )
+        consumer["consumer_tag"] = await queue.consume(
+            partial(
+                self.consumer_callback,
+                routing_key=consumer["routing_key"],
+                callback=consumer["callback"],
+                semaphore=consumer["semaphore"],
+            )
+        )
+        consumer["channel"] = channel
+        logger.info(
+            f"Consuming from Q:{queue_name} | RK:{consumer['routing_key']}"
+        )
+
     async def consume(
         self,
         queue_name: str,
         routing_key: str,
         callback: Callable = None,
-        sleepTime=25,
-    ):
-        while True:
-            try:
-                await self.initialize()
-                queue = await self.channel.declare_queue(
-                    queue_name, durable=True
-                )
-                await queue.bind(self.exchange, routing_key=routing_key)
-                await queue.consume(
-                    lambda msg: self.consumer_callback(
-                        message=msg, routing_key=routing_key, callback=callback
-                    )
-                )
-                logger.info(
-                    f"Consuming from Q:{queue_name} | RK:{routing_key}"
-                )
-                await asyncio.sleep(sleepTime)
-            except (ConnectionClosed, AMQPConnectionError) as e:
-                logger.error(f"RabbitMQ consume error: {e}")
-                await asyncio.sleep(5)
-            except Exception as e:
-                logger.error(f"Unexpected error consuming {routing_key}: {e}")
-                await asyncio.sleep(5)
+        prefetch_count: Optional[int] = None,
+        concurrency: Optional[int] = None,
+    ) -> Optional[str]:
+        """
+        Registers a long-running consumer for the queue and returns its
+        consumer tag. The queue is declared and the consumer registered
+        once; after a lost connection it is re-registered automatically.
+        Calling it again for an already consumed queue is a no-op.
+
+        Parameters:
+        - queue_name (str): The durable queue to consume from.
+        - routing_key (str): The routing key the queue is bound with.
+        - callback (Callable): Awaited with body=<message body>.
+        - prefetch_count (int): Maximum unacknowledged messages in flight.
+          Defaults to concurrency when that is set.
+        - concurrency (int): Maximum number of callbacks running at the
+          same time. Unlimited (bounded by prefetch_count) when None.
+
+        Returns:
+        - str: The consumer tag, or None while the broker is unreachable
+          (the consumer is registered once the connection is back).
+        """
+        self._closing = False
+        if concurrency and not prefetch_count:
+            prefetch_count = concurrency
+        if queue_name not in self.consumers:
+            self.consumers[queue_name] = {
+                "routing_key": routing_key,
+                "callback": callback,
+                "prefetch_count": prefetch_count,
+                "semaphore": (
+                    asyncio.Semaphore(concurrency) if concurrency else None
+                ),
+                "channel": None,
+                "consumer_tag": None,
+            }
+        await self.initialize()
+        try:
+            if self.is_connected():
+                await self._start_consumer(queue_name)
+        except CONNECTION_ERRORS as e:
+            logger.error(f"RabbitMQ consume error: {e}")
+        except Exception as e:
+            logger.error(f"Unexpected error consuming {routing_key}: {e}")
+        return self.consumers[queue_name]["consumer_tag"]
+
+    def consumer_count(self) -> int:
+        """Returns the number of consumers with an open channel."""
+        return sum(
+            1
+            for consumer in self.consumers.values()
+            if consumer["channel"] is not None
+            and not consumer["channel"].is_closed
+        )
 
 
 try:
@@ -1,6 +1,9 @@
+import asyncio
 import pytest
-from unittest.mock import AsyncMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
+from aiormq.exceptions import ConnectionClosed, DeliveryError
 from Akvo_rabbitmq_client import rabbitmq_client
+from Akvo_rabbitmq_client.rabbitmq_client import RabbitMQClient
 
 
 @pytest.mark.asyncio
@@ -31,7 +34,8 @@ async def test_producer_and_consumer(mock_connect):
     )
 
     # Simulate message delivery to the consumer
-    incoming_message_mock = AsyncMock()
+    incoming_message_mock = MagicMock()
+    incoming_message_mock.process.return_value = AsyncMock()
     incoming_message_mock.body.decode.return_value = (
         "Test producer and consumer"
     )
@@ -52,3 +56,244 @@ async def test_connection_error(mock_connect):
 
     with pytest.raises(ConnectionError):
         await rabbitmq_client.initialize()
+
+
+def mock_open_connection(mock_connect):
+    mock_connection = AsyncMock()
+    mock_connection.is_closed = False
+    mock_connection.close_callbacks = MagicMock()
+    mock_channel = AsyncMock()
+    mock_channel.is_closed = False
+    mock_exchange = AsyncMock()
+
+    mock_connect.return_value = mock_connection
+    mock_connection.channel.return_value = mock_channel
+    mock_channel.declare_exchange.return_value = mock_exchange
+    return mock_connection, mock_channel, mock_exchange
+
+
+@pytest.mark.asyncio
+@patch("aio_pika.connect", new_callable=AsyncMock)
+async def test_producer_reuses_connection(mock_connect):
+    _, _, mock_exchange = mock_open_connection(mock_connect)
+    client = RabbitMQClient()
+
+    for i in range(3):
+        sent = await client.producer(body=f"msg {i}", routing_key="test")
+        assert sent is True
+
+    mock_connect.assert_called_once()
+    assert mock_exchange.publish.await_count == 3
+    assert client.metrics.publish_count == 3
+    assert client.metrics.reconnect_count == 0
+
+
+@pytest.mark.asyncio
+@patch("aio_pika.connect", new_callable=AsyncMock)
+async def test_producer_reconnects_on_failure(mock_connect):
+    mock_connection, _, mock_exchange = mock_open_connection(mock_connect)
+    client = RabbitMQClient()
+    await client.initialize()
+
+    publish_calls = []
+
+    async def lose_connection_once(*args, **kwargs):
+        publish_calls.append(args)
+        if len(publish_calls) == 1:
+            mock_connection.is_closed = True
+            raise ConnectionClosed(320, "connection forced")
+
+    mock_exchange.publish.side_effect = lose_connection_once
+    sent = await client.producer(body="msg", routing_key="test")
+
+    assert sent is True
+    assert mock_connect.await_count == 2
+    assert client.metrics.reconnect_count == 1
+    assert client.metrics.publish_count == 1
+
+
+@pytest.mark.asyncio
+@patch("aio_pika.connect", new_callable=AsyncMock)
+async def test_initialize_reopens_only_the_channel(mock_connect):
+    mock_connection, mock_channel, _ = mock_open_connection(mock_connect)
+    client = RabbitMQClient()
+    await client.initialize()
+
+    # the channel closed, the connection is still open
+    mock_channel.is_closed = True
+    new_channel = AsyncMock()
+    new_channel.is_closed = False
+    mock_connection.channel.return_value = new_channel
+    await client.initialize(max_retries=1)
+
+    mock_connect.assert_called_once()
+    mock_connection.close.assert_not_called()
+    assert client.connection is mock_connection
+    assert client.channel is new_channel
+    assert client.is_connected()
+    assert client.metrics.reconnect_count == 1
+
+
+@pytest.mark.asyncio
+@patch("aio_pika.connect", new_callable=AsyncMock)
+async def test_publish_many_pipelines_and_reports_each_message(mock_connect):
+    _, _, mock_exchange = mock_open_connection(mock_connect)
+    client = RabbitMQClient()
+
+    started = []
+    all_started = asyncio.Event()
+    messages = [(f"msg {i}", "test") for i in range(5)]
+
+    async def confirm_after_all_sent(message, routing_key):
+        started.append(message.body.decode())
+        if len(started) == len(messages):
+            all_started.set()
+        # the broker only confirms once every message is on the wire
+        await all_started.wait()
+        if message.body == b"msg 3":
+            raise DeliveryError(None, None)
+
+    mock_exchange.publish.side_effect = confirm_after_all_sent
+    results = await asyncio.wait_for(
+        client.publish_many(messages), timeout=1.0
+    )
+
+    assert results == [True, True, True, False, True]
+    assert started == [body for body, _ in messages]
+    mock_connect.assert_called_once()
+    assert client.metrics.publish_count == 4
+
+
+@pytest.mark.asyncio
+@patch("aio_pika.connect", new_callable=AsyncMock)
+async def test_publish_many_retries_after_reconnect(mock_connect):
+    mock_connection, _, mock_exchange = mock_open_connection(mock_connect)
+    client = RabbitMQClient()
+
+    publish_calls = []
+
+    async def lose_connection_once(message, routing_key):
+        publish_calls.append(message.body)
+        if message.body == b"msg 1" and publish_calls.count(b"msg 1") == 1:
+            mock_connection.is_closed = True
+            raise ConnectionClosed(320, "connection forced")
+
+    mock_exchange.publish.side_effect = lose_connection_once
+    results = await client.publish_many([("msg 0", "a"), ("msg 1", "b")])
+
+    assert results == [True, True]
+    assert publish_calls.count(b"msg 1") == 2
+    assert client.metrics.reconnect_count == 1
+
+
+@pytest.mark.asyncio
+async def test_publish_many_empty():
+    client = RabbitMQClient()
+    assert await client.publish_many([]) == []
+
+
+@pytest.mark.asyncio
+@patch("aio_pika.connect", new_callable=AsyncMock)
+async def test_consume_registers_consumer_once(mock_connect):
+    mock_connection, mock_channel, _ = mock_open_connection(mock_connect)
+    mock_queue = AsyncMock()
+    mock_channel.declare_queue.return_value = mock_queue
+    mock_queue.consume.return_value = "ctag-1"
+    client = RabbitMQClient()
+
+    first = await client.consume("q", "q", callback=AsyncMock())
+    second = await client.consume("q", "q", callback=AsyncMock())
+
+    assert first == second == "ctag-1"
+    mock_connect.assert_called_once()
+    mock_channel.set_qos.assert_not_called()
+    mock_channel.declare_queue.assert_called_once_with("q", durable=True)
+    mock_queue.consume.assert_called_once()
+    mock_connection.close_callbacks.add.assert_called_once()
+    assert client.consumer_count() == 1
+
+
+@pytest.mark.asyncio
+@patch("aio_pika.connect", new_callable=AsyncMock)
+async def test_consume_applies_prefetch_count(mock_connect):
+    _, mock_channel, _ = mock_open_connection(mock_connect)
+    client = RabbitMQClient()
+
+    await client.consume("q", "q", prefetch_count=8)
+
+    mock_channel.set_qos.assert_called_once_with(prefetch_count=8)
+
+
+@pytest.mark.asyncio
+@patch("aio_pika.connect", new_callable=AsyncMock)
+async def test_consumer_restored_after_connection_loss(mock_connect):
+    lost_connection, lost_channel, _ = mock_open_connection(mock_connect)
+    new_connection, new_channel, _ = mock_open_connection(mock_connect)
+    mock_connect.return_value = None
+    mock_connect.side_effect = [lost_connection, new_connection]
+    client = RabbitMQClient()
+
+    await client.consume("q", "q", callback=AsyncMock())
+    lost_connection.is_closed = True
+    lost_channel.is_closed = True
+    assert client.consumer_count() == 0
+
+    client._on_connection_close(
+        lost_connection, ConnectionClosed(320, "connection forced")
+    )
+    await asyncio.wait_for(client._restore_task, timeout=1.0)
+
+    assert client.connection is new_connection
+    new_channel.declare_queue.assert_called_once_with("q", durable=True)
+    assert client.consumer_count() == 1
+    assert client.metrics.reconnect_count == 1
+
+
+@pytest.mark.asyncio
+@patch("aio_pika.connect", new_callable=AsyncMock)
+async def test_disconnect_does_not_restore_consumers(mock_connect):
+    mock_connection, _, _ = mock_open_connection(mock_connect)
+    client = RabbitMQClient()
+
+    await client.consume("q", "q")
+    await client.disconnect()
+    client._on_connection_close(mock_connection, None)
+
+    assert client._restore_task is None
+
+
+@pytest.mark.asyncio
+@patch("aio_pika.connect", new_callable=AsyncMock)
+async def test_consume_limits_concurrent_callbacks(mock_connect):
+    _, mock_channel, _ = mock_open_connection(mock_connect)
+    mock_queue = AsyncMock()
+    mock_channel.declare_queue.return_value = mock_queue
+    client = RabbitMQClient()
+
+    active = 0
+    max_active = 0
+    received = []
+
+    async def slow_callback(body):
+        nonlocal active, max_active
+        active += 1
+        max_active = max(max_active, active)
+        await asyncio.sleep(0.01)
+        received.append(body)
+        active -= 1
+
+    await client.consume("q", "q", callback=slow_callback, concurrency=2)
+    # without an explicit prefetch the broker hands out `concurrency` msgs
+    mock_channel.set_qos.assert_called_once_with(prefetch_count=2)
+
+    on_message = mock_queue.consume.call_args.args[0]
+    messages = []
+    for i in range(5):
+        message = MagicMock()
+        message.process.return_value = AsyncMock()
+        message.body.decode.return_value = f"msg {i}"
+        messages.append(message)
+    await asyncio.gather(*(on_message(message) for message in messages))
+
+    assert sorted(received) == [f"msg {i}" for i in range(5)]
+    assert max_active == 2